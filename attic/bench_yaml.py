@@ -0,0 +1,56 @@
+#! /usr/bin/python3
+"""Benchmark loading and dumping of the index file.
+
+Create synthetic index files of increasing size and measure the time
+to load and to dump them, both with the pure Python implementation of
+PyYAML and with the libyaml based one, if available.
+"""
+
+import datetime
+import io
+import time
+import yaml
+
+
+def make_items(n):
+    """Return a list of n synthetic items as in the index file.
+    """
+    start = datetime.datetime(2016, 2, 28, 17, 26, 39)
+    items = []
+    for i in range(n):
+        items.append({
+            'checksum': {'md5': "%032x" % i},
+            'createDate': start + datetime.timedelta(minutes=i),
+            'filename': "dsc_%06d.jpg" % i,
+            'gpsPosition': {'E': 139.0 + i * 1e-5, 'N': 35.0 + i * 1e-5},
+            'orientation': 'Horizontal (normal)',
+            'tags': ["tag%d" % (i % 17), "tag%d" % (i % 5)],
+        })
+    return items
+
+def bench(n, loader, dumper):
+    items = make_items(n)
+    f = io.StringIO()
+    t0 = time.perf_counter()
+    yaml.dump(items, f, Dumper=dumper, default_flow_style=False)
+    t1 = time.perf_counter()
+    f.seek(0)
+    yaml.load(f, Loader=loader)
+    t2 = time.perf_counter()
+    return (t1 - t0, t2 - t1)
+
+if __name__ == "__main__":
+    import argparse
+    argparser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    argparser.add_argument('counts', nargs='*', type=int,
+                           default=[1000, 10000, 100000],
+                           help="number of items in the index")
+    args = argparser.parse_args()
+    impls = [ ("python", yaml.SafeLoader, yaml.SafeDumper) ]
+    if yaml.__with_libyaml__:
+        impls.append(("libyaml", yaml.CSafeLoader, yaml.CSafeDumper))
+    print("%10s %8s %10s %10s" % ("items", "impl", "dump [s]", "load [s]"))
+    for n in args.counts:
+        for name, loader, dumper in impls:
+            tdump, tload = bench(n, loader, dumper)
+            print("%10d %8s %10.3f %10.3f" % (n, name, tdump, tload))
@@ -16,13 +16,7 @@ import photoidx.index
 def tag_index(idx):
     """Return a mapping of tag names to index items.
     """
-    tagidx = dict()
-    for i in idx:
-        for t in i.tags:
-            if t not in tagidx:
-                tagidx[t] = set()
-            tagidx[t].add(i)
-    return tagidx
+    return idx.tagmap()
 
 def get_partition(idx):
     """Try to find a partition of tags for the index.
@@ -0,0 +1,415 @@
+"""Provide the class ItemColumns, a columnar store of index items.
+
+Keeping a full IdxItem object for each image is expensive for large
+indices, both in memory and in the time to create them.  ItemColumns
+rather keeps each attribute of all items in one packed array and
+provides lightweight views to access individual items.  Scans over
+the whole index, such as evaluating an IdxFilter or collecting
+statistics, work on the arrays directly.  The vectorized operations
+of numpy are used if available.
+
+ItemColumns is read only, except for the tags and the selection
+state of the items.
+"""
+
+import array
+from collections import Counter
+from collections.abc import Sequence
+import datetime
+from pathlib import Path
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from photoidx.exif import Orientation
+from photoidx.geo import GeoPosition, _distances
+
+
+_epoch = datetime.datetime(1970, 1, 1)
+_usec = datetime.timedelta(microseconds=1)
+_usec_per_day = 86400 * 1000000
+# Marker for a missing createDate.  It compares less than any date.
+_nodate = -2**63
+
+def _date2int(date):
+    """Convert a date to microseconds since the epoch.
+    """
+    if date is None:
+        return _nodate
+    return (date - _epoch) // _usec
+
+def _int2date(value):
+    if value == _nodate:
+        return None
+    return _epoch + value * _usec
+
+def _int2ordinal(value):
+    """Return the ordinal of the day of a date in microseconds.
+    """
+    return _epoch.toordinal() + value // _usec_per_day
+
+
+class ItemView(object):
+    """A view to an item in ItemColumns.
+
+    Provides the same attributes as IdxItem, but decodes them from
+    the columns on each access.
+    """
+
+    __slots__ = ('columns', 'pos')
+
+    def __init__(self, columns, pos):
+        self.columns = columns
+        self.pos = pos
+
+    def __eq__(self, other):
+        if isinstance(other, ItemView):
+            return self.columns is other.columns and self.pos == other.pos
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((id(self.columns), self.pos))
+
+    @property
+    def filename(self):
+        return Path(self.columns.filename(self.pos))
+
+    @property
+    def name(self):
+        return self.columns.extra.get(self.pos, {}).get('name')
+
+    @property
+    def checksum(self):
+        return self.columns.checksum(self.pos)
+
+    @property
+    def createDate(self):
+        return _int2date(self.columns.createDate[self.pos])
+
+    @property
+    def orientation(self):
+        o = self.columns.orientation[self.pos]
+        return Orientation(o) if o else None
+
+    @property
+    def gpsPosition(self):
+        lat = self.columns.gpsLat[self.pos]
+        if lat != lat:
+            # NaN marks a missing position.
+            return None
+        return GeoPosition((lat, self.columns.gpsLon[self.pos]))
+
+    @property
+    def tags(self):
+        return self.columns.tags(self.pos)
+
+    @tags.setter
+    def tags(self, tags):
+        self.columns.newtags[self.pos] = frozenset(tags)
+
+    @property
+    def selected(self):
+        return bool(self.columns.selected[self.pos])
+
+    @selected.setter
+    def selected(self, selected):
+        self.columns.selected[self.pos] = int(bool(selected))
+
+    @property
+    def fileStat(self):
+        return self.columns.extra.get(self.pos, {}).get('fileStat')
+
+    def as_dict(self):
+        tags = set(self.tags)
+        if self.selected:
+             tags.add('pidx:selected')
+        d = {
+            'filename': str(self.filename),
+            'checksum': self.checksum,
+            'createDate': self.createDate,
+            'orientation': str(self.orientation) if self.orientation else None,
+            'gpsPosition': self.gpsPosition,
+            'tags': sorted(tags),
+        }
+        if d['gpsPosition']:
+            d['gpsPosition'] = d['gpsPosition'].as_dict()
+        if self.name is not None:
+            d['name'] = self.name
+        if self.fileStat is not None:
+            d['fileStat'] = self.fileStat
+        return d
+
+
+class ColumnSelection(object):
+    """The items at some positions in ItemColumns.
+
+    Iterating yields the views of the items.  Consumers aware of
+    ItemColumns, such as Stats, may use the columns directly.
+    """
+
+    def __init__(self, columns, positions):
+        self.columns = columns
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        for p in self.positions:
+            yield ItemView(self.columns, p)
+
+    def tagcounts(self):
+        """Return a mapping of tags to the number of selected items.
+        """
+        return self.columns.tagcounts(self.positions)
+
+
+class ItemColumns(Sequence):
+    """The items of an index stored in columns.
+
+    The items are created from the dicts as read from the index
+    file.  Dates are stored as microseconds since the epoch, the
+    orientation as its integer value, GPS positions as latitude and
+    longitude in degree using NaN for missing ones, and checksums as
+    binary digests.  The file names are kept in one string.  Tags are
+    mapped to integer ids, the tag ids of all items are stored in one
+    array with the offsets of the items in another one.  Rarely set
+    attributes like name and fileStat are kept in a dict.
+    """
+
+    def __init__(self, data=()):
+        self.createDate = array.array('q')
+        self.orientation = array.array('B')
+        self.gpsLat = array.array('d')
+        self.gpsLon = array.array('d')
+        self.selected = bytearray()
+        self.checksums = {}
+        self.extra = {}
+        self.tagnames = []
+        self.tagids = {}
+        self.newtags = {}
+        self._tagoffsets = array.array('Q', [0])
+        self._tagitems = array.array('I')
+        self._fnoffsets = array.array('Q', [0])
+        filenames = []
+        fnlen = 0
+        for pos, d in enumerate(data):
+            filename = d['filename']
+            filenames.append(filename)
+            fnlen += len(filename)
+            self._fnoffsets.append(fnlen)
+            checksum = d.get('checksum', {})
+            if not checksum and 'md5' in d:
+                # legacy: old index file format used to have a 'md5'
+                # attribute, rather then 'checksum'.
+                checksum = {'md5': d['md5']}
+            for alg, value in checksum.items():
+                self._add_checksum(pos, alg, value)
+            date = d.get('createDate')
+            if date is None:
+                # legacy: 'createDate' used to be 'createdate' in old
+                # index file format.
+                date = d.get('createdate')
+            self.createDate.append(_date2int(date))
+            orientation = Orientation(d.get('orientation'))
+            self.orientation.append(orientation or 0)
+            pos_ = d.get('gpsPosition')
+            if pos_:
+                gpspos = GeoPosition(pos_)
+                self.gpsLat.append(gpspos.lat)
+                self.gpsLon.append(gpspos.lon)
+            else:
+                self.gpsLat.append(float('nan'))
+                self.gpsLon.append(float('nan'))
+            tags = d.get('tags', [])
+            self.selected.append('pidx:selected' in tags)
+            for t in tags:
+                if t.startswith('pidx:'):
+                    continue
+                try:
+                    self._tagitems.append(self.tagids[t])
+                except KeyError:
+                    self.tagids[t] = len(self.tagnames)
+                    self._tagitems.append(len(self.tagnames))
+                    self.tagnames.append(t)
+            self._tagoffsets.append(len(self._tagitems))
+            extra = { k: d[k] for k in ('name', 'fileStat')
+                      if d.get(k) is not None }
+            if extra:
+                self.extra[pos] = extra
+        # The file names are joined with a separator that cannot
+        # occur in a path, such that they may be searched.
+        self._filenames = "\0".join(filenames)
+
+    def _add_checksum(self, pos, alg, value):
+        try:
+            digest = bytes.fromhex(value)
+        except (TypeError, ValueError):
+            digest = None
+        try:
+            size, present, digests = self.checksums[alg]
+        except KeyError:
+            if digest is None:
+                size = 0
+            else:
+                size = len(digest)
+            present = bytearray()
+            digests = bytearray()
+            self.checksums[alg] = (size, present, digests)
+        if digest is None or len(digest) != size:
+            # Keep odd values as they are.
+            self.extra.setdefault(pos, {}).setdefault('checksum', {})
+            self.extra[pos]['checksum'][alg] = value
+            return
+        n = pos + 1
+        present.extend(bytes(n - len(present)))
+        digests.extend(bytes(n * size - len(digests)))
+        present[pos] = 1
+        digests[pos*size:n*size] = digest
+
+    def __len__(self):
+        return len(self.createDate)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ ItemView(self, p) for p in range(len(self))[index] ]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("index out of range")
+        return ItemView(self, index)
+
+    def filename(self, pos):
+        start = self._fnoffsets[pos]
+        # Skip the separators of the preceding file names.
+        return self._filenames[start + pos:self._fnoffsets[pos+1] + pos]
+
+    def checksum(self, pos):
+        checksum = {}
+        for alg, (size, present, digests) in self.checksums.items():
+            if pos < len(present) and present[pos]:
+                checksum[alg] = digests[pos*size:(pos+1)*size].hex()
+        checksum.update(self.extra.get(pos, {}).get('checksum', {}))
+        return checksum
+
+    def tags(self, pos):
+        try:
+            return self.newtags[pos]
+        except KeyError:
+            ids = self._tagitems[self._tagoffsets[pos]:self._tagoffsets[pos+1]]
+            return frozenset(self.tagnames[i] for i in ids)
+
+    def tagcounts(self, positions):
+        """Return a mapping of tags to the number of items having them.
+
+        Only the items at positions are considered.
+        """
+        ids = Counter()
+        counts = Counter()
+        offsets = self._tagoffsets
+        for p in positions:
+            if p in self.newtags:
+                counts.update(self.newtags[p])
+            else:
+                ids.update(self._tagitems[offsets[p]:offsets[p+1]])
+        for i, c in ids.items():
+            counts[self.tagnames[i]] += c
+        return dict(counts)
+
+    def _select_files(self, positions, filelist):
+        """Filter the positions of items by file name.
+        """
+        found = set()
+        filenames = "\0%s\0" % self._filenames
+        for f in filelist:
+            start = filenames.find("\0%s\0" % f)
+            if start >= 0:
+                # Each preceding file name is followed by one separator.
+                pos = filenames.count("\0", 0, start)
+                found.add(pos)
+        return [ p for p in positions if p in found ]
+
+    def _select_tags(self, positions, taglist, negtaglist):
+        """Filter the positions of items by tags.
+        """
+        want = { self.tagids.get(t, -1) for t in taglist }
+        unwanted = { self.tagids[t] for t in negtaglist if t in self.tagids }
+        untagged = not taglist and not negtaglist
+        offsets = self._tagoffsets
+        selected = []
+        for p in positions:
+            if p in self.newtags:
+                tags = self.newtags[p]
+                if (not taglist <= tags or negtaglist & tags or
+                    untagged and tags):
+                    continue
+            else:
+                start, end = offsets[p], offsets[p+1]
+                if untagged:
+                    if end > start:
+                        continue
+                else:
+                    ids = set(self._tagitems[start:end])
+                    if not want <= ids or unwanted & ids:
+                        continue
+            selected.append(p)
+        return selected
+
+    def _scan_numpy(self, idxfilter):
+        """Evaluate the simple criteria of idxfilter using numpy.
+        """
+        mask = numpy.ones(len(self), dtype=bool)
+        if idxfilter.select is not None:
+            selected = numpy.frombuffer(self.selected, dtype=numpy.uint8)
+            mask &= (selected != 0) == bool(idxfilter.select)
+        if idxfilter.date:
+            start, end = (_date2int(d) for d in idxfilter.date)
+            dates = numpy.frombuffer(self.createDate, dtype=numpy.int64)
+            mask &= (dates >= start) & (dates < end)
+        positions = numpy.flatnonzero(mask)
+        if idxfilter.gpspos:
+            lats = numpy.frombuffer(self.gpsLat)[positions]
+            lons = numpy.frombuffer(self.gpsLon)[positions]
+            known = ~numpy.isnan(lats)
+            positions = positions[known]
+            dists = _distances(idxfilter.gpspos.lat, idxfilter.gpspos.lon,
+                               lats[known], lons[known],
+                               GeoPosition.earthRadius)
+            positions = positions[numpy.array(dists) <= idxfilter.gpsradius]
+        return positions.tolist()
+
+    def _scan(self, idxfilter):
+        """Evaluate the simple criteria of idxfilter.
+        """
+        positions = range(len(self))
+        if idxfilter.select is not None:
+            select = int(bool(idxfilter.select))
+            positions = [ p for p in positions if self.selected[p] == select ]
+        if idxfilter.date:
+            start, end = (_date2int(d) for d in idxfilter.date)
+            dates = self.createDate
+            positions = [ p for p in positions if start <= dates[p] < end ]
+        if idxfilter.gpspos:
+            positions = [ p for p in positions
+                          if self.gpsLat[p] == self.gpsLat[p] ]
+            dists = _distances(idxfilter.gpspos.lat, idxfilter.gpspos.lon,
+                               [ self.gpsLat[p] for p in positions ],
+                               [ self.gpsLon[p] for p in positions ],
+                               GeoPosition.earthRadius)
+            positions = [ p for p, d in zip(positions, dists)
+                          if d <= idxfilter.gpsradius ]
+        return list(positions)
+
+    def query(self, idxfilter):
+        """Return a ColumnSelection of the items matching an IdxFilter.
+        """
+        if numpy is not None:
+            positions = self._scan_numpy(idxfilter)
+        else:
+            positions = self._scan(idxfilter)
+        if idxfilter.filelist:
+            positions = self._select_files(positions, idxfilter.filelist)
+        if idxfilter.taglist is not None:
+            positions = self._select_tags(positions, idxfilter.taglist,
+                                          idxfilter.negtaglist)
+        return ColumnSelection(self, positions)
@@ -66,8 +66,13 @@ class FocalLength(float):
 class Exif(object):
 
     def __init__(self, path):
-        with path.open("rb") as f:
-            self._tags = exifread.process_file(f)
+        if hasattr(path, 'read'):
+            # path is already an open binary file object, e.g. the
+            # image file that is also read to calculate checksums.
+            self._tags = exifread.process_file(path)
+        else:
+            with path.open("rb") as f:
+                self._tags = exifread.process_file(f)
 
     @property
     def createDate(self):
@@ -149,3 +154,8 @@ class Exif(object):
             return None
         else:
             return FocalLength(fl)
+
+    @property
+    def thumbnail(self):
+        """The embedded JPEG thumbnail image as bytes."""
+        return self._tags.get('JPEGThumbnail')
@@ -4,6 +4,10 @@
 import re
 import math
 from collections.abc import Mapping, Sequence
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 _geopos_pattern = (r"^\s*(?P<lat>\d+(?:\.\d*))\s*(?P<latref>N|S),\s*"
@@ -11,9 +15,100 @@ _geopos_pattern = (r"^\s*(?P<lat>\d+(?:\.\d*))\s*(?P<latref>N|S),\s*"
 _geopos_re = re.compile(_geopos_pattern)
 
 
+def _distance(lat0, lon0, lat, lon, radius):
+    """Distance of (lat0, lon0) to (lat, lon) in degree.
+
+    Use the haversine formula on a sphere having the given radius.
+    This is the scalar version of _distances().
+    """
+    lat0 = math.radians(lat0)
+    lat = math.radians(lat)
+    slat = math.sin((lat0 - lat)/2.0)
+    slon = math.sin(math.radians(lon0 - lon)/2.0)
+    h = slat*slat + math.cos(lat0)*math.cos(lat)*slon*slon
+    return radius * 2.0*math.asin(math.sqrt(min(h, 1.0)))
+
+def _distances(lat0, lon0, lats, lons, radius):
+    """Distances of (lat0, lon0) to each of the points (lats, lons).
+
+    All coordinates are in degree.  Return a list of distances on a
+    sphere having the given radius.  If numpy is available, the
+    calculation is vectorized.
+    """
+    if numpy is not None:
+        lat0 = math.radians(lat0)
+        lon0 = math.radians(lon0)
+        c0 = math.cos(lat0)
+        lats = numpy.radians(numpy.array(lats, dtype=float))
+        lons = numpy.radians(numpy.array(lons, dtype=float))
+        slat = numpy.sin((lat0 - lats) / 2.0)
+        slon = numpy.sin((lon0 - lons) / 2.0)
+        h = slat*slat + c0*numpy.cos(lats)*slon*slon
+        sigma = 2.0*numpy.arcsin(numpy.sqrt(numpy.minimum(h, 1.0)))
+        return (radius * sigma).tolist()
+    else:
+        return [ _distance(lat0, lon0, lat, lon, radius)
+                 for lat, lon in zip(lats, lons) ]
+
+def _centroid(lats, lons):
+    """Centroid of the points (lats, lons) in degree.
+
+    Return the centroid as (lat, lon) in degree.  If numpy is
+    available, the calculation is vectorized.
+    """
+    if numpy is not None:
+        lats = numpy.radians(numpy.array(lats, dtype=float))
+        lons = numpy.radians(numpy.array(lons, dtype=float))
+        n = len(lats)
+        if n:
+            cl = numpy.cos(lats)
+            x = float(numpy.sum(cl * numpy.cos(lons)))
+            y = float(numpy.sum(cl * numpy.sin(lons)))
+            z = float(numpy.sum(numpy.sin(lats)))
+    else:
+        x = y = z = 0.0
+        n = 0
+        for lat, lon in zip(lats, lons):
+            lat = math.pi * lat / 180.0
+            lon = math.pi * lon / 180.0
+            x += math.cos(lat) * math.cos(lon)
+            y += math.cos(lat) * math.sin(lon)
+            z += math.sin(lat)
+            n += 1
+    if not n:
+        raise ValueError("positions must not be empty")
+    x /= n
+    y /= n
+    z /= n
+
+    clen = math.sqrt(x * x + y * y + z * z)
+    if clen < 1e-03:
+        # The centroid is too close to the earth center, the
+        # projection to earth's surface is not well defined.
+        # Prefer to raise an error rather than returning an
+        # arbitrary result.
+        raise ValueError("singularity error: centroid is too close "
+                         "to earth center (%e)" % clen)
+
+    lat = 180.0 * math.atan2(z, math.sqrt(x * x + y * y)) / math.pi
+    lon = 180.0 * math.atan2(y, x) / math.pi
+    return (lat, lon)
+
+def _centroid_radius(lats, lons, radius):
+    """Centroid of the points (lats, lons) in degree and their radius.
+
+    Return the centroid as (lat, lon) in degree and the maximal
+    distance of any of the points from the centroid on a sphere
+    having the given radius.
+    """
+    lat0, lon0 = _centroid(lats, lons)
+    return (lat0, lon0), max(_distances(lat0, lon0, lats, lons, radius))
+
+
 class deg(float):
     """A degree as float that can be converted to (degree, minute, second).
     """
+    __slots__ = ()
     def __abs__(self):
         return deg(super().__abs__())
     def dms(self):
@@ -25,6 +120,7 @@ class deg(float):
 class lat(deg):
     """Latitude, which is either N or S.
     """
+    __slots__ = ()
     def ref(self):
         return 'N' if self >= 0 else 'S'
     def dmsref(self):
@@ -33,6 +129,7 @@ class lat(deg):
 class lon(deg):
     """Longitude, which is either E or W.
     """
+    __slots__ = ()
     def ref(self):
         return 'E' if self >= 0 else 'W'
     def dmsref(self):
@@ -41,6 +138,8 @@ class lon(deg):
 
 class GeoPosition(object):
 
+    __slots__ = ('lat', 'lon')
+
     earthRadius = 6371.0
     """approximate radius of the earth in km."""
 
@@ -82,6 +181,10 @@ class GeoPosition(object):
         else:
             raise TypeError("invalid type '%s'" % type(pos))
 
+    def __reduce__(self):
+        # Needed for pickle protocols 0 and 1 with __slots__.
+        return (self.__class__, ((float(self.lat), float(self.lon)),))
+
     def __str__(self):
         return ("%d\xb0 %d\u2032 %.2f\u2033 %s, "
                 "%d\xb0 %d\u2032 %.2f\u2033 %s"
@@ -114,48 +217,127 @@ class GeoPosition(object):
         simplifying assumed the earth to be a sphere.
         """
         if isinstance(other, GeoPosition):
-            lat1 = math.pi * self.lat / 180.0
-            lat2 = math.pi * other.lat / 180.0
-            lon1 = math.pi * self.lon / 180.0
-            lon2 = math.pi * other.lon / 180.0
-            slat = math.sin((lat1-lat2)/2.0)
-            slon = math.sin((lon1-lon2)/2.0)
-            c1 = math.cos(lat1)
-            c2 = math.cos(lat2)
-            sigma = 2.0*math.asin(math.sqrt(slat*slat + c1*c2*slon*slon))
-            return self.earthRadius * sigma
+            return _distance(self.lat, self.lon, other.lat, other.lon,
+                             self.earthRadius)
         else:
             return NotImplemented
 
+    def distances(self, positions):
+        """Distances of this GeoPosition to each of positions.
+
+        Return a list of distances in km, such that the i-th element
+        is equal to self - positions[i].  The calculation is
+        vectorized if numpy is available.
+        """
+        positions = list(positions)
+        lats = [ p.lat for p in positions ]
+        lons = [ p.lon for p in positions ]
+        return _distances(self.lat, self.lon, lats, lons, self.earthRadius)
+
     @classmethod
     def centroid(cls, positions):
         """Return the centroid of GeoPositions.
         """
-        x = y = z = 0.0
-        n = 0
+        positions = list(positions)
+        lats = [ p.lat for p in positions ]
+        lons = [ p.lon for p in positions ]
+        return cls(_centroid(lats, lons))
 
-        for pos in positions:
-            lat = math.pi * pos.lat / 180.0
-            lon = math.pi * pos.lon / 180.0
-            x += math.cos(lat) * math.cos(lon)
-            y += math.cos(lat) * math.sin(lon)
-            z += math.sin(lat)
-            n += 1
-        if not n:
-            raise ValueError("positions must not be empty")
-        x /= n
-        y /= n
-        z /= n
-
-        clen = math.sqrt(x * x + y * y + z * z)
-        if clen < 1e-03:
-            # The centroid is too close to the earth center, the
-            # projection to earth's surface is not well defined.
-            # Prefer to raise an error rather than returning an
-            # arbitrary result.
-            raise ValueError("singularity error: centroid is too close "
-                             "to earth center (%e)" % clen)
-
-        lat = 180.0 * math.atan2(z, math.sqrt(x * x + y * y)) / math.pi
-        lon = 180.0 * math.atan2(y, x) / math.pi
-        return cls((lat, lon))
+    @classmethod
+    def centroid_radius(cls, positions):
+        """Return the centroid of GeoPositions and the radius.
+
+        The radius is the maximal distance in km of any of the
+        positions from the centroid.  The calculation is vectorized
+        if numpy is available.
+        """
+        positions = list(positions)
+        lats = [ p.lat for p in positions ]
+        lons = [ p.lon for p in positions ]
+        centroid, radius = _centroid_radius(lats, lons, cls.earthRadius)
+        return (cls(centroid), radius)
+
+
+class GeoIndex(object):
+    """A spatial index of objects having a GeoPosition.
+
+    The objects are sorted into the cells of a grid in latitude and
+    longitude.  Searching the objects close to a position only needs
+    to consider the cells overlapping with a bounding box around that
+    position.
+    """
+
+    cellSize = 0.1
+    """size of the grid cells in degree."""
+
+    def __init__(self, objects, key):
+        self.nlat = round(180.0 / self.cellSize)
+        self.nlon = round(360.0 / self.cellSize)
+        self.cells = {}
+        for o in objects:
+            pos = key(o)
+            if pos:
+                lat, lon = float(pos.lat), float(pos.lon)
+                cell = self.cells.setdefault(self._cell(lat, lon), [])
+                cell.append((lat, lon, o))
+
+    def _cell(self, lat, lon):
+        i = min(int((lat + 90.0) // self.cellSize), self.nlat - 1)
+        j = int((lon + 180.0) // self.cellSize) % self.nlon
+        return (i, j)
+
+    def _select(self, pos, radius):
+        """Return (lat, lon, object) within a bounding box around pos.
+        """
+        lat0, lon0 = float(pos.lat), float(pos.lon)
+        d = radius / GeoPosition.earthRadius
+        dlat = math.degrees(d)
+        latmin = lat0 - dlat
+        latmax = lat0 + dlat
+        if latmin <= -90.0 or latmax >= 90.0:
+            # One of the poles is within the radius.
+            dlon = 180.0
+        else:
+            s = math.sin(d) / math.cos(math.radians(lat0))
+            dlon = 180.0 if s >= 1.0 else math.degrees(math.asin(s))
+        imin = max(int((latmin + 90.0) // self.cellSize), 0)
+        imax = min(int((latmax + 90.0) // self.cellSize), self.nlat - 1)
+        jmin = int((lon0 - dlon + 180.0) // self.cellSize)
+        jmax = int((lon0 + dlon + 180.0) // self.cellSize)
+        if jmax - jmin + 1 >= self.nlon:
+            jrange = range(self.nlon)
+        else:
+            jrange = [ j % self.nlon for j in range(jmin, jmax + 1) ]
+        if (imax - imin + 1) * len(jrange) > len(self.cells):
+            # Cheaper to consider all non-empty cells.
+            jset = set(jrange)
+            cells = [ c for c in self.cells
+                      if imin <= c[0] <= imax and c[1] in jset ]
+        else:
+            cells = [ (i, j) for i in range(imin, imax + 1) for j in jrange ]
+        objects = []
+        for c in cells:
+            for (lat, lon, o) in self.cells.get(c, ()):
+                if (latmin <= lat <= latmax and
+                    abs((lon - lon0 + 180.0) % 360.0 - 180.0) <= dlon):
+                    objects.append((lat, lon, o))
+        return objects
+
+    def select(self, pos, radius):
+        """Return the objects within a bounding box around pos.
+
+        The bounding box contains all points having a distance of
+        at most radius km from pos.  It is up to the caller to
+        check the exact distance of the objects returned.
+        """
+        return [ o for (lat, lon, o) in self._select(pos, radius) ]
+
+    def within(self, pos, radius):
+        """Return the objects having a distance of at most radius km to pos.
+        """
+        candidates = self._select(pos, radius)
+        lats = [ c[0] for c in candidates ]
+        lons = [ c[1] for c in candidates ]
+        dists = _distances(pos.lat, pos.lon, lats, lons,
+                           GeoPosition.earthRadius)
+        return [ c[2] for c, d in zip(candidates, dists) if d <= radius ]
@@ -3,6 +3,7 @@
 
 import argparse
 import datetime
+import itertools
 from pathlib import Path
 import re
 from photoidx.geo import GeoPosition
@@ -42,6 +43,10 @@ def strpdate(s):
 
 class IdxFilter(object):
 
+    # The number of items for which the GPS position criterion is
+    # evaluated at once in filter().
+    _chunksize = 1024
+
     @classmethod
     def from_args(cls, args):
         kwargs = {}
@@ -77,7 +82,23 @@ class IdxFilter(object):
         else:
             self.filelist = None
 
+    def selects_all(self):
+        """Check whether the filter has no criteria at all.
+        """
+        return (self.filelist is None and self.taglist is None and
+                self.select is None and not self.date and not self.gpspos)
+
     def __call__(self, item):
+        return self.match(item)
+
+    def match(self, item, gps=True):
+        """Check whether item matches the criteria.
+
+        If gps is False, the GPS position criterion is not checked.
+        This is intended for callers that evaluate it by other means,
+        such as a geo index or GeoPosition.distances() on many items
+        at once.
+        """
         if self.filelist and not item.filename in self.filelist:
             return False
         if self.taglist is not None:
@@ -89,17 +110,49 @@ class IdxFilter(object):
                 return False
         if self.select is not None and item.selected != self.select:
             return False
-        if self.date and (item.createDate < self.date[0] or 
+        if self.date and (item.createDate is None or
+                          item.createDate < self.date[0] or 
                           item.createDate >= self.date[1]):
             return False
-        if self.gpspos:
+        if self.gpspos and gps:
             if (not item.gpsPosition or
                 (item.gpsPosition - self.gpspos) > self.gpsradius):
                 return False
         return True
 
     def filter(self, idx):
-        return filter(self, idx)
+        """Return the items from idx that match the criteria.
+
+        If idx provides a query() method, the evaluation is
+        delegated to that, so that idx may use a more efficient
+        strategy than testing all items one by one.  Otherwise, idx
+        may be any iterable of items, including a generator such as
+        returned by Index.stream(), the items are then filtered while
+        iterating.  In the latter case, the GPS position criterion
+        is evaluated for chunks of items at once.
+        """
+        try:
+            query = idx.query
+        except AttributeError:
+            if self.gpspos:
+                return self._filter_gps(idx)
+            else:
+                return filter(self, idx)
+        else:
+            return query(self)
+
+    def _filter_gps(self, items):
+        it = iter(items)
+        while True:
+            chunk = list(itertools.islice(it, self._chunksize))
+            if not chunk:
+                break
+            chunk = [ i for i in chunk
+                      if i.gpsPosition and self.match(i, gps=False) ]
+            dists = self.gpspos.distances(i.gpsPosition for i in chunk)
+            for item, d in zip(chunk, dists):
+                if d <= self.gpsradius:
+                    yield item
 
 
 def addFilterArguments(argparser):
@@ -7,74 +7,273 @@ from photoidx.exif import Orientation, Exif
 from photoidx.geo import GeoPosition
 
 
-def _checksum(fname, hashalg):
-    """Calculate hashes for a file.
+def _checksum(f, hashalg, blocksize=1024*1024):
+    """Calculate hashes for the content of a binary file object.
+
+    The file is read from the current position in blocks of
+    blocksize bytes into the same buffer, such that the memory used
+    does not depend on the size of the file.  hashlib releases the
+    GIL while hashing large blocks, so that several files may be
+    hashed in parallel in threads.  Return the hashes and the number
+    of bytes read.
+    """
+    hashes = [ hashlib.new(h) for h in hashalg ]
+    buf = bytearray(blocksize)
+    view = memoryview(buf)
+    size = 0
+    while True:
+        n = f.readinto(buf)
+        if not n:
+            break
+        for h in hashes:
+            h.update(view[:n])
+        size += n
+    return { a: h.hexdigest() for a, h in zip(hashalg, hashes) }, size
+
+
+def _readfile(fname, hashalg):
+    """Read an image file, calculate hashes and extract the EXIF data.
+
+    The file is opened only once: the EXIF parser seeks in the file
+    and only reads the parts of it it needs.  The hashes are then
+    calculated reading the file in blocks, so that the whole content
+    is never held in memory.
     """
-    if not hashalg:
-        return {}
-    m = { h:hashlib.new(h) for h in hashalg }
-    chunksize = 8192
     with fname.open('rb') as f:
-        while True:
-            chunk = f.read(chunksize)
-            if not chunk:
-                break
-            for h in hashalg:
-                m[h].update(chunk)
-    return { h: m[h].hexdigest() for h in hashalg }
+        exifdata = Exif(f)
+        if not hashalg:
+            return {}, exifdata
+        f.seek(0)
+        return _checksum(f, hashalg)[0], exifdata
+
+
+def _filestat(st):
+    """Convert the status of an image file to the format in the index.
+    """
+    return {
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'inode': st.st_ino,
+    }
+
+
+class TagSet(set):
+    """The set of tags of an IdxItem.
+
+    A set that reports all modifications to the item it belongs to,
+    such that the item may keep the tag index of its Index up to
+    date.
+    """
+
+    __slots__ = ('item',)
+
+    def __init__(self, tags=(), item=None):
+        super().__init__(tags)
+        self.item = item
+
+    def _changed(self, added, removed):
+        if self.item is not None and (added or removed):
+            self.item._tags_changed(added, removed)
+
+    def add(self, tag):
+        if tag not in self:
+            super().add(tag)
+            self._changed({tag}, set())
+
+    def discard(self, tag):
+        if tag in self:
+            super().discard(tag)
+            self._changed(set(), {tag})
+
+    def remove(self, tag):
+        super().remove(tag)
+        self._changed(set(), {tag})
+
+    def pop(self):
+        tag = super().pop()
+        self._changed(set(), {tag})
+        return tag
+
+    def clear(self):
+        removed = set(self)
+        super().clear()
+        self._changed(set(), removed)
+
+    def update(self, *others):
+        added = set().union(*others) - self
+        super().update(added)
+        self._changed(added, set())
+
+    def difference_update(self, *others):
+        removed = self & set().union(*others)
+        super().difference_update(removed)
+        self._changed(set(), removed)
+
+    def intersection_update(self, *others):
+        removed = self - set(self).intersection(*others)
+        super().difference_update(removed)
+        self._changed(set(), removed)
+
+    def symmetric_difference_update(self, other):
+        other = set(other)
+        added = other - self
+        removed = self & other
+        super().symmetric_difference_update(other)
+        self._changed(added, removed)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
+
+
+def _decode_gpsPosition(value):
+    return GeoPosition(value) if value else None
+
+def _lazy_attribute(slot, cls, decode):
+    """Return a property that decodes the value on first access.
+
+    The slot holds the raw value as read from the index file until
+    the first access, it is then replaced by the decoded value, an
+    instance of cls.  None is never decoded.
+    """
+    def fget(self):
+        value = getattr(self, slot)
+        if value is not None and not isinstance(value, cls):
+            value = decode(value)
+            setattr(self, slot, value)
+        return value
+    def fset(self, value):
+        setattr(self, slot, value)
+    return property(fget, fset)
 
 
 class IdxItem(object):
+    """An item in the index.
 
-    def __init__(self, data=None, filename=None, basedir=None, hashalg=['md5']):
+    When created from the data read from the index file, the more
+    expensive attributes keep the raw values from the data and are
+    only decoded on first access.  Attributes that have never been
+    accessed are written back from the raw values as they are.
+    """
+
+    __slots__ = ('_filename', 'name', 'checksum', 'createDate',
+                 '_orientation', '_gpsPosition', '_tags', 'selected',
+                 'fileStat', 'tagIndex')
+
+    def __init__(self, data=None, filename=None, basedir=None, hashalg=['md5'],
+                 filestat=None):
+        self.tagIndex = None
+        self._tags = None
         if data is not None:
-            self.filename = Path(data.get('filename'))
+            self._filename = data.get('filename')
             self.name = data.get('name', None)
             self.checksum = data.get('checksum', {})
             if not self.checksum and 'md5' in data:
                 # legacy: old index file format used to have a 'md5'
                 # attribute, rather then 'checksum'.
-                self.checksum['md5'] = data['md5']
+                self.checksum = {'md5': data['md5']}
             self.createDate = data.get('createDate')
             if self.createDate is None and 'createdate' in data:
                 # legacy: 'createDate' used to be 'createdate' in old
                 # index file format.
                 self.createDate = data['createdate']
-            self.orientation = Orientation(data.get('orientation'))
-            self.gpsPosition = data.get('gpsPosition')
-            tags = data.get('tags', [])
-            self.tags = set(filter(lambda t: not t.startswith('pidx:'), tags))
+            self._orientation = data.get('orientation')
+            self._gpsPosition = data.get('gpsPosition') or None
+            tags = data.get('tags') or []
+            self._tags = tags
             self.selected = 'pidx:selected' in tags
+            self.fileStat = data.get('fileStat')
         elif filename is not None:
             filename = Path(filename)
             self.filename = filename
             self.name = None
             if basedir is not None:
                 filename = Path(basedir) / filename
-            self.checksum = _checksum(filename, hashalg)
-            exifdata = Exif(filename)
+            self.checksum, exifdata = _readfile(filename, hashalg)
             self.createDate = exifdata.createDate
             self.orientation = exifdata.orientation
-            self.gpsPosition = exifdata.gpsPosition
+            if exifdata.gpsPosition:
+                self.gpsPosition = GeoPosition(exifdata.gpsPosition)
+            else:
+                self.gpsPosition = None
             self.tags = set()
             self.selected = False
-        if self.gpsPosition:
-            self.gpsPosition = GeoPosition(self.gpsPosition)
+            self.fileStat = _filestat(filestat) if filestat else None
+
+    filename = _lazy_attribute('_filename', Path, Path)
+    orientation = _lazy_attribute('_orientation', Orientation, Orientation)
+    gpsPosition = _lazy_attribute('_gpsPosition', GeoPosition,
+                                  _decode_gpsPosition)
+
+    @staticmethod
+    def _decode_tags(tags):
+        return set(filter(lambda t: not t.startswith('pidx:'), tags))
+
+    @property
+    def tags(self):
+        if self._tags is not None and not isinstance(self._tags, TagSet):
+            self._tags = TagSet(self._decode_tags(self._tags), self)
+        return self._tags
+
+    @tags.setter
+    def tags(self, tags):
+        old = self._tags
+        self._tags = TagSet(tags, self)
+        if old is None:
+            return
+        if isinstance(old, TagSet):
+            old.item = None
+        else:
+            old = self._decode_tags(old)
+        self._tags_changed(self._tags - old, old - self._tags)
+
+    def _tags_changed(self, added, removed):
+        if self.tagIndex is not None:
+            self.tagIndex.update(self, added, removed)
 
     def as_dict(self):
-        tags = self.tags.copy()
+        tags = self._tags
+        if isinstance(tags, TagSet):
+            tags = set(tags)
+        else:
+            tags = self._decode_tags(tags)
         if self.selected:
-             tags.add('pidx:selected')
+            tags.add('pidx:selected')
+        orientation = self._orientation
+        if not isinstance(orientation, str):
+            orientation = str(orientation) if orientation else None
+        gpsPosition = self._gpsPosition
+        if isinstance(gpsPosition, GeoPosition):
+            gpsPosition = gpsPosition.as_dict()
         d = {
-            'filename': str(self.filename),
+            'filename': str(self._filename),
             'checksum': self.checksum,
             'createDate': self.createDate,
-            'orientation': str(self.orientation) if self.orientation else None,
-            'gpsPosition': self.gpsPosition,
+            'orientation': orientation,
+            'gpsPosition': gpsPosition,
             'tags': sorted(tags),
         }
-        if d['gpsPosition']:
-            d['gpsPosition'] = d['gpsPosition'].as_dict()
         if self.name is not None:
             d['name'] = self.name
+        if self.fileStat is not None:
+            d['fileStat'] = self.fileStat
         return d
+
+    def filestat_matches(self, st):
+        """Check whether st is equal to the recorded file status.
+
+        Return False if no file status is recorded.
+        """
+        return self.fileStat is not None and self.fileStat == _filestat(st)
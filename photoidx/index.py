@@ -1,12 +1,33 @@
 """Provide the class Index which represents an index of photos.
 """
 
+import asyncio
+import bisect
+import collections
 from collections.abc import MutableSequence
+from concurrent.futures import ThreadPoolExecutor
 import errno
 import fcntl
+import fnmatch
+import functools
+import hashlib
+import itertools
+import json
 import os
 from pathlib import Path
+import pickle
+import stat
+import struct
+import tempfile
 import yaml
+try:
+    # Use the libyaml based implementation if available, it is
+    # considerably faster and yields the same result.
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+from photoidx.columns import ItemColumns
+from photoidx.geo import GeoIndex
 from photoidx.idxitem import IdxItem
 from photoidx.listtools import LazyList
 
@@ -16,21 +37,390 @@ class AlreadyLockedError(OSError):
         super().__init__(*args)
 
 
-def _readdir(imgdir, basedir, hashalg, known=set()):
-    for f in sorted(imgdir.iterdir()):
-        rel = f.relative_to(basedir)
-        if f.is_file() and f.suffix == '.jpg' and rel not in known:
-            yield IdxItem(filename=rel, basedir=basedir, hashalg=hashalg)
+# File name suffixes of image files, compared case insensitively.
+imageSuffixes = {'.jpg', '.jpeg'}
+
+def _matches(name, relpath, patterns):
+    """Check whether a file name or its relative path match any pattern.
+    """
+    return any(fnmatch.fnmatchcase(name, p) or fnmatch.fnmatchcase(relpath, p)
+               for p in patterns)
+
+def _is_image(name):
+    return os.path.splitext(name)[1].lower() in imageSuffixes
+
+def _scandir(imgdir, basedir, known=set(), recursive=False,
+             include=None, exclude=None):
+    """Scan imgdir for image files.
+
+    Yield pairs of the file name relative to basedir and the
+    os.DirEntry in the order of the file names.  With recursive,
+    subdirectories are scanned as well.  Files and directories
+    matching any of the glob patterns in exclude are skipped and
+    only image files matching any of the patterns in include are
+    considered, if given.  The patterns are matched against the
+    name and against the path relative to imgdir.  Files in known
+    are skipped.  Scanning a directory does not need to call stat()
+    on the entries.
+    """
+    reldir = imgdir.relative_to(basedir)
+    def _scan(path, prefix):
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        for entry in entries:
+            relpath = prefix + entry.name
+            if exclude and _matches(entry.name, relpath, exclude):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    yield from _scan(entry.path, relpath + "/")
+                continue
+            if not _is_image(entry.name):
+                continue
+            if include and not _matches(entry.name, relpath, include):
+                continue
+            rel = reldir / relpath
+            if rel not in known:
+                yield (rel, entry)
+    return _scan(imgdir, "")
+
+def _covers(reldir, rel, recursive=False, include=None, exclude=None):
+    """Check whether the file rel would be found by _scandir() in reldir.
+    """
+    try:
+        parts = rel.relative_to(reldir).parts
+    except ValueError:
+        return False
+    if not parts or len(parts) > 1 and not recursive:
+        return False
+    if exclude:
+        for i, name in enumerate(parts):
+            if _matches(name, "/".join(parts[:i+1]), exclude):
+                return False
+    if not _is_image(parts[-1]):
+        return False
+    if include and not _matches(parts[-1], "/".join(parts), include):
+        return False
+    return True
+
+def _listnames(imgdir, basedir, known=set(), **scanargs):
+    """List the names of the image files in imgdir.
+
+    Yield the file names relative to basedir, skipping those in
+    known.  The keyword arguments are passed to _scandir().
+    """
+    for rel, entry in _scandir(imgdir, basedir, known, **scanargs):
+        yield rel
+
+def _listdir(imgdir, basedir, known=set(), **scanargs):
+    """List the image files in imgdir.
+
+    Yield pairs of the file name relative to basedir and the file
+    status.  Files in known are skipped without calling stat() on
+    them.  The keyword arguments are passed to _scandir().
+    """
+    for rel, entry in _scandir(imgdir, basedir, known, **scanargs):
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            yield (rel, st)
+
+def _readfiles_async(files, basedir, hashalg, concurrency, filestat=False):
+    """Create IdxItems from pairs of file name and file status.
+
+    On network file systems, the time to stat and to read the files
+    is dominated by the latency of the requests.  Therefore, an
+    asyncio event loop keeps up to concurrency files in progress at
+    any time, the blocking calls being run in an executor.  The file
+    status may be None, stat() is then called as part of the
+    processing of the file, skipping files that are not regular
+    files.  The items are yielded in the order of files.  No more
+    files are started than the consumer has taken items, so that
+    the results waiting to be consumed are bounded.
+    """
+    loop = asyncio.new_event_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def _item(rel, st):
+        path = basedir / rel
+        if st is None:
+            try:
+                st = await loop.run_in_executor(executor, path.stat)
+            except OSError:
+                return None
+            if not stat.S_ISREG(st.st_mode):
+                return None
+        item = functools.partial(IdxItem, filename=rel, basedir=basedir,
+                                 hashalg=hashalg,
+                                 filestat=st if filestat else None)
+        return await loop.run_in_executor(executor, item)
+
+    files = iter(files)
+    pending = collections.deque()
+    try:
+        for rel, st in itertools.islice(files, concurrency):
+            pending.append(loop.create_task(_item(rel, st)))
+        while pending:
+            item = loop.run_until_complete(pending.popleft())
+            for rel, st in itertools.islice(files, 1):
+                pending.append(loop.create_task(_item(rel, st)))
+            if item is not None:
+                yield item
+    finally:
+        if pending:
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending,
+                                                   return_exceptions=True))
+        executor.shutdown()
+        loop.close()
+
+def _readfiles(files, basedir, hashalg, jobs=None, filestat=False,
+               concurrency=None):
+    """Create IdxItems from pairs of file name and file status.
+    """
+    def _item(f):
+        rel, st = f
+        return IdxItem(filename=rel, basedir=basedir, hashalg=hashalg,
+                       filestat=st if filestat else None)
+    if concurrency and concurrency > 1:
+        yield from _readfiles_async(files, basedir, hashalg, concurrency,
+                                    filestat)
+    elif jobs and jobs > 1:
+        # Reading the files and calculating the checksums is I/O
+        # bound and hashlib releases the GIL, so threads are
+        # sufficient here.  The results are taken in the order of
+        # the input, so the order of the items is the same as in the
+        # sequential case.  Only a few files per thread are submitted
+        # ahead, so that the pending results are bounded.
+        files = iter(files)
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            pending = collections.deque(
+                executor.submit(_item, f)
+                for f in itertools.islice(files, 2 * jobs))
+            try:
+                while pending:
+                    item = pending.popleft().result()
+                    for f in itertools.islice(files, 1):
+                        pending.append(executor.submit(_item, f))
+                    yield item
+            finally:
+                for future in pending:
+                    future.cancel()
+    else:
+        for f in files:
+            yield _item(f)
+
+def _readdir(imgdir, basedir, hashalg, known=set(), jobs=None,
+             filestat=False, concurrency=None, **scanargs):
+    if concurrency and concurrency > 1:
+        # Leave it to _readfiles_async() to stat the files concurrently.
+        files = ( (rel, None)
+                  for rel in _listnames(imgdir, basedir, known, **scanargs) )
+    else:
+        files = _listdir(imgdir, basedir, known, **scanargs)
+    return _readfiles(files, basedir, hashalg, jobs, filestat, concurrency)
+
+
+# The cache file starts with a header containing a magic string, the
+# version of the cache format, and the size, the modification time,
+# and the SHA-1 digest of the index file it has been created from,
+# followed by the pickled list of items as read from the index file.
+# Size and modification time allow to reject a stale cache quickly.
+# But on file systems with a coarse time granularity, the index file
+# may be rewritten with the same size without changing the
+# modification time, so the content must be checked as well.
+_cache_magic = b"PHOTOIDX"
+_cache_version = 2
+_cache_header = struct.Struct("<8sIQQ20s")
+_cache_protocol = 4
+
+def _digest(fd, blocksize=1024*1024):
+    """Return the SHA-1 digest of the content of a file.
+
+    The file is read using pread(), so that the file position of fd
+    is not changed.
+    """
+    h = hashlib.sha1()
+    offset = 0
+    while True:
+        data = os.pread(fd, blocksize, offset)
+        if not data:
+            break
+        h.update(data)
+        offset += len(data)
+    return h.digest()
+
+class _NodeComposer(yaml.composer.Composer):
+    """Compose YAML nodes from the events of a loader.
+
+    The libyaml based loader can only compose complete documents.
+    This composer may be used to compose the elements of a sequence
+    one by one instead.
+    """
+
+    def __init__(self, loader):
+        super().__init__()
+        self.loader = loader
+
+    def check_event(self, *choices):
+        return self.loader.check_event(*choices)
+
+    def peek_event(self):
+        return self.loader.peek_event()
+
+    def get_event(self):
+        return self.loader.get_event()
+
+    def descend_resolver(self, current_node, current_index):
+        return self.loader.descend_resolver(current_node, current_index)
+
+    def ascend_resolver(self):
+        return self.loader.ascend_resolver()
+
+    def resolve(self, kind, value, implicit):
+        return self.loader.resolve(kind, value, implicit)
+
+def _iter_yaml_sequence(stream):
+    """Parse a YAML document being a sequence and yield its elements.
+    """
+    loader = SafeLoader(stream)
+    composer = _NodeComposer(loader)
+    try:
+        loader.get_event()
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+        loader.get_event()
+        if not loader.check_event(yaml.SequenceStartEvent):
+            raise ValueError("invalid index file: not a sequence")
+        loader.get_event()
+        while not loader.check_event(yaml.SequenceEndEvent):
+            node = composer.compose_node(None, None)
+            yield loader.construct_document(node)
+    finally:
+        loader.dispose()
+
+
+class _CacheUnpickler(pickle.Unpickler):
+    """Unpickler for the cache, only allowing the classes needed.
+    """
+    _allowed = { "date", "datetime", "timedelta", "timezone" }
+    def find_class(self, module, name):
+        if module == "datetime" and name in self._allowed:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError("%s.%s is not allowed in the cache"
+                                     % (module, name))
+
+
+class _TagIndex(object):
+    """Map tags to the set of items having that tag.
+
+    The items report modifications of their tags to the tag index,
+    so it is kept up to date.
+    """
+
+    def __init__(self, items):
+        self.tags = {}
+        self.untagged = set()
+        for i in items:
+            self.add(i)
+
+    def add(self, item):
+        item.tagIndex = self
+        if item.tags:
+            for t in item.tags:
+                self.tags.setdefault(t, set()).add(item)
+        else:
+            self.untagged.add(item)
+
+    def remove(self, item):
+        if item.tagIndex is self:
+            item.tagIndex = None
+        for t in item.tags:
+            self._discard(t, item)
+        self.untagged.discard(item)
+
+    def _discard(self, tag, item):
+        items = self.tags.get(tag)
+        if items is not None:
+            items.discard(item)
+            if not items:
+                del self.tags[tag]
+
+    def update(self, item, added, removed):
+        for t in added:
+            self.tags.setdefault(t, set()).add(item)
+        for t in removed:
+            self._discard(t, item)
+        if item.tags:
+            self.untagged.discard(item)
+        else:
+            self.untagged.add(item)
+
+    def select(self, taglist, negtaglist):
+        """Return the set of items matching the tag criteria.
+
+        The criteria are the same as the taglist and negtaglist in
+        IdxFilter.  Return None if the criteria cannot be evaluated
+        without considering all items, e.g. if there are only
+        negative tags.
+        """
+        if taglist:
+            sets = sorted((self.tags.get(t, set()) for t in taglist), key=len)
+            items = sets[0].intersection(*sets[1:])
+            for t in negtaglist:
+                items -= self.tags.get(t, set())
+            return items
+        elif not negtaglist:
+            return set(self.untagged)
+        else:
+            return None
+
+
+class _DateIndex(object):
+    """The items sorted by createDate.
+
+    Items having no createDate are not included, they never match a
+    date interval.  The date index does not track modifications of
+    the createDate of items.
+    """
+
+    def __init__(self, items):
+        dated = sorted((i.createDate, p, i) for p, i in enumerate(items)
+                       if i.createDate is not None)
+        self.dates = [ d for (d, p, i) in dated ]
+        self.items = [ i for (d, p, i) in dated ]
+
+    def select(self, start, end):
+        """Return the items having start <= createDate < end.
+        """
+        lo = bisect.bisect_left(self.dates, start)
+        hi = bisect.bisect_left(self.dates, end, lo)
+        return self.items[lo:hi]
 
 
 class Index(MutableSequence):
 
     defIdxFilename = Path(".index.yaml")
+    cacheSuffix = ".cache"
+    journalSuffix = ".journal"
+    journalMaxSize = 1024*1024
 
-    def __init__(self, idxfile=None, imgdir=None, hashalg=['md5']):
+    def __init__(self, idxfile=None, imgdir=None, hashalg=['md5'], jobs=None,
+                 filestat=False, columnar=False, concurrency=None,
+                 recursive=False, include=None, exclude=None):
         super().__init__()
+        self.columnar = columnar
         self.directory = None
         self.idxfile = None
+        self.idxfilename = None
+        self._tagindex = None
+        self._positions = None
+        self._dateindex = None
+        self._geoindex = None
+        self._queried = False
         self.items = []
         if idxfile:
             self.read(idxfile)
@@ -38,17 +428,84 @@ class Index(MutableSequence):
             imgdir = Path(imgdir).resolve()
             if not self.directory:
                 self.directory = imgdir
-            if idxfile:
-                self.extend_dir(imgdir, hashalg)
+            scanargs = dict(recursive=recursive,
+                            include=include, exclude=exclude)
+            if idxfile and filestat:
+                self.update_dir(imgdir, hashalg, jobs, concurrency,
+                                **scanargs)
+            elif idxfile:
+                self.extend_dir(imgdir, hashalg, jobs,
+                                concurrency=concurrency, **scanargs)
             else:
-                newitems = _readdir(imgdir, self.directory, hashalg)
+                newitems = _readdir(imgdir, self.directory, hashalg,
+                                    jobs=jobs, filestat=filestat,
+                                    concurrency=concurrency, **scanargs)
                 self.items = LazyList(newitems)
 
-    def extend_dir(self, imgdir, hashalg=['md5']):
+    def extend_dir(self, imgdir, hashalg=['md5'], jobs=None, filestat=False,
+                   concurrency=None, recursive=False, include=None,
+                   exclude=None):
+        """Add the images in imgdir that are not yet in the index.
+
+        With recursive, the images in subdirectories are added as
+        well.  Files and directories matching any of the glob
+        patterns in exclude are skipped.  If include is given, only
+        images matching any of its patterns are added.
+        """
         imgdir = Path(imgdir).resolve()
         known = { i.filename for i in self.items }
-        newitems = _readdir(imgdir, self.directory, hashalg, known)
-        self.items.extend(newitems)
+        newitems = _readdir(imgdir, self.directory, hashalg, known, jobs,
+                            filestat, concurrency, recursive=recursive,
+                            include=include, exclude=exclude)
+        self.extend(newitems)
+
+    def update_dir(self, imgdir, hashalg=['md5'], jobs=None,
+                   concurrency=None, recursive=False, include=None,
+                   exclude=None):
+        """Update the index to the current state of the images in imgdir.
+
+        Add new images, re-read images that have been modified and
+        remove items whose image file is gone.  Modifications are
+        detected by comparing the file status recorded in the items
+        with the current one, so an unchanged image costs only one
+        stat() call.  Items having no file status recorded are
+        re-read.  The file status is recorded for all new or
+        re-read items.  The remaining arguments select the images
+        as in extend_dir(), items not selected by them are left
+        alone.
+        """
+        imgdir = Path(imgdir).resolve()
+        reldir = imgdir.relative_to(self.directory)
+        scanargs = dict(recursive=recursive, include=include, exclude=exclude)
+        files = dict(_listdir(imgdir, self.directory, **scanargs))
+        items = []
+        modified = []
+        for item in self.items:
+            if _covers(reldir, item.filename, **scanargs):
+                try:
+                    st = files.pop(item.filename)
+                except KeyError:
+                    # The image file is gone.
+                    continue
+                if not item.filestat_matches(st):
+                    modified.append((len(items), (item.filename, st)))
+            items.append(item)
+        newfiles = sorted(files.items())
+        if modified:
+            positions, modfiles = zip(*modified)
+            newitems = _readfiles(modfiles, self.directory, hashalg, jobs,
+                                  filestat=True, concurrency=concurrency)
+            for pos, new in zip(positions, newitems):
+                # Keep the information that has been added to the
+                # item by the user.
+                old = items[pos]
+                new.name = old.name
+                new.tags = old.tags
+                new.selected = old.selected
+                items[pos] = new
+        items.extend(_readfiles(newfiles, self.directory, hashalg, jobs,
+                                filestat=True, concurrency=concurrency))
+        self.items = items
 
     def close(self):
         if self.idxfile:
@@ -64,6 +521,58 @@ class Index(MutableSequence):
     def __del__(self):
         self.close()
 
+    @property
+    def items(self):
+        return self._items
+
+    @items.setter
+    def items(self, items):
+        if self._tagindex is not None:
+            for i in self._items:
+                if i.tagIndex is self._tagindex:
+                    i.tagIndex = None
+            self._tagindex = None
+        self._positions = None
+        self._dateindex = None
+        self._geoindex = None
+        self._items = items
+
+    def _get_tagindex(self):
+        if self._tagindex is None:
+            self._tagindex = _TagIndex(self.items)
+        return self._tagindex
+
+    def _get_dateindex(self):
+        if self._dateindex is None:
+            self._dateindex = _DateIndex(self.items)
+        return self._dateindex
+
+    def _get_geoindex(self):
+        if self._geoindex is None:
+            self._geoindex = GeoIndex(self.items, lambda i: i.gpsPosition)
+        return self._geoindex
+
+    def _use_index(self, index, candidates):
+        """Check whether to use an optional index in a query.
+
+        Building the date index or the geo index costs more than
+        checking the criterion on all items once.  So it is only used if it
+        already exists, or if this Index has answered queries before
+        and is thus likely to be queried again, as in a server.  Even
+        then, it is not worth it if one of the other candidate sets
+        is already small.
+        """
+        if index is not None:
+            return True
+        if not self._queried:
+            return False
+        return not any(16 * len(c) <= len(self.items) for c in candidates)
+
+    def _get_positions(self):
+        if self._positions is None:
+            self._positions = { i: p for p, i in enumerate(self.items) }
+        return self._positions
+
     def __len__(self):
         return len(self.items)
 
@@ -71,17 +580,128 @@ class Index(MutableSequence):
         return self.items.__getitem__(index)
 
     def __setitem__(self, index, value):
+        if self._tagindex is not None:
+            if isinstance(index, slice):
+                value = list(value)
+                old = self.items[index]
+                new = value
+            else:
+                old = [ self.items[index] ]
+                new = [ value ]
+            for i in old:
+                self._tagindex.remove(i)
+            for i in new:
+                self._tagindex.add(i)
+        self._positions = None
+        self._dateindex = None
+        self._geoindex = None
         self.items.__setitem__(index, value)
 
     def __delitem__(self, index):
+        if self._tagindex is not None:
+            if isinstance(index, slice):
+                old = self.items[index]
+            else:
+                old = [ self.items[index] ]
+            for i in old:
+                self._tagindex.remove(i)
+        self._positions = None
+        self._dateindex = None
+        self._geoindex = None
         self.items.__delitem__(index)
 
     def index(self, value, *args):
         return self.items.index(value, *args)
 
     def insert(self, index, value):
+        if self._tagindex is not None:
+            self._tagindex.add(value)
+        self._positions = None
+        self._dateindex = None
+        self._geoindex = None
         self.items.insert(index, value)
 
+    def tagmap(self):
+        """Return a mapping of tags to the set of items having that tag.
+
+        The mapping is maintained by the index and must not be
+        modified.
+        """
+        return self._get_tagindex().tags
+
+    def tagcounts(self, items=None):
+        """Return a mapping of tags to the number of items having them.
+
+        If items is given, only these are considered.  The counts are
+        taken from the tag index, or from the columns if the items
+        are stored in columns.
+        """
+        if isinstance(self.items, ItemColumns):
+            if items is None:
+                positions = range(len(self.items))
+            else:
+                positions = [ i.pos for i in items ]
+            return self.items.tagcounts(positions)
+        tagmap = self.tagmap()
+        if items is None:
+            return { t: len(s) for t, s in tagmap.items() }
+        items = set(items)
+        counts = {}
+        for t, s in tagmap.items():
+            n = len(s & items)
+            if n:
+                counts[t] = n
+        return counts
+
+    def query(self, idxfilter):
+        """Return the items selected by an IdxFilter.
+
+        The tag, the date, and the GPS position criteria are
+        evaluated first using the tag index, the date index, and the
+        geo index respectively, so that only the items matching these
+        are considered for the remaining criteria.  The date index
+        and the geo index are only used as determined by
+        _use_index(), otherwise the date and the GPS position are
+        checked on the candidates by the filter.  The items are
+        returned in the order of the index.
+
+        If the items are stored in columns, the query is delegated to
+        these.
+        """
+        if isinstance(self.items, ItemColumns):
+            return self.items.query(idxfilter)
+        candidates = []
+        if idxfilter.taglist is not None:
+            tagindex = self._get_tagindex()
+            items = tagindex.select(idxfilter.taglist, idxfilter.negtaglist)
+            if items is not None:
+                candidates.append(items)
+        if idxfilter.date and self._use_index(self._dateindex, candidates):
+            candidates.append(self._get_dateindex().select(*idxfilter.date))
+        geo = (idxfilter.gpspos and
+               self._use_index(self._geoindex, candidates))
+        if geo:
+            geoindex = self._get_geoindex()
+            candidates.append(geoindex.within(idxfilter.gpspos,
+                                              idxfilter.gpsradius))
+        self._queried = True
+        if not candidates:
+            return idxfilter.filter(iter(self))
+        candidates.sort(key=len)
+        items = set(candidates[0]).intersection(*candidates[1:])
+        positions = self._get_positions()
+        return self._query_positions(idxfilter,
+                                     sorted(positions[i] for i in items),
+                                     geo)
+
+    def _query_positions(self, idxfilter, positions, geo):
+        items = ( self.items[p] for p in positions )
+        if geo:
+            # The GPS position has already been checked by the geo index.
+            return ( i for i in items if idxfilter.match(i, gps=False) )
+        else:
+            return idxfilter.filter(items)
+
     def _get_idxfile(self, fname, flags):
         if fname is not None:
             self.close()
@@ -91,6 +711,7 @@ class Index(MutableSequence):
             self.directory = fname.parent.resolve()
             fd = os.open(str(fname), flags, mode=0o666)
             self.idxfile = os.fdopen(fd, "r+t")
+            self.idxfilename = fname
         elif self.idxfile:
             self.idxfile.seek(0)
         else:
@@ -99,6 +720,7 @@ class Index(MutableSequence):
             fname = self.directory / self.defIdxFilename
             fd = os.open(str(fname), flags, mode=0o666)
             self.idxfile = os.fdopen(fd, "r+t")
+            self.idxfilename = fname
 
     def _lockf(self, mode=fcntl.LOCK_SH):
         try:
@@ -108,12 +730,202 @@ class Index(MutableSequence):
                 e = AlreadyLockedError(*e.args)
             raise e
 
+    def lock(self, exclusive=True):
+        """Lock the index file for exclusive access.
+
+        This prevents any other process from accessing the index
+        while a series of modifications is made to the items.  The
+        lock is downgraded to a shared lock again by the next
+        write() or by calling this method with exclusive=False.
+        """
+        self._lockf(mode=fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def _cachefile(self):
+        return self.idxfilename.with_name(self.idxfilename.name
+                                          + self.cacheSuffix)
+
+    def _read_cache(self):
+        """Read the items from the cache file.
+
+        Return None if the cache file does not exist, if it is not
+        up to date with the index file, or if it cannot be read.
+        """
+        fd = self.idxfile.fileno()
+        st = os.fstat(fd)
+        try:
+            with self._cachefile().open("rb") as f:
+                header = _cache_header.unpack(f.read(_cache_header.size))
+                if header[:4] != (_cache_magic, _cache_version,
+                                  st.st_size, st.st_mtime_ns):
+                    return None
+                if header[4] != _digest(fd):
+                    return None
+                return _CacheUnpickler(f).load()
+        except Exception:
+            # The cache is only an optimization.  If anything goes
+            # wrong, silently fall back to reading the index file.
+            return None
+
+    def _write_cache(self, data):
+        """Write the items to the cache file.
+
+        The cache is keyed on the current size, modification time,
+        and content of the index file, so this must be called after
+        the index file has been written.
+        """
+        fd = self.idxfile.fileno()
+        st = os.fstat(fd)
+        cachefile = self._cachefile()
+        header = _cache_header.pack(_cache_magic, _cache_version,
+                                    st.st_size, st.st_mtime_ns,
+                                    _digest(fd))
+        try:
+            with tempfile.NamedTemporaryFile(dir=str(cachefile.parent),
+                                             prefix=cachefile.name,
+                                             delete=False) as f:
+                try:
+                    # NamedTemporaryFile creates the file private to
+                    # the user.  Give it the permissions of the index
+                    # file, so that others reading the index may use
+                    # the cache as well.
+                    os.fchmod(f.fileno(), stat.S_IMODE(st.st_mode))
+                    f.write(header)
+                    pickle.dump(data, f, protocol=_cache_protocol)
+                except BaseException:
+                    os.unlink(f.name)
+                    raise
+            os.replace(f.name, str(cachefile))
+        except (OSError, pickle.PicklingError):
+            # Failing to write the cache, e.g. because the directory
+            # is not writable, is not an error.
+            pass
+
+    def _journalfile(self):
+        return self.idxfilename.with_name(self.idxfilename.name
+                                          + self.journalSuffix)
+
+    def _read_journal(self):
+        """Read the journal.
+
+        Return a mapping of file names to the last entry recorded
+        for that item.
+        """
+        entries = {}
+        try:
+            f = self._journalfile().open("rt", encoding="utf-8")
+        except FileNotFoundError:
+            return entries
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Truncated entry from an interrupted write.
+                    continue
+                entries[entry['filename']] = entry
+        return entries
+
+    def _replay_journal(self):
+        """Apply the modifications recorded in the journal to the items.
+        """
+        entries = self._read_journal()
+        if entries:
+            for item in self.items:
+                entry = entries.get(str(item.filename))
+                if entry:
+                    item.tags = set(entry['tags'])
+                    item.selected = entry['selected']
+
     def read(self, idxfile=None):
         """Read the index from a file.
+
+        A binary cache file is kept next to the index file to speed
+        up reading.  The cache is used if it is up to date with the
+        index file and rebuilt otherwise.  Modifications recorded in
+        the journal are applied to the items.
+
+        If the index has been created with columnar=True, the items
+        are kept in an ItemColumns rather than as a list of IdxItem.
+        This saves memory and speeds up queries, but the index is read
+        only then, except for modifying the tags and the selection
+        state of items.
+        """
+        self._get_idxfile(idxfile, os.O_RDWR)
+        self._lockf()
+        data = self._read_cache()
+        if data is None:
+            data = yaml.load(self.idxfile, Loader=SafeLoader)
+            self._write_cache(data)
+        if self.columnar:
+            self.items = ItemColumns(data)
+        else:
+            self.items = [ IdxItem(data=i) for i in data ]
+        self._replay_journal()
+
+    def stream(self, idxfile=None):
+        """Read the items from the index file one by one.
+
+        Return a generator yielding the items while parsing the
+        index file, such that the first items are available right
+        away and memory usage does not depend on the size of the
+        index.  The modifications recorded in the journal are applied
+        to the items.  The items are not added to this Index, this is
+        meant for read only access.
         """
         self._get_idxfile(idxfile, os.O_RDWR)
         self._lockf()
-        self.items = [ IdxItem(data=i) for i in yaml.safe_load(self.idxfile) ]
+        return self._stream_items(self._read_journal())
+
+    def _stream_items(self, journal):
+        for data in _iter_yaml_sequence(self.idxfile):
+            item = IdxItem(data=data)
+            if journal:
+                entry = journal.get(str(item.filename))
+                if entry:
+                    item.tags = set(entry['tags'])
+                    item.selected = entry['selected']
+            yield item
+
+    def write_journal(self, items):
+        """Record the tags and the selection state of items in the journal.
+
+        This is much cheaper than writing the whole index file if
+        only a few items have been modified.  The journal is
+        replayed by read() and folded into the index file by
+        write().  The journal is compacted right away if it grows
+        larger than journalMaxSize.
+        """
+        if not self.idxfile:
+            # There is no index file yet the journal could refer to.
+            self.write()
+            return
+        lines = []
+        for i in items:
+            entry = {
+                'filename': str(i.filename),
+                'tags': sorted(i.tags),
+                'selected': i.selected,
+            }
+            lines.append(json.dumps(entry) + "\n")
+        if not lines:
+            return
+        self._lockf(mode=fcntl.LOCK_EX)
+        try:
+            with self._journalfile().open("a+b") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    # An interrupted write may have left a truncated
+                    # entry without line end.  Terminate it, so that
+                    # it does not spoil the entry appended now.
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        lines.insert(0, "\n")
+                f.write("".join(lines).encode("utf-8"))
+                size = f.tell()
+        finally:
+            self._lockf()
+        if size > self.journalMaxSize:
+            self.write()
 
     def write(self, idxfile=None):
         """Write the index to a file.
@@ -121,8 +933,14 @@ class Index(MutableSequence):
         items = [ i.as_dict() for i in self.items ]
         self._get_idxfile(idxfile, os.O_RDWR|os.O_CREAT)
         self._lockf(mode=fcntl.LOCK_EX)
-        yaml.dump(items, self.idxfile, default_flow_style=False)
+        yaml.dump(items, self.idxfile, Dumper=SafeDumper,
+                  default_flow_style=False)
         self.idxfile.truncate()
         self.idxfile.flush()
+        self._write_cache(items)
+        try:
+            self._journalfile().unlink()
+        except FileNotFoundError:
+            pass
         self._lockf()
 
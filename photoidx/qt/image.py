@@ -5,6 +5,8 @@ import logging
 import re
 from packaging.version import Version
 from PySide2 import QtCore, QtGui, QtWidgets
+from photoidx.exif import Exif
+from photoidx.thumbcache import ThumbnailCache, default_cachedir
 try:
     import vignette
 except ImportError:
@@ -74,9 +76,22 @@ def _get_transform(orientation):
         return QtGui.QMatrix()
 
 
+def _encode_image(image, format="JPEG"):
+    data = QtCore.QByteArray()
+    buf = QtCore.QBuffer(data)
+    buf.open(QtCore.QIODevice.WriteOnly)
+    image.save(buf, format)
+    buf.close()
+    return data.data()
+
+
 class Image(object):
 
     ThumbnailSize = QtCore.QSize(128, 128)
+    # Thumbnails created by ourselves if vignette is not available.
+    # "normal" is the name used for the size 128 in the freedesktop
+    # thumbnail spec.
+    thumbnailCache = ThumbnailCache(default_cachedir() / "normal")
 
     def __init__(self, basedir, item):
         self.item = item
@@ -84,32 +99,152 @@ class Image(object):
         self.name = item.name or self.fileName.name
         self.init_transform = _get_transform(self.item.orientation)
         self.post_transform = QtGui.QMatrix()
+        self._rawSize = None
 
     @property
     def transform(self):
         return self.post_transform * self.init_transform
 
-    def getPixmap(self):
-        image = QtGui.QImage(str(self.fileName))
+    def _transformSize(self, size, transform=None):
+        # The transforms are rotations by multiples of 90 degrees and
+        # mirrors, so the same mapping works in both directions.
+        if transform is None:
+            transform = self.transform
+        rect = QtCore.QRectF(0, 0, size.width(), size.height())
+        return transform.mapRect(rect).size().toSize()
+
+    def _reader(self):
+        reader = QtGui.QImageReader(str(self.fileName))
+        reader.setAutoTransform(False)
+        return reader
+
+    def _getRawSize(self):
+        if self._rawSize is None:
+            size = self._reader().size()
+            if not size.isValid():
+                raise ImageNotFoundError("Cannot load %s." % self.fileName)
+            self._rawSize = size
+        return self._rawSize
+
+    def getSize(self, transform=None):
+        """Get the full size of the image with the transform applied.
+
+        This only reads the image header.
+        """
+        return self._transformSize(self._getRawSize(), transform)
+
+    def _readImage(self, size=None, transform=None):
+        """Read the image without applying the transform.
+
+        If size is given, the image is read scaled down to fit into
+        size, taken with the transform applied.  For JPEG images, the
+        decoder then only calculates the reduced resolution, which is
+        much faster and needs much less memory than decoding all
+        pixels first and scaling them down afterwards.
+        """
+        reader = self._reader()
+        if size is not None:
+            fullSize = reader.size()
+            if fullSize.isValid():
+                rawSize = self._transformSize(size, transform)
+                scaledSize = fullSize.scaled(rawSize,
+                                             QtCore.Qt.KeepAspectRatio)
+                if scaledSize.width() < fullSize.width():
+                    reader.setScaledSize(scaledSize)
+        image = reader.read()
         if image.isNull():
             raise ImageNotFoundError("Cannot load %s." % self.fileName)
-        return QtGui.QPixmap.fromImage(image).transformed(self.transform)
+        return image
+
+    def getImage(self, size=None, transform=None):
+        """Load the image with the transform applied as QImage.
 
-    def getThumbPixmap(self):
+        If size is given, the image is scaled down to fit into size.
+        This may be called outside the GUI thread, but then the
+        transform should be taken in the GUI thread and passed in, as
+        the image may be rotated meanwhile.
+        """
+        if transform is None:
+            transform = self.transform
+        return self._readImage(size, transform).transformed(transform)
+
+    def getPixmap(self, size=None):
+        """Load the image as QPixmap.
+
+        If size is given, the image is scaled down to fit into size.
+        """
+        return QtGui.QPixmap.fromImage(self.getImage(size))
+
+    def _getExifThumbnail(self):
+        """Get the thumbnail embedded in the EXIF data of the image.
+
+        Return None if there is no embedded thumbnail or if it is not
+        suitable, e.g. because it is smaller than ThumbnailSize or
+        because its aspect ratio does not match the image, which
+        happens if the camera added black bars.
+        """
+        try:
+            data = Exif(self.fileName).thumbnail
+        except Exception:
+            return None
+        if not data:
+            return None
+        thumb = QtGui.QImage.fromData(data)
+        if thumb.isNull():
+            return None
+        size = self._getRawSize()
+        if (thumb.width() < self.ThumbnailSize.width() and
+            thumb.height() < self.ThumbnailSize.height()):
+            return None
+        ratio = size.width() / size.height()
+        if abs(thumb.width() / thumb.height() - ratio) > 0.02 * ratio:
+            return None
+        return thumb.scaled(self.ThumbnailSize,
+                            QtCore.Qt.KeepAspectRatio,
+                            QtCore.Qt.SmoothTransformation)
+
+    def getThumbImage(self):
+        """Load the thumbnail without applying the transform.
+
+        This returns a QImage rather than a QPixmap and thus may be
+        called outside the GUI thread.
+        """
         if vignette:
             thumbpath = vignette.get_thumbnail(str(self.fileName), 'normal')
             image = QtGui.QImage(thumbpath)
             if image.isNull():
                 raise ImageNotFoundError("Cannot load %s." % self.fileName)
-            pixmap = QtGui.QPixmap.fromImage(image)
         else:
-            image = QtGui.QImage(str(self.fileName))
-            if image.isNull():
+            try:
+                key = self.thumbnailCache.key(self.item, self.fileName)
+            except OSError:
                 raise ImageNotFoundError("Cannot load %s." % self.fileName)
-            pixmap = QtGui.QPixmap.fromImage(image)
-            pixmap = pixmap.scaled(self.ThumbnailSize, 
-                                   QtCore.Qt.KeepAspectRatio, 
-                                   QtCore.Qt.SmoothTransformation)
+            data = self.thumbnailCache.get(key)
+            if data:
+                image = QtGui.QImage.fromData(data)
+                if not image.isNull():
+                    return image
+            image = self._getExifThumbnail()
+            if image is None:
+                # Let the decoder scale down to about twice the
+                # target size and do the remaining smooth scaling
+                # ourselves for better quality.
+                image = self._readImage(2 * self.ThumbnailSize)
+                image = image.scaled(self.ThumbnailSize, 
+                                     QtCore.Qt.KeepAspectRatio, 
+                                     QtCore.Qt.SmoothTransformation)
+            self.thumbnailCache.put(key, _encode_image(image))
+        return image
+
+    def getThumbPixmap(self, thumbImage=None):
+        """Get the thumbnail as a QPixmap.
+
+        thumbImage may be the result of a previous call to
+        getThumbImage(), otherwise the thumbnail is loaded.
+        """
+        if thumbImage is None:
+            thumbImage = self.getThumbImage()
+        pixmap = QtGui.QPixmap.fromImage(thumbImage)
         if _thumbs_oriented:
             transform = self.post_transform
         else:
@@ -0,0 +1,87 @@
+"""Load images in the background.
+"""
+
+import collections
+from PySide2 import QtCore
+
+
+class _TaskSignals(QtCore.QObject):
+    """The signals emitted by a _LoadTask.
+
+    QRunnable is not a QObject, so it cannot have signals itself.
+    """
+    done = QtCore.Signal(object, object, object)
+
+
+class _LoadTask(QtCore.QRunnable):
+
+    def __init__(self, image, load, signals):
+        super().__init__()
+        self.image = image
+        self.load = load
+        self.signals = signals
+
+    def run(self):
+        try:
+            result = self.load()
+        except Exception as e:
+            self.signals.done.emit(self.image, None, e)
+        else:
+            self.signals.done.emit(self.image, result, None)
+
+
+class ImageLoader(QtCore.QObject):
+    """Load images in a pool of worker threads.
+
+    A request consists of an image and a function to be called
+    without arguments in a worker thread.  The function should only
+    use thread safe classes such as QImage, but not QPixmap which may
+    only be used in the GUI thread.  The signal loaded is emitted
+    with the image and the result of the function, or failed with the
+    image and the exception if the function raised one.
+
+    Requests are queued in the loader rather than in the thread pool
+    and are handed to the pool one at a time as workers become idle.
+    Thus, pending requests that are no longer needed may still be
+    dropped by clear().  Requests for an image already pending or
+    being loaded are ignored.
+    """
+
+    loaded = QtCore.Signal(object, object)
+    failed = QtCore.Signal(object, object)
+
+    def __init__(self, parent=None, maxThreads=None):
+        super().__init__(parent)
+        self.pool = QtCore.QThreadPool(self)
+        if maxThreads:
+            self.pool.setMaxThreadCount(maxThreads)
+        self.queue = collections.OrderedDict()
+        self.running = set()
+        self._signals = _TaskSignals(self)
+        self._signals.done.connect(self._done)
+
+    def request(self, image, load):
+        """Queue the call of load for image.
+        """
+        if image not in self.running and image not in self.queue:
+            self.queue[image] = load
+            self._schedule()
+
+    def clear(self):
+        """Drop all pending requests.
+        """
+        self.queue.clear()
+
+    def _schedule(self):
+        while self.queue and len(self.running) < self.pool.maxThreadCount():
+            image, load = self.queue.popitem(last=False)
+            self.pool.start(_LoadTask(image, load, self._signals))
+            self.running.add(image)
+
+    def _done(self, image, result, exc):
+        self.running.discard(image)
+        self._schedule()
+        if exc is None:
+            self.loaded.emit(image, result)
+        else:
+            self.failed.emit(image, exc)
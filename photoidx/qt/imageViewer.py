@@ -1,6 +1,7 @@
 """Provide a PySide ImageViewer window.
 """
 
+import functools
 import sys
 from PySide2 import QtCore, QtGui, QtWidgets
 import photoidx.index
@@ -8,12 +9,31 @@ from photoidx.listtools import LazyList
 from photoidx.qt.image import Image
 from photoidx.qt.filterDialog import FilterDialog
 from photoidx.qt.imageInfoDialog import ImageInfoDialog
+from photoidx.qt.imageLoader import ImageLoader
 from photoidx.qt.overviewWindow import OverviewWindow
+from photoidx.qt.pixmapCache import PixmapCache
 from photoidx.qt.tagSelectDialog import TagSelectDialog
 
 
+def _loadScaled(image, scaleFactor, transform):
+    """Load image at the size it will be displayed at.
+    This is called in a worker thread.
+    """
+    size = scaleFactor * image.getSize(transform)
+    return image.getImage(size, transform), transform
+
+def _covers(size, needed):
+    # Allow for rounding when scaling with fixed aspect ratio.
+    return (size.width() + 1 >= needed.width() and
+            size.height() + 1 >= needed.height())
+
+
 class ImageViewer(QtWidgets.QMainWindow):
 
+    # Number of images before and after the current one to load in
+    # the background.
+    prefetchCount = 3
+
     def __init__(self, images, imgFilter, 
                  scaleFactor=1.0, readOnly=False, dirty=False):
         super().__init__()
@@ -27,6 +47,12 @@ class ImageViewer(QtWidgets.QMainWindow):
         self.readOnly = readOnly
         self.dirty = dirty
         self.cur = 0
+        self.imageSize = None
+
+        self.pixmapCache = PixmapCache()
+        self.prefetchLoader = ImageLoader(self)
+        self.prefetchLoader.loaded.connect(self._prefetched)
+        self.prefetchWindow = set()
 
         self.imageInfoDialog = ImageInfoDialog(self.images.directory)
         self.overviewwindow = None
@@ -211,7 +237,10 @@ class ImageViewer(QtWidgets.QMainWindow):
 
     def _setSize(self):
         maxSize = self.maximumSize()
-        imgSize = self.imageLabel.pixmap().size()
+        imgSize = self.imageSize
+        if imgSize is None:
+            # No current image.
+            return
         if self.scaleFactor is None:
             size = maxSize - self._extraSize
             hscale = size.width() / imgSize.width()
@@ -230,6 +259,72 @@ class ImageViewer(QtWidgets.QMainWindow):
         self.imageLabel.resize(size)
         if not self.fullScreenAct.isChecked():
             self.resize(winSize)
+        self._checkResolution()
+
+    def _checkResolution(self):
+        """Reload the current image if the resolution is too low.
+        The image is decoded at the resolution needed for the size
+        it is displayed at.  If that size increases, e.g. when
+        zooming in, the image needs to be decoded again.
+        """
+        pixmap = self.imageLabel.pixmap()
+        if not pixmap or pixmap.isNull():
+            return
+        needed = self.imageLabel.size().boundedTo(self.imageSize)
+        if not _covers(pixmap.size(), needed):
+            image = self.selection[self.cur]
+            self.imageLabel.setPixmap(self._getPixmap(image))
+
+    def _getPixmap(self, image):
+        """Get the pixmap of image at the resolution needed.
+        Take it from the cache, if a pixmap is cached at a
+        sufficient resolution, otherwise load the image.
+        """
+        needed = self.imageLabel.size().boundedTo(self.imageSize)
+        transform = image.transform
+        pixmap = self.pixmapCache.get(image, transform)
+        if pixmap is None or not _covers(pixmap.size(), needed):
+            pixmap = image.getPixmap(self.imageLabel.size())
+            self.pixmapCache.put(image, pixmap, transform)
+        return pixmap
+
+    def _showImage(self, image):
+        """Display image, decoded at the resolution needed.
+        """
+        self.imageSize = image.getSize()
+        self.imageLabel.clear()
+        self._setSize()
+        self.imageLabel.setPixmap(self._getPixmap(image))
+
+    def _prefetch(self):
+        """Load the images next to the current one in the background.
+        Pending requests from previous calls are dropped, as the
+        user may have jumped to another position in the meanwhile.
+        """
+        self.prefetchLoader.clear()
+        window = []
+        for d in range(1, self.prefetchCount + 1):
+            for i in (self.cur + d, self.cur - d):
+                if i < 0:
+                    continue
+                try:
+                    window.append(self.selection[i])
+                except IndexError:
+                    pass
+        self.prefetchWindow = set(window)
+        for image in window:
+            transform = image.transform
+            if self.pixmapCache.get(image, transform) is None:
+                load = functools.partial(_loadScaled, image,
+                                         self.scaleFactor, transform)
+                self.prefetchLoader.request(image, load)
+
+    def _prefetched(self, image, result):
+        # Drop the results of requests that have become stale.
+        if image in self.prefetchWindow:
+            qimage, transform = result
+            pixmap = QtGui.QPixmap.fromImage(qimage)
+            self.pixmapCache.put(image, pixmap, transform)
 
     def _loadImage(self):
         try:
@@ -237,11 +332,12 @@ class ImageViewer(QtWidgets.QMainWindow):
         except IndexError:
             # Nothing to view.
             self.imageLabel.hide()
+            self.imageSize = None
             if self.overviewwindow:
                 self.overviewwindow.markActive(None)
             return
         try:
-            pixmap = image.getPixmap()
+            self._showImage(image)
         except Exception as e:
             print(str(e), file=sys.stderr)
             del self.selection[self.cur]
@@ -249,12 +345,11 @@ class ImageViewer(QtWidgets.QMainWindow):
                 self.overviewwindow.updateThumbs()
             self._loadImage()
             return
-        self.imageLabel.setPixmap(pixmap)
         self.imageLabel.show()
-        self._setSize()
         self.setWindowTitle(image.name)
         if self.overviewwindow:
             self.overviewwindow.markActive(image)
+        self._prefetch()
 
     def _checkActions(self):
         """Enable and disable actions as appropriate.
@@ -326,7 +421,7 @@ class ImageViewer(QtWidgets.QMainWindow):
         self.scaleImage(0.625)
 
     def zoomFitHeight(self):
-        imgHeight = self.imageLabel.pixmap().size().height()
+        imgHeight = self.imageSize.height()
         winHeight = self.scrollArea.viewport().size().height()
         # Leave an internal padding of a few pixel
         winHeight -= 6
@@ -334,7 +429,7 @@ class ImageViewer(QtWidgets.QMainWindow):
         self._setSize()
 
     def zoomFitWidth(self):
-        imgWidth = self.imageLabel.pixmap().size().width()
+        imgWidth = self.imageSize.width()
         winWidth = self.scrollArea.viewport().size().width()
         # Leave an internal padding of a few pixel
         winWidth -= 6
@@ -344,22 +439,16 @@ class ImageViewer(QtWidgets.QMainWindow):
     def rotateLeft(self):
         image = self.selection[self.cur]
         image.rotate(-90)
-        self.imageLabel.setPixmap(image.getPixmap())
-        self._setSize()
+        self._showImage(image)
         if self.overviewwindow:
-            w = self.overviewwindow.getThumbnailWidget(image)
-            if w:
-                w.setImagePixmap()
+            self.overviewwindow.updateThumb(image)
 
     def rotateRight(self):
         image = self.selection[self.cur]
         image.rotate(90)
-        self.imageLabel.setPixmap(image.getPixmap())
-        self._setSize()
+        self._showImage(image)
         if self.overviewwindow:
-            w = self.overviewwindow.getThumbnailWidget(image)
-            if w:
-                w.setImagePixmap()
+            self.overviewwindow.updateThumb(image)
 
     def fullScreen(self):
         if self.fullScreenAct.isChecked():
@@ -438,6 +527,7 @@ class ImageViewer(QtWidgets.QMainWindow):
                 curidx = None
             self.imgFilter = self.filterDialog.imgFilter
             self.selection = LazyList(self._filteredImages())
+            self.pixmapCache.clear()
             if curidx:
                 item_i = 0
                 for img_i, img in enumerate(self.selection):
@@ -1,48 +1,117 @@
 """An overview window showing thumbnails of the image set.
 """
 
+import collections
 import sys
-import math
-from PySide2 import QtCore, QtWidgets
-
-
-class ThumbnailWidget(QtWidgets.QLabel):
-
-    def __init__(self, image):
-        super().__init__()
-
-        self.setFrameStyle(self.Box | self.Plain)
-        self.setLineWidth(4)
-        palette = self.palette()
-        frameColor = palette.color(self.backgroundRole())
-        palette.setColor(self.foregroundRole(), frameColor)
-        self.setPalette(palette)
-
-        self.image = image
-        self.setImagePixmap()
-
-    def _getOverviewWindow(self):
-        w = self
-        while not isinstance(w, OverviewWindow):
-            w = w.parent()
-        return w
-
-    def setImagePixmap(self):
-        self.setPixmap(self.image.getThumbPixmap())
-
-    def mousePressEvent(self, event):
-        if event.button() == QtCore.Qt.LeftButton:
-            ovwin = self._getOverviewWindow()
-            ovwin.imageViewer.moveCurrentTo(self.image)
+from PySide2 import QtCore, QtGui, QtWidgets
+from photoidx.qt.image import Image
+from photoidx.qt.thumbnailLoader import ThumbnailLoader
+
+
+class ThumbnailModel(QtCore.QAbstractListModel):
+    """A list model of the thumbnails of the images in a selection.
+
+    The thumbnails are only loaded when the view asks for them, e.g.
+    when the row becomes visible.  Until a thumbnail is available, a
+    placeholder is shown in its place.  At most cacheSize thumbnails
+    are kept, the least recently used ones are dropped.
+    """
+
+    def __init__(self, selection, cacheSize=1024, parent=None):
+        super().__init__(parent)
+        self.selection = selection
+        self.cacheSize = cacheSize
+        self.images = list(selection)
+        self.rows = { img: r for r, img in enumerate(self.images) }
+        self.thumbs = collections.OrderedDict()
+        self.failed = set()
+        self.loader = ThumbnailLoader(self)
+        self.loader.loaded.connect(self._thumbLoaded)
+        self.loader.failed.connect(self._thumbFailed)
+        self.placeholder = QtGui.QPixmap(Image.ThumbnailSize)
+        self.placeholder.fill(QtGui.QColor(QtCore.Qt.lightGray))
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.images)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        image = self.images[index.row()]
+        if role == QtCore.Qt.DecorationRole:
+            try:
+                self.thumbs.move_to_end(image)
+                return self.thumbs[image]
+            except KeyError:
+                if image not in self.failed:
+                    self.loader.request(image)
+                return self.placeholder
+        elif role == QtCore.Qt.ToolTipRole:
+            return image.name
+        return None
+
+    def image(self, index):
+        return self.images[index.row()]
+
+    def row(self, image):
+        """Return the row of image or None if it is not in the model.
+        """
+        return self.rows.get(image)
+
+    def _thumbLoaded(self, image, thumbImage):
+        row = self.rows.get(image)
+        if row is None:
+            return
+        self.thumbs[image] = image.getThumbPixmap(thumbImage)
+        while len(self.thumbs) > self.cacheSize:
+            self.thumbs.popitem(last=False)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [QtCore.Qt.DecorationRole])
+
+    def _thumbFailed(self, image, exc):
+        print(str(exc), file=sys.stderr)
+        self.failed.add(image)
+
+    def reloadThumb(self, image):
+        """Drop the thumbnail of image, such that it will be reloaded.
+        """
+        self.thumbs.pop(image, None)
+        self.failed.discard(image)
+        row = self.rows.get(image)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [QtCore.Qt.DecorationRole])
+
+    def cancelPending(self):
+        """Drop the pending requests to load thumbnails.
+        """
+        self.loader.clear()
 
-    def markActive(self, isActive):
-        palette = self.palette()
-        if isActive:
-            frameColor = QtCore.Qt.blue
-        else:
-            frameColor = palette.color(self.backgroundRole())
-        palette.setColor(self.foregroundRole(), frameColor)
-        self.setPalette(palette)
+    def sync(self):
+        """Update the model after the selection has been modified.
+        """
+        # Note: this code is based on the assumption that no image
+        # will ever be added to the selection and thus we only need
+        # to consider removing rows, but not to add any.  The
+        # remaining images may have been reordered.
+        new = list(self.selection)
+        present = set(new)
+        for row in reversed(range(len(self.images))):
+            if self.images[row] not in present:
+                self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+                image = self.images.pop(row)
+                self.thumbs.pop(image, None)
+                self.failed.discard(image)
+                self.endRemoveRows()
+        changed = [ r for r, img in enumerate(new)
+                    if self.images[r] is not img ]
+        self.images = new
+        self.rows = { img: r for r, img in enumerate(self.images) }
+        if changed:
+            self.dataChanged.emit(self.index(changed[0]),
+                                  self.index(changed[-1]))
 
 
 class OverviewWindow(QtWidgets.QMainWindow):
@@ -54,15 +123,25 @@ class OverviewWindow(QtWidgets.QMainWindow):
         self.numcolumns = 4
 
         self.setWindowTitle("Overview")
-        self.mainLayout = QtWidgets.QGridLayout()
-        self._populate()
-
-        centralWidget = QtWidgets.QWidget()
-        centralWidget.setLayout(self.mainLayout)
-        scrollArea = QtWidgets.QScrollArea()
-        scrollArea.setWidget(centralWidget)
-        scrollArea.setAlignment(QtCore.Qt.AlignCenter)
-        self.setCentralWidget(scrollArea)
+        self.model = ThumbnailModel(self.imageViewer.selection, parent=self)
+
+        # With uniform item sizes, the view only needs to query the
+        # data of the rows being visible.
+        self.view = QtWidgets.QListView()
+        self.view.setViewMode(QtWidgets.QListView.IconMode)
+        self.view.setMovement(QtWidgets.QListView.Static)
+        self.view.setResizeMode(QtWidgets.QListView.Adjust)
+        self.view.setUniformItemSizes(True)
+        self.view.setIconSize(Image.ThumbnailSize)
+        self.view.setGridSize(Image.ThumbnailSize + QtCore.QSize(12, 12))
+        self.view.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.view.setModel(self.model)
+        self.view.clicked.connect(self._clicked)
+        # Requests for thumbnails scrolled out of view are dropped.
+        # The rows becoming visible request theirs when painted.
+        scrollBar = self.view.verticalScrollBar()
+        scrollBar.valueChanged.connect(self.model.cancelPending)
+        self.setCentralWidget(self.view)
 
         self.closeAct = QtWidgets.QAction("&Close", self)
         self.closeAct.triggered.connect(self.close)
@@ -72,69 +151,43 @@ class OverviewWindow(QtWidgets.QMainWindow):
         self.fileMenu = menu.addMenu("&File")
         self.fileMenu.addAction(self.closeAct)
 
-        # Set the width of the window such that the scrollArea just
-        # fits.  We need to add 24 to the central widget, 20 for the
-        # vertical scroll bar and 4 for the border.
-        width = centralWidget.size().width() + 24
+        # Set the width of the window such that numcolumns thumbnails
+        # just fit.  We need to add 24, 20 for the vertical scroll bar
+        # and 4 for the border.
+        width = self.numcolumns * self.view.gridSize().width() + 24
         size = self.size()
         size.setWidth(width)
         self.resize(size)
 
-        self.activeWidget = None
         try:
             image = self.imageViewer.selection[self.imageViewer.cur]
             self.markActive(image)
         except IndexError:
             pass
 
-    def _populate(self):
-        """Populate the mainLayout with thumbnail images.
-        """
-        images = self.imageViewer.selection
-        ncol = self.numcolumns
-        c = 0
-        for i in images:
-            try:
-                thumb = ThumbnailWidget(i)
-            except Exception as e:
-                print(str(e), file=sys.stderr)
-            else:
-                self.mainLayout.addWidget(thumb, c // ncol, c % ncol,
-                                          QtCore.Qt.AlignCenter)
-                c += 1
+    def _clicked(self, index):
+        self.imageViewer.moveCurrentTo(self.model.image(index))
+
+    def closeEvent(self, event):
+        self.model.cancelPending()
+        super().closeEvent(event)
 
     def updateThumbs(self):
-        """Update the mainLayout with thumbnail images.
+        """Update the thumbnails after the selection has been modified.
         """
-        # Note: this code is based on the assumption that no image
-        # will ever be added to self.imageViewer.selection and thus we
-        # only need to consider removing ThumbnailWidgets, but not to
-        # add any.  Furthermore, we assume the order given by
-        # self.mainLayout.itemAt() is the the order that the widgets
-        # have been added to self.mainLayout and thus the same as
-        # self.imageViewer.selection.
-        numImages = len(self.imageViewer.selection)
-        for i in range(numImages):
-            widget = self.mainLayout.itemAt(i).widget()
-            image = self.imageViewer.selection[i]
-            if widget.image is not image:
-                widget.image = image
-                widget.setImagePixmap()
-        while self.mainLayout.count() > numImages:
-            item = self.mainLayout.takeAt(numImages)
-            item.widget().deleteLater()
-
-    def getThumbnailWidget(self, image):
-        for i in range(self.mainLayout.count()):
-            w = self.mainLayout.itemAt(i).widget()
-            if w.image is image:
-                return w
-        else:
-            return None
+        self.model.sync()
+
+    def updateThumb(self, image):
+        """Reload the thumbnail of image, e.g. after it has been rotated.
+        """
+        self.model.reloadThumb(image)
 
     def markActive(self, image):
-        if self.activeWidget:
-            self.activeWidget.markActive(False)
-        self.activeWidget = self.getThumbnailWidget(image)
-        if self.activeWidget:
-            self.activeWidget.markActive(True)
+        row = self.model.row(image)
+        if row is None:
+            self.view.clearSelection()
+            return
+        index = self.model.index(row)
+        self.view.selectionModel().setCurrentIndex(
+            index, QtCore.QItemSelectionModel.ClearAndSelect)
+        self.view.scrollTo(index)
@@ -0,0 +1,58 @@
+"""A cache of decoded images in memory.
+"""
+
+import collections
+
+
+class PixmapCache(object):
+    """Keep the pixmaps of the most recently used images.
+
+    The pixmaps are stored along with the transform they have been
+    created with.  A pixmap is only returned for the same transform,
+    so rotating an image invalidates its entry.  The cache is limited
+    by the memory used by the pixmaps, the least recently used ones
+    are dropped beyond maxsize bytes.
+    """
+
+    def __init__(self, maxsize=256*1024*1024):
+        self.maxsize = maxsize
+        self.size = 0
+        self.entries = collections.OrderedDict()
+
+    @staticmethod
+    def _nbytes(pixmap):
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+    def get(self, image, transform):
+        """Return the pixmap for image or None if not cached.
+        """
+        try:
+            pixmap, t = self.entries[image]
+        except KeyError:
+            return None
+        if t != transform:
+            self.discard(image)
+            return None
+        self.entries.move_to_end(image)
+        return pixmap
+
+    def put(self, image, pixmap, transform):
+        self.discard(image)
+        self.entries[image] = (pixmap, transform)
+        self.size += self._nbytes(pixmap)
+        # Always keep the most recent entry, even if it exceeds maxsize
+        # on its own.
+        while self.size > self.maxsize and len(self.entries) > 1:
+            _, (p, _) = self.entries.popitem(last=False)
+            self.size -= self._nbytes(p)
+
+    def discard(self, image):
+        try:
+            pixmap, _ = self.entries.pop(image)
+        except KeyError:
+            return
+        self.size -= self._nbytes(pixmap)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
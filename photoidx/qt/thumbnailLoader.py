@@ -0,0 +1,16 @@
+"""Load thumbnails in the background.
+"""
+
+from photoidx.qt.imageLoader import ImageLoader
+
+
+class ThumbnailLoader(ImageLoader):
+    """Load thumbnails of images in a pool of worker threads.
+
+    The thumbnails are loaded as QImage using Image.getThumbImage().
+    """
+
+    def request(self, image):
+        """Queue the loading of the thumbnail for image.
+        """
+        super().request(image, image.getThumbImage)
@@ -0,0 +1,184 @@
+"""Serve an index over a Unix domain socket.
+
+Each invocation of photo-idx.py needs to read the index file.  An
+IndexServer rather keeps an Index in memory and answers requests
+from clients over a local socket.  The protocol is line based: the
+client sends a request as a JSON object on one line and the server
+replies with a JSON object on one line.
+
+A request has a 'command' and a 'filter', having the arguments to
+IdxFilter, and possibly further arguments depending on the command.
+The response has an 'error' if the request failed.
+
+The server keeps a shared lock on the index file while it is running,
+such that no other process may modify the index file.  Modifications
+made by the server are recorded in the journal.  Only the commands
+handled by IndexServer are served.  Others that need to rewrite the
+index file, such as compact and create --update, fail with
+AlreadyLockedError while the server is running, and watch defers
+writing the index until the server has been stopped.
+"""
+
+import datetime
+import json
+from pathlib import Path
+import socket
+import socketserver
+from photoidx.geo import GeoPosition
+from photoidx.idxfilter import IdxFilter
+from photoidx.stats import Stats
+
+
+defSocketFilename = Path(".index.sock")
+"""Name of the socket in the image directory."""
+
+_filter_args = ("tags", "select", "date", "gpspos", "gpsradius", "files")
+
+
+class ServerError(Exception):
+    """The server failed to process a request.
+    """
+    pass
+
+
+def socket_path(directory):
+    """Return the path of the server socket for an image directory.
+    """
+    return Path(directory) / defSocketFilename
+
+def encode_filter(args):
+    """Encode the filter arguments from the command line as JSON.
+    """
+    f = { a: getattr(args, a) for a in _filter_args }
+    if f['date']:
+        f['date'] = [ d.isoformat() for d in f['date'] ]
+    if f['gpspos']:
+        f['gpspos'] = [ float(f['gpspos'].lat), float(f['gpspos'].lon) ]
+    return f
+
+def _decode_date(s):
+    # datetime.fromisoformat() would require Python 3.7.
+    if '.' in s:
+        return datetime.datetime.strptime(s, "%Y-%m-%dT%H:%M:%S.%f")
+    else:
+        return datetime.datetime.strptime(s, "%Y-%m-%dT%H:%M:%S")
+
+def decode_filter(f):
+    """Create an IdxFilter from the filter in a request.
+    """
+    kwargs = { a: f[a] for a in _filter_args if a in f }
+    if kwargs.get('date'):
+        kwargs['date'] = tuple(_decode_date(d) for d in kwargs['date'])
+    if kwargs.get('gpspos'):
+        kwargs['gpspos'] = GeoPosition(kwargs['gpspos'])
+    return IdxFilter(**kwargs)
+
+def request(address, command, args, **kwargs):
+    """Send a request to the server and return the response.
+
+    The filter is taken from the command line arguments args.
+    """
+    req = dict(kwargs, command=command, filter=encode_filter(args))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(str(address))
+        s.sendall(json.dumps(req).encode("utf-8") + b"\n")
+        s.shutdown(socket.SHUT_WR)
+        with s.makefile("rb") as f:
+            response = json.loads(f.readline().decode("utf-8"))
+    if 'error' in response:
+        raise ServerError(response['error'])
+    return response
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                req = json.loads(line.decode("utf-8"))
+                response = self.server.dispatch(req)
+            except Exception as e:
+                response = { 'error': "%s: %s" % (type(e).__name__, e) }
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class IndexServer(socketserver.UnixStreamServer):
+    """Serve an Index over a Unix domain socket.
+
+    Requests are processed one after the other, so there is no need
+    to protect the Index against concurrent access.  The command in
+    a request is handled by the method do_<command>.
+    """
+
+    def __init__(self, idx, address):
+        self.idx = idx
+        address = Path(address)
+        if address.is_socket():
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                    s.connect(str(address))
+            except ConnectionRefusedError:
+                # Stale socket left over from a server that died.
+                address.unlink()
+            else:
+                raise OSError("a server is already listening on %s"
+                              % address)
+        super().__init__(str(address), _RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            Path(self.server_address).unlink()
+        except FileNotFoundError:
+            pass
+
+    def dispatch(self, req):
+        try:
+            method = getattr(self, "do_%s" % req['command'])
+        except AttributeError:
+            raise ServerError("invalid command %r" % req['command'])
+        return method(decode_filter(req.get('filter', {})), req)
+
+    def _modify(self, idxfilter, cond, modify):
+        # Lock first, so that the items are not modified if the
+        # modification cannot be recorded.
+        self.idx.lock()
+        try:
+            items = [ i for i in idxfilter.filter(self.idx) if cond(i) ]
+            for i in items:
+                modify(i)
+            self.idx.write_journal(items)
+        finally:
+            self.idx.lock(exclusive=False)
+        return { 'count': len(items) }
+
+    def do_ls(self, idxfilter, req):
+        items = [ { 'filename': str(i.filename), 'checksum': i.checksum }
+                  for i in idxfilter.filter(self.idx) ]
+        return { 'items': items }
+
+    def do_lstags(self, idxfilter, req):
+        tags = self.idx.tagcounts(idxfilter.filter(self.idx))
+        return { 'tags': sorted(tags) }
+
+    def do_stats(self, idxfilter, req):
+        stats = Stats(idxfilter.filter(self.idx), idx=self.idx)
+        return { 'stats': str(stats) }
+
+    def do_addtag(self, idxfilter, req):
+        tag = req['tag']
+        return self._modify(idxfilter, lambda i: tag not in i.tags,
+                            lambda i: i.tags.add(tag))
+
+    def do_rmtag(self, idxfilter, req):
+        tag = req['tag']
+        return self._modify(idxfilter, lambda i: tag in i.tags,
+                            lambda i: i.tags.discard(tag))
+
+    def do_select(self, idxfilter, req):
+        return self._modify(idxfilter, lambda i: not i.selected,
+                            lambda i: setattr(i, 'selected', True))
+
+    def do_deselect(self, idxfilter, req):
+        return self._modify(idxfilter, lambda i: i.selected,
+                            lambda i: setattr(i, 'selected', False))
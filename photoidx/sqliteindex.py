@@ -0,0 +1,372 @@
+"""Provide the class SQLiteIndex, an index of photos stored in SQLite.
+
+SQLiteIndex is an alternative to Index for very large photo
+collections.  It provides the same sequence API, but rather than
+keeping all items in memory and rewriting the whole YAML file on each
+change, the items are stored in an SQLite database.  Items are only
+created when accessed and writing the index only touches the rows
+that actually changed.  The YAML index file remains the format of
+record: the items may be imported from and exported to it.
+
+SQLiteIndex is only available as a library.  Neither Index nor
+photo-idx.py use it.
+"""
+
+from collections.abc import MutableSequence
+import datetime
+from pathlib import Path
+import sqlite3
+from photoidx.idxitem import IdxItem
+from photoidx.index import Index, _readdir
+
+
+_schema_version = 1
+_schema = """
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE items (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    filename TEXT NOT NULL UNIQUE,
+    name TEXT,
+    createDate TEXT,
+    orientation INTEGER,
+    gpsLat REAL,
+    gpsLon REAL,
+    selected INTEGER NOT NULL DEFAULT 0,
+    fileSize INTEGER,
+    fileMtime INTEGER,
+    fileInode INTEGER
+);
+CREATE INDEX items_position ON items (position);
+CREATE INDEX items_createDate ON items (createDate);
+CREATE INDEX items_selected ON items (selected);
+CREATE TABLE checksums (
+    item INTEGER NOT NULL REFERENCES items (id) ON DELETE CASCADE,
+    alg TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (item, alg)
+);
+CREATE TABLE tags (
+    item INTEGER NOT NULL REFERENCES items (id) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (item, tag)
+);
+CREATE INDEX tags_tag ON tags (tag);
+"""
+
+_item_columns = ("filename", "name", "createDate", "orientation",
+                 "gpsLat", "gpsLon", "selected",
+                 "fileSize", "fileMtime", "fileInode")
+
+# Maximum number of items to fetch from the database in one query.
+_chunksize = 500
+
+
+def _date2sql(date):
+    if date is None:
+        return None
+    return date.isoformat(sep=' ')
+
+def _sql2date(s):
+    if s is None:
+        return None
+    if '.' in s:
+        return datetime.datetime.strptime(s, "%Y-%m-%d %H:%M:%S.%f")
+    else:
+        return datetime.datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
+
+def _item_row(item):
+    """Return the values of the columns in the items table for an item.
+    """
+    if item.gpsPosition:
+        lat, lon = float(item.gpsPosition.lat), float(item.gpsPosition.lon)
+    else:
+        lat = lon = None
+    fs = item.fileStat or {}
+    return (str(item.filename), item.name, _date2sql(item.createDate),
+            int(item.orientation) if item.orientation else None,
+            lat, lon, int(item.selected),
+            fs.get('size'), fs.get('mtime_ns'), fs.get('inode'))
+
+def _item_state(item):
+    """Return the state of an item in order to detect modifications.
+    """
+    return (_item_row(item), frozenset(item.tags),
+            frozenset(item.checksum.items()))
+
+def _sql_where(idxfilter):
+    """Translate the criteria of an IdxFilter into an SQL condition.
+
+    Only the tag, the date, and the selection criteria are
+    considered.  The remaining ones must be evaluated on the items.
+    """
+    clauses = []
+    params = []
+    if idxfilter.taglist is not None:
+        for t in sorted(idxfilter.taglist):
+            clauses.append("id IN (SELECT item FROM tags WHERE tag = ?)")
+            params.append(t)
+        for t in sorted(idxfilter.negtaglist):
+            clauses.append("id NOT IN (SELECT item FROM tags WHERE tag = ?)")
+            params.append(t)
+        if not idxfilter.taglist and not idxfilter.negtaglist:
+            clauses.append("id NOT IN (SELECT item FROM tags)")
+    if idxfilter.select is not None:
+        clauses.append("selected = ?")
+        params.append(int(idxfilter.select))
+    if idxfilter.date:
+        clauses.append("createDate >= ? AND createDate < ?")
+        params.extend(_date2sql(d) for d in idxfilter.date)
+    return (" AND ".join(clauses) or "1"), params
+
+
+class SQLiteIndex(MutableSequence):
+
+    defDbFilename = Path(".index.sqlite")
+
+    def __init__(self, dbfile=None):
+        super().__init__()
+        self.db = None
+        if dbfile is None:
+            dbfile = Path.cwd()
+        dbfile = Path(dbfile)
+        if dbfile.is_dir():
+            dbfile = dbfile / self.defDbFilename
+        self.directory = dbfile.parent.resolve()
+        self.db = sqlite3.connect(str(dbfile))
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self._init_schema()
+        # The ids of the items in the order of the index and the
+        # position stored in the database for each id.
+        self._ids = []
+        self._positions = {}
+        for (id, pos) in self.db.execute("SELECT id, position FROM items "
+                                         "ORDER BY position"):
+            self._ids.append(id)
+            self._positions[id] = pos
+        # The items that have been accessed so far together with
+        # their state when they were last stored.
+        self._items = {}
+
+    def _init_schema(self):
+        cur = self.db.execute("SELECT name FROM sqlite_master "
+                              "WHERE type = 'table' AND name = 'meta'")
+        if cur.fetchone():
+            cur = self.db.execute("SELECT value FROM meta "
+                                  "WHERE key = 'version'")
+            version = int(cur.fetchone()[0])
+            if version != _schema_version:
+                raise ValueError("unsupported database schema version %d"
+                                 % version)
+        else:
+            self.db.executescript(_schema)
+            self.db.execute("INSERT INTO meta (key, value) VALUES (?, ?)",
+                            ("version", str(_schema_version)))
+            self.db.commit()
+
+    def close(self):
+        if self.db:
+            self.db.close()
+            self.db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def _fetch(self, ids):
+        """Return the items for the ids, creating them if needed.
+        """
+        missing = [ id for id in ids if id not in self._items ]
+        for i in range(0, len(missing), _chunksize):
+            chunk = missing[i:i+_chunksize]
+            marks = ",".join("?" * len(chunk))
+            data = {}
+            cur = self.db.execute("SELECT id, %s FROM items WHERE id IN (%s)"
+                                  % (", ".join(_item_columns), marks), chunk)
+            for row in cur:
+                (id, filename, name, createDate, orientation,
+                 lat, lon, selected, size, mtime, inode) = row
+                d = {
+                    'filename': filename,
+                    'createDate': _sql2date(createDate),
+                    'orientation': orientation,
+                    'gpsPosition': None if lat is None else (lat, lon),
+                    'checksum': {},
+                    'tags': ['pidx:selected'] if selected else [],
+                }
+                if name is not None:
+                    d['name'] = name
+                if size is not None:
+                    d['fileStat'] = {
+                        'size': size, 'mtime_ns': mtime, 'inode': inode,
+                    }
+                data[id] = d
+            cur = self.db.execute("SELECT item, alg, value FROM checksums "
+                                  "WHERE item IN (%s)" % marks, chunk)
+            for (id, alg, value) in cur:
+                data[id]['checksum'][alg] = value
+            cur = self.db.execute("SELECT item, tag FROM tags "
+                                  "WHERE item IN (%s)" % marks, chunk)
+            for (id, tag) in cur:
+                data[id]['tags'].append(tag)
+            for id, d in data.items():
+                item = IdxItem(data=d)
+                self._items[id] = (item, _item_state(item))
+        return [ self._items[id][0] for id in ids ]
+
+    def _insert(self, item):
+        """Insert an item into the database and return its id.
+        """
+        cur = self.db.execute("INSERT INTO items (position, %s) "
+                              "VALUES (-1, %s)"
+                              % (", ".join(_item_columns),
+                                 ",".join("?" * len(_item_columns))),
+                              _item_row(item))
+        id = cur.lastrowid
+        self.db.executemany("INSERT INTO checksums (item, alg, value) "
+                            "VALUES (?, ?, ?)",
+                            [ (id, a, v) for a, v in item.checksum.items() ])
+        self.db.executemany("INSERT INTO tags (item, tag) VALUES (?, ?)",
+                            [ (id, t) for t in item.tags ])
+        self._items[id] = (item, _item_state(item))
+        self._positions[id] = -1
+        return id
+
+    def _delete(self, ids):
+        self.db.executemany("DELETE FROM items WHERE id = ?",
+                            [ (id,) for id in ids ])
+        for id in ids:
+            self._items.pop(id, None)
+            del self._positions[id]
+
+    def _flush(self):
+        """Store all modifications of the items in the database.
+        """
+        for id, (item, state) in self._items.items():
+            newstate = _item_state(item)
+            if newstate == state:
+                continue
+            row, tags, checksums = newstate
+            if row != state[0]:
+                self.db.execute("UPDATE items SET %s WHERE id = ?"
+                                % ", ".join("%s = ?" % c
+                                            for c in _item_columns),
+                                row + (id,))
+            self.db.executemany("DELETE FROM tags WHERE item = ? AND tag = ?",
+                                [ (id, t) for t in state[1] - tags ])
+            self.db.executemany("INSERT INTO tags (item, tag) VALUES (?, ?)",
+                                [ (id, t) for t in tags - state[1] ])
+            if checksums != state[2]:
+                self.db.execute("DELETE FROM checksums WHERE item = ?", (id,))
+                self.db.executemany("INSERT INTO checksums (item, alg, value) "
+                                    "VALUES (?, ?, ?)",
+                                    [ (id, a, v) for a, v in checksums ])
+            self._items[id] = (item, newstate)
+        moved = [ (pos, id) for pos, id in enumerate(self._ids)
+                  if self._positions[id] != pos ]
+        self.db.executemany("UPDATE items SET position = ? WHERE id = ?",
+                            moved)
+        for pos, id in moved:
+            self._positions[id] = pos
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._fetch(self._ids[index])
+        else:
+            return self._fetch([self._ids[index]])[0]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            self._delete(self._ids[index])
+            self._ids[index] = [ self._insert(v) for v in value ]
+        else:
+            self._delete([self._ids[index]])
+            self._ids[index] = self._insert(value)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            self._delete(self._ids[index])
+        else:
+            self._delete([self._ids[index]])
+        del self._ids[index]
+
+    def __iter__(self):
+        for i in range(0, len(self._ids), _chunksize):
+            yield from self._fetch(self._ids[i:i+_chunksize])
+
+    def index(self, value, *args):
+        for id, (item, state) in self._items.items():
+            if item is value:
+                return self._ids.index(id, *args)
+        raise ValueError("%r is not in index" % value)
+
+    def insert(self, index, value):
+        self._ids.insert(index, self._insert(value))
+
+    def extend_dir(self, imgdir, hashalg=['md5'], jobs=None, filestat=False,
+                   concurrency=None, recursive=False, include=None,
+                   exclude=None):
+        imgdir = Path(imgdir).resolve()
+        known = { Path(f) for (f,) in
+                  self.db.execute("SELECT filename FROM items") }
+        self.extend(_readdir(imgdir, self.directory, hashalg, known, jobs,
+                             filestat, concurrency, recursive=recursive,
+                             include=include, exclude=exclude))
+
+    def query(self, idxfilter):
+        """Return the items selected by an IdxFilter.
+
+        The tag, the date, and the selection criteria are evaluated
+        by the database, such that only the matching items need to
+        be created.
+        """
+        self._flush()
+        where, params = _sql_where(idxfilter)
+        cur = self.db.execute("SELECT id FROM items WHERE %s "
+                              "ORDER BY position" % where, params)
+        ids = [ id for (id,) in cur ]
+        for i in range(0, len(ids), _chunksize):
+            yield from idxfilter.filter(self._fetch(ids[i:i+_chunksize]))
+
+    def write(self):
+        """Store all modifications in the database.
+        """
+        self._flush()
+        self.db.commit()
+
+    def import_yaml(self, idxfile):
+        """Add the items from a YAML index file.
+
+        Items having the same filename as an item already in the
+        database replace that item at its position.  The other items
+        are appended.
+        """
+        self._flush()
+        pos = { id: p for p, id in enumerate(self._ids) }
+        known = { f: pos[id] for (id, f) in
+                  self.db.execute("SELECT id, filename FROM items") }
+        with Index(idxfile=idxfile) as idx:
+            for item in idx:
+                p = known.get(str(item.filename))
+                if p is None:
+                    self.append(item)
+                else:
+                    self[p] = item
+
+    def export_yaml(self, idxfile):
+        """Write the items to a YAML index file.
+        """
+        with Index() as idx:
+            idx.items = list(self)
+            idx.write(idxfile)
@@ -2,19 +2,44 @@
 """
 
 import datetime
-from photoidx.geo import GeoPosition
+from photoidx.columns import ColumnSelection, _int2date, _int2ordinal, _nodate
+from photoidx.geo import GeoPosition, _centroid_radius
 
 
 class Stats(object):
+    """Collect statistics on items.
 
-    def __init__(self, items):
+    If the Index the items are taken from is passed as idx, the
+    counts by tag are taken from its tag index rather than from the
+    tags of each item.
+    """
+
+    def __init__(self, items, idx=None):
         self.count = 0
         self.selected = 0
         self.oldest = datetime.datetime.max
         self.newest = datetime.datetime.min
         self.by_date = {}
         self.by_tag = {}
-        gpsPositions = []
+        if isinstance(items, ColumnSelection):
+            lats, lons = self._collect_columns(items)
+        else:
+            lats, lons = self._collect_items(items, idx)
+        # Same as GeoPosition.centroid_radius(), but the columns do
+        # not have GeoPosition objects.
+        try:
+            center, self.gpsRadius = _centroid_radius(lats, lons,
+                                                      GeoPosition.earthRadius)
+        except ValueError:
+            self.gpsCenter = None
+            self.gpsRadius = None
+        else:
+            self.gpsCenter = GeoPosition(center)
+
+    def _collect_items(self, items, idx=None):
+        lats = []
+        lons = []
+        seen = []
         for i in items:
             self.count += 1
             if i.selected:
@@ -28,22 +53,43 @@ class Stats(object):
                 self.by_date.setdefault(date, 0)
                 self.by_date[date] += 1
             if i.gpsPosition:
-                gpsPositions.append(i.gpsPosition)
+                lats.append(i.gpsPosition.lat)
+                lons.append(i.gpsPosition.lon)
+            if idx is not None:
+                seen.append(i)
+                continue
             for tag in i.tags:
                 self.by_tag.setdefault(tag, 0)
                 self.by_tag[tag] += 1
-        try:
-            centroid = GeoPosition.centroid(gpsPositions)
-        except ValueError:
-            self.gpsCenter = None
-            self.gpsRadius = None
-        else:
-            radius = 0.0
-            for pos in gpsPositions:
-                dist = centroid - pos
-                radius = max(radius, dist)
-            self.gpsCenter = centroid
-            self.gpsRadius = radius
+        if idx is not None:
+            self.by_tag = idx.tagcounts(seen)
+        return lats, lons
+
+    def _collect_columns(self, selection):
+        """Collect the statistics from the columns of an ItemColumns.
+        """
+        columns = selection.columns
+        positions = selection.positions
+        self.count = len(positions)
+        self.selected = sum(columns.selected[p] for p in positions)
+        dates = [ columns.createDate[p] for p in positions ]
+        dates = [ d for d in dates if d != _nodate ]
+        if dates:
+            self.oldest = _int2date(min(dates))
+            self.newest = _int2date(max(dates))
+        for d in dates:
+            date = _int2ordinal(d)
+            self.by_date.setdefault(date, 0)
+            self.by_date[date] += 1
+        self.by_tag = selection.tagcounts()
+        lats = []
+        lons = []
+        for p in positions:
+            lat = columns.gpsLat[p]
+            if lat == lat:
+                lats.append(lat)
+                lons.append(columns.gpsLon[p])
+        return lats, lons
 
     def __bool__(self):
         return bool(self.count)
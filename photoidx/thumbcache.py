@@ -0,0 +1,152 @@
+"""A persistent cache of thumbnails on disk.
+
+The thumbnails are stored as files in a cache directory, named by a
+key derived from the checksum of the image or, if the item has no
+checksum, from the path and the modification time of the image file.
+The cache is limited in size: when it grows beyond maxsize, the
+least recently used thumbnails are removed.  The modification time of
+the thumbnail files is updated on each access to keep track of the
+use.  The content of the thumbnails is opaque to the cache.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+import tempfile
+import threading
+
+
+def default_cachedir():
+    """Return the default cache directory following the XDG spec.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "photoidx" / "thumbnails"
+
+
+class ThumbnailCache(object):
+    """A persistent cache of thumbnails on disk.
+
+    The methods may be called concurrently from several threads.
+    Failing to access the cache, e.g. because the cache directory is
+    not writable, is not an error, the thumbnail is just not cached.
+    """
+
+    def __init__(self, cachedir=None, maxsize=256*1024*1024, suffix=".jpg"):
+        if cachedir is None:
+            cachedir = default_cachedir()
+        self.cachedir = Path(cachedir)
+        self.maxsize = maxsize
+        self.suffix = suffix
+        self._size = None
+        self._lock = threading.Lock()
+
+    def key(self, item, path):
+        """Return the key for the thumbnail of an item.
+
+        path is the path of the image file.
+        """
+        if item.checksum:
+            alg = min(item.checksum)
+            return "%s-%s" % (alg, item.checksum[alg])
+        path = Path(path).resolve()
+        st = path.stat()
+        h = hashlib.sha1()
+        h.update(os.fsencode(str(path)))
+        h.update(b"\0%d\0%d" % (st.st_size, st.st_mtime_ns))
+        return "path-%s" % h.hexdigest()
+
+    def _path(self, key):
+        return self.cachedir / (key + self.suffix)
+
+    def get(self, key):
+        """Return the cached thumbnail for key or None if not found.
+        """
+        path = self._path(key)
+        try:
+            with path.open("rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(str(path))
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        """Store a thumbnail in the cache.
+
+        The thumbnail is written to a temporary file that is then
+        moved in place, such that no incomplete thumbnail may ever be
+        seen, even by other processes.
+        """
+        path = self._path(key)
+        try:
+            self.cachedir.mkdir(mode=0o700, parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=str(self.cachedir),
+                                             prefix=".tmp",
+                                             delete=False) as f:
+                # NamedTemporaryFile creates the file private to the
+                # user.  Keep it that way, thumbnails reveal the
+                # content of the images.  The freedesktop thumbnail
+                # spec requires this as well.
+                try:
+                    f.write(data)
+                except BaseException:
+                    os.unlink(f.name)
+                    raise
+            try:
+                oldsize = path.stat().st_size
+            except OSError:
+                oldsize = 0
+            os.replace(f.name, str(path))
+        except OSError:
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += len(data) - oldsize
+            if self._size > self.maxsize:
+                self._evict()
+
+    def _scan(self):
+        """Return the thumbnail files and their total size.
+
+        The files are returned as a list of (mtime, size, path),
+        ordered by the modification time.
+        """
+        files = []
+        total = 0
+        try:
+            with os.scandir(str(self.cachedir)) as it:
+                for entry in it:
+                    if not entry.name.endswith(self.suffix):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime_ns, st.st_size, entry.path))
+                    total += st.st_size
+        except OSError:
+            pass
+        files.sort()
+        return files, total
+
+    def _evict(self):
+        """Remove the least recently used thumbnails.
+
+        The size is reduced somewhat below maxsize, in order not to
+        need to scan the cache directory again on the next put().
+        """
+        files, self._size = self._scan()
+        limit = 0.9 * self.maxsize
+        for mtime, size, path in files:
+            if self._size <= limit:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            self._size -= size
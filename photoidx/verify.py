@@ -0,0 +1,99 @@
+"""Verify the image files against the checksums recorded in the index.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import time
+from photoidx.idxitem import _checksum
+
+
+class Result(object):
+    """The result of verifying one image file.
+
+    The status is one of OK, FAILED, MISSING, ERROR, or NOCHECKSUM,
+    the latter if there is no checksum recorded for the item.  failed
+    is the list of hash algorithms whose checksum did not match.
+    error is the error message if the image file could not be read.
+    """
+
+    OK = "OK"
+    FAILED = "FAILED"
+    MISSING = "MISSING"
+    ERROR = "ERROR"
+    NOCHECKSUM = "NOCHECKSUM"
+
+    def __init__(self, item, status, size=0, failed=(), error=None):
+        self.item = item
+        self.status = status
+        self.size = size
+        self.failed = list(failed)
+        self.error = error
+
+
+class Progress(object):
+    """Keep track of the progress of the verification.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.count = 0
+        self.size = 0
+        self.start = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    @property
+    def throughput(self):
+        """Bytes per second read so far."""
+        elapsed = self.elapsed
+        return self.size / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return ("%d/%d files, %.1f MiB, %.1f MiB/s"
+                % (self.count, self.total, self.size / 2**20,
+                   self.throughput / 2**20))
+
+
+def _hashfile(path, hashalg, blocksize):
+    """Calculate the hashes of the content of a file.
+
+    The blocksize should be a multiple of the block size of the file
+    system, see _checksum() in photoidx.idxitem.
+    """
+    with path.open("rb", buffering=0) as f:
+        return _checksum(f, hashalg, blocksize)
+
+def _verify_item(item, basedir, blocksize):
+    hashalg = [ h for h in item.checksum if h in hashlib.algorithms_available ]
+    if not hashalg:
+        return Result(item, Result.NOCHECKSUM)
+    try:
+        checksum, size = _hashfile(basedir / item.filename, hashalg, blocksize)
+    except FileNotFoundError:
+        return Result(item, Result.MISSING)
+    except OSError as e:
+        return Result(item, Result.ERROR, error=e.strerror or str(e))
+    failed = [ h for h in hashalg if checksum[h] != item.checksum[h] ]
+    return Result(item, Result.FAILED if failed else Result.OK, size, failed)
+
+def verify(items, basedir, jobs=4, blocksize=1024*1024, progress=None):
+    """Verify the image files of items.
+
+    Yield a Result for each item in the order of items.  The files
+    are read in jobs threads in parallel.  The blocksize should be a
+    multiple of the block size of the file system.  If progress is
+    given, it is called with a Progress object after each file.
+    """
+    items = list(items)
+    state = Progress(len(items))
+    def _verify(item):
+        return _verify_item(item, basedir, blocksize)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for result in executor.map(_verify, items):
+            state.count += 1
+            state.size += result.size
+            if progress:
+                progress(state)
+            yield result
@@ -0,0 +1,233 @@
+"""Watch an image directory and keep the index up to date.
+
+The Watcher is notified about files being written, moved or deleted
+in the image directory using Linux inotify.  If inotify is not
+available, the directory is polled instead.  A file is only taken
+into account once no further events have been seen for it for some
+time, so that images being copied are not read before they are
+complete.  The pending changes are then written to the index in one
+batch, holding the lock on the index file only for the time needed
+to update it.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+from pathlib import Path
+import select
+import stat
+import struct
+import time
+from photoidx.index import (Index, AlreadyLockedError,
+                            _is_image, _readfiles)
+from photoidx.idxitem import _filestat
+
+
+class _Inotify(object):
+    """Get notified on changes in a directory using Linux inotify.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_DELETE = 0x00000200
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    _event = struct.Struct("iIII")
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        try:
+            init = libc.inotify_init1
+            add_watch = libc.inotify_add_watch
+        except AttributeError:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.fd = init(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        mask = (self.IN_CLOSE_WRITE | self.IN_MOVED_FROM |
+                self.IN_MOVED_TO | self.IN_DELETE)
+        if add_watch(self.fd, os.fsencode(str(directory)), mask) < 0:
+            e = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(e, os.strerror(e), str(directory))
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def read(self, timeout):
+        """Wait at most timeout seconds for events.
+
+        Return the names of the files concerned.
+        """
+        r, w, x = select.select([self.fd], [], [], timeout)
+        if not r:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        names = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, length = self._event.unpack_from(data, pos)
+            pos += self._event.size
+            name = data[pos:pos+length].rstrip(b"\0")
+            pos += length
+            if name:
+                names.append(os.fsdecode(name))
+        return names
+
+
+class _Poller(object):
+    """Detect changes in a directory by polling.
+
+    The fallback if inotify is not available.  Reports the files
+    that have been added, modified, or removed since the last call.
+    """
+
+    def __init__(self, directory, interval=2.0):
+        self.directory = directory
+        self.interval = interval
+        self.files = self._scan()
+
+    def close(self):
+        pass
+
+    def _scan(self):
+        files = {}
+        with os.scandir(str(self.directory)) as it:
+            for entry in it:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if stat.S_ISREG(st.st_mode):
+                    files[entry.name] = (st.st_size, st.st_mtime_ns)
+        return files
+
+    def read(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        files = self._scan()
+        names = [ n for n in files.keys() | self.files.keys()
+                  if files.get(n) != self.files.get(n) ]
+        self.files = files
+        return names
+
+
+class Watcher(object):
+    """Keep the index of an image directory up to date.
+
+    Files are considered settle seconds after the last event seen
+    for them.  The settled changes are written to the index at most
+    every interval seconds.  New images are added to the index,
+    modified ones are re-read, keeping the tags, the name and the
+    selection state, and the items of removed images are deleted.
+    The file status is recorded in the items, such that
+    Index.update_dir() need not re-read them.  Even if filestat is
+    False, the file status is still recorded for re-read items that
+    had it recorded before.
+    """
+
+    def __init__(self, directory, hashalg=['md5'], filestat=True,
+                 settle=2.0, interval=10.0, polling=False):
+        self.directory = Path(directory).resolve()
+        self.hashalg = hashalg
+        self.filestat = filestat
+        self.settle = settle
+        self.interval = interval
+        self.pending = {}
+        self.ready = set()
+        self.lastWrite = time.monotonic()
+        self.source = None
+        if not polling:
+            try:
+                self.source = _Inotify(self.directory)
+            except OSError:
+                pass
+        if self.source is None:
+            self.source = _Poller(self.directory)
+
+    def close(self):
+        self.source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    def step(self, timeout=1.0):
+        """Process the events arriving within timeout seconds.
+
+        Write the settled changes to the index if due.
+        """
+        names = self.source.read(timeout)
+        now = time.monotonic()
+        for n in names:
+            if _is_image(n):
+                self.pending[n] = now
+        for n, t in list(self.pending.items()):
+            if now - t >= self.settle:
+                del self.pending[n]
+                self.ready.add(n)
+        if self.ready and now - self.lastWrite >= self.interval:
+            try:
+                self.flush()
+            except AlreadyLockedError:
+                # Somebody else is using the index, try again later.
+                pass
+
+    def run(self):
+        while True:
+            self.step()
+
+    def flush(self):
+        """Write the settled changes to the index.
+        """
+        files = []
+        stats = {}
+        for n in sorted(self.ready):
+            try:
+                st = (self.directory / n).stat()
+            except FileNotFoundError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                files.append((Path(n), st))
+                stats[Path(n)] = st
+        # Read the images before opening the index, in order to
+        # keep the time holding the lock short.
+        newitems = { i.filename: i for i in
+                     _readfiles(files, self.directory, self.hashalg,
+                                filestat=self.filestat) }
+        try:
+            idx = Index(idxfile=self.directory)
+            fname = None
+        except FileNotFoundError:
+            idx = Index()
+            fname = self.directory
+        with idx:
+            items = []
+            for item in idx:
+                if str(item.filename) in self.ready:
+                    new = newitems.pop(item.filename, None)
+                    if new is None:
+                        # The image file is gone.
+                        continue
+                    new.name = item.name
+                    new.tags = item.tags
+                    new.selected = item.selected
+                    if item.fileStat is not None and new.fileStat is None:
+                        new.fileStat = _filestat(stats[new.filename])
+                    item = new
+                items.append(item)
+            items.extend(newitems.values())
+            idx.items = items
+            idx.write(fname)
+        self.ready.clear()
+        self.lastWrite = time.monotonic()
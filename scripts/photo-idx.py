@@ -1,8 +1,16 @@
 #! /usr/bin/python
 
 import argparse
+import contextlib
+import io
+import shlex
+import signal
+import sys
 import photoidx.index
 import photoidx.idxfilter
+import photoidx.server
+import photoidx.verify
+import photoidx.watch
 from photoidx.stats import Stats
 
 
@@ -10,64 +18,261 @@ def create(args):
     idxfile = args.directory if args.update else None
     hashalg = args.checksums.split(',') if args.checksums else []
     with photoidx.index.Index(idxfile=idxfile, imgdir=args.directory,
-                              hashalg=hashalg) as idx:
+                              hashalg=hashalg, jobs=args.jobs,
+                              filestat=args.stat,
+                              concurrency=args.concurrency,
+                              recursive=args.recursive,
+                              include=args.include,
+                              exclude=args.exclude) as idx:
         idx.write()
 
+def _forward(args, command, **kwargs):
+    """Forward a subcommand to the server, if one is running.
+
+    Return the response from the server or None if there is no
+    server.
+    """
+    address = photoidx.server.socket_path(args.directory)
+    if not address.is_socket():
+        return None
+    try:
+        return photoidx.server.request(address, command, args, **kwargs)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+
+def _print_ls(args, entries):
+    for filename, checksums in entries:
+        if args.checksum:
+            try:
+                checksum = checksums[args.checksum]
+            except KeyError:
+                continue
+            print("%s  %s" % (checksum, filename))
+        else:
+            print(filename)
+
+def _ls(args, items):
+    idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
+    _print_ls(args, ((i.filename, i.checksum)
+                     for i in idxfilter.filter(items)))
+
 def ls(args):
-    with photoidx.index.Index(idxfile=args.directory) as idx:
-        idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
-        for i in idxfilter.filter(idx):
-            if args.checksum:
-                try:
-                    checksum = i.checksum[args.checksum]
-                except KeyError:
-                    continue
-                print("%s  %s" % (checksum, i.filename))
-            else:
-                print(i.filename)
+    response = _forward(args, "ls")
+    if response is not None:
+        _print_ls(args, ((i['filename'], i['checksum'])
+                         for i in response['items']))
+        return
+    idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
+    if idxfilter.selects_all():
+        # Stream the items, so that output starts right away, even
+        # for large indexes.
+        with photoidx.index.Index() as idx:
+            _ls(args, idx.stream(args.directory))
+    else:
+        # Use the cache and the columnar query.
+        with photoidx.index.Index(idxfile=args.directory,
+                                  columnar=True) as idx:
+            _ls(args, idx)
+
+def _lstags(args, idx):
+    idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
+    for t in sorted(idx.tagcounts(idxfilter.filter(idx))):
+        print(t)
 
 def lstags(args):
-    with photoidx.index.Index(idxfile=args.directory) as idx:
-        idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
-        tags = set()
-        for i in idxfilter.filter(idx):
-            tags.update(i.tags)
-        for t in sorted(tags):
+    response = _forward(args, "lstags")
+    if response is not None:
+        for t in response['tags']:
             print(t)
+        return
+    with photoidx.index.Index(idxfile=args.directory, columnar=True) as idx:
+        _lstags(args, idx)
+
+def _addtag(args, idx):
+    idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
+    items = [ i for i in idxfilter.filter(idx) if args.tag not in i.tags ]
+    for i in items:
+        i.tags.add(args.tag)
+    return items
 
 def addtag(args):
+    if _forward(args, "addtag", tag=args.tag) is not None:
+        return
     with photoidx.index.Index(idxfile=args.directory) as idx:
-        idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
-        for i in idxfilter.filter(idx):
-            i.tags.add(args.tag)
-        idx.write()
+        idx.write_journal(_addtag(args, idx))
+
+def _rmtag(args, idx):
+    idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
+    items = [ i for i in idxfilter.filter(idx) if args.tag in i.tags ]
+    for i in items:
+        i.tags.discard(args.tag)
+    return items
 
 def rmtag(args):
+    if _forward(args, "rmtag", tag=args.tag) is not None:
+        return
     with photoidx.index.Index(idxfile=args.directory) as idx:
-        idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
-        for i in idxfilter.filter(idx):
-            i.tags.discard(args.tag)
-        idx.write()
+        idx.write_journal(_rmtag(args, idx))
+
+def _select(args, idx):
+    idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
+    items = [ i for i in idxfilter.filter(idx) if not i.selected ]
+    for i in items:
+        i.selected = True
+    return items
 
 def select(args):
+    if _forward(args, "select") is not None:
+        return
     with photoidx.index.Index(idxfile=args.directory) as idx:
-        idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
-        for i in idxfilter.filter(idx):
-            i.selected = True
-        idx.write()
+        idx.write_journal(_select(args, idx))
+
+def _deselect(args, idx):
+    idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
+    items = [ i for i in idxfilter.filter(idx) if i.selected ]
+    for i in items:
+        i.selected = False
+    return items
 
 def deselect(args):
+    if _forward(args, "deselect") is not None:
+        return
+    with photoidx.index.Index(idxfile=args.directory) as idx:
+        idx.write_journal(_deselect(args, idx))
+
+def compact(args):
     with photoidx.index.Index(idxfile=args.directory) as idx:
-        idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
-        for i in idxfilter.filter(idx):
-            i.selected = False
         idx.write()
 
+def _stats(args, idx):
+    idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
+    stats = Stats(idxfilter.filter(idx), idx=idx)
+    print(str(stats))
+
 def stats(args):
-    with photoidx.index.Index(idxfile=args.directory) as idx:
+    response = _forward(args, "stats")
+    if response is not None:
+        print(response['stats'])
+        return
+    with photoidx.index.Index(idxfile=args.directory, columnar=True) as idx:
+        _stats(args, idx)
+
+def verify(args):
+    def _progress(state):
+        print("\r%s" % state, end="", file=sys.stderr, flush=True)
+    with photoidx.index.Index() as idx:
         idxfilter = photoidx.idxfilter.IdxFilter.from_args(args)
-        stats = Stats(idxfilter.filter(idx))
-        print(str(stats))
+        items = idxfilter.filter(idx.stream(args.directory))
+        progress = _progress if args.progress else None
+        failed = 0
+        for r in photoidx.verify.verify(items, idx.directory, args.jobs,
+                                        progress=progress):
+            if r.status in (r.FAILED, r.MISSING):
+                failed += 1
+                if args.progress:
+                    print(file=sys.stderr)
+                print("%s: %s" % (r.item.filename, r.status))
+            elif r.status == r.ERROR:
+                failed += 1
+                if args.progress:
+                    print(file=sys.stderr)
+                print("%s: %s: %s" % (r.item.filename, r.status, r.error))
+            elif r.status == r.NOCHECKSUM and args.verbose:
+                print("%s: no checksum" % r.item.filename)
+            elif args.verbose:
+                print("%s: %s" % (r.item.filename, r.status))
+        if args.progress:
+            print(file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+def _parse_batch(f):
+    """Parse the subcommands in a batch file.
+
+    Return the list of parsed arguments and the list of error
+    messages for the invalid lines.
+    """
+    commands = []
+    errors = []
+    for n, line in enumerate(f, start=1):
+        where = "%s:%d" % (f.name, n)
+        try:
+            words = shlex.split(line, comments=True)
+        except ValueError as e:
+            errors.append("%s: %s" % (where, e))
+            continue
+        if not words:
+            continue
+        if words[0].startswith('-'):
+            # The batch applies to the index given on the command
+            # line, options such as -d may not be given per line.
+            errors.append("%s: option %s is not allowed in batch mode"
+                          % (where, words[0]))
+            continue
+        # argparse prints the error and exits.  Catch that in order
+        # to report all invalid lines, rather than only the first one.
+        err = io.StringIO()
+        try:
+            with contextlib.redirect_stderr(err):
+                cmdargs = argparser.parse_args(words)
+        except SystemExit:
+            msg = err.getvalue().strip().splitlines()
+            msg = msg[-1].split(": error: ", 1)[-1] if msg else "invalid line"
+            errors.append("%s: %s" % (where, msg))
+            continue
+        if not hasattr(cmdargs, "batchfunc"):
+            errors.append("%s: subcommand %s is not supported in batch mode"
+                          % (where, words[0]))
+            continue
+        commands.append(cmdargs)
+    return commands, errors
+
+def batch(args):
+    # Check all lines before applying any of them, so that an
+    # invalid line does not leave the batch half done.
+    commands, errors = _parse_batch(args.file)
+    if errors:
+        for e in errors:
+            print("%s: error: %s" % (argparser.prog, e), file=sys.stderr)
+        sys.exit(2)
+    with photoidx.index.Index(idxfile=args.directory) as idx:
+        idx.lock()
+        modified = {}
+        for cmdargs in commands:
+            items = cmdargs.batchfunc(cmdargs, idx)
+            if items:
+                modified.update(dict.fromkeys(items))
+        idx.write_journal(modified.keys())
+
+def serve(args):
+    # Make sure to clean up the socket when being terminated.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with photoidx.index.Index(idxfile=args.directory) as idx:
+        address = photoidx.server.socket_path(args.directory)
+        server = photoidx.server.IndexServer(idx, address)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+def watch(args):
+    # Make sure to write the pending changes when being terminated.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    hashalg = args.checksums.split(',') if args.checksums else []
+    with photoidx.watch.Watcher(args.directory, hashalg=hashalg,
+                                filestat=args.stat, settle=args.settle,
+                                interval=args.interval,
+                                polling=args.poll) as watcher:
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if watcher.ready:
+                watcher.flush()
 
 
 argparser = argparse.ArgumentParser()
@@ -81,42 +286,130 @@ create_parser.add_argument('--checksums', default="md5",
                                  "hash algorithms to calculate checksums"))
 create_parser.add_argument('--update', action='store_true', 
                            help="add images to an existing index")
+create_parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                           help="number of images to read in parallel")
+create_parser.add_argument('--concurrency', type=int, metavar='N',
+                           help=("number of images to process concurrently "
+                                 "using asyncio, for file systems having a "
+                                 "high latency"))
+create_parser.add_argument('--stat', action='store_true', 
+                           help=("record the file status of the images, "
+                                 "with --update, re-read modified images "
+                                 "and remove missing ones"))
+create_parser.add_argument('--recursive', action='store_true', 
+                           help="add images in subdirectories as well")
+create_parser.add_argument('--include', action='append', metavar='PATTERN',
+                           help=("only add images matching the glob pattern, "
+                                 "may be given multiple times"))
+create_parser.add_argument('--exclude', action='append', metavar='PATTERN',
+                           help=("skip files and directories matching the "
+                                 "glob pattern, may be given multiple times"))
 create_parser.set_defaults(func=create)
 
 ls_parser = subparsers.add_parser('ls', help="list image files")
 ls_parser.add_argument('--checksum', help="hash algorithm to print checksums")
 photoidx.idxfilter.addFilterArguments(ls_parser)
-ls_parser.set_defaults(func=ls)
+ls_parser.set_defaults(func=ls, batchfunc=_ls)
 
 lstags_parser = subparsers.add_parser('lstags', help="list tags")
 photoidx.idxfilter.addFilterArguments(lstags_parser)
-lstags_parser.set_defaults(func=lstags)
+lstags_parser.set_defaults(func=lstags, batchfunc=_lstags)
 
 addtag_parser = subparsers.add_parser('addtag', help="add tag to images")
 addtag_parser.add_argument('tag')
 photoidx.idxfilter.addFilterArguments(addtag_parser)
-addtag_parser.set_defaults(func=addtag)
+addtag_parser.set_defaults(func=addtag, batchfunc=_addtag)
 
 rmtag_parser = subparsers.add_parser('rmtag', help="remove tag from images")
 rmtag_parser.add_argument('tag')
 photoidx.idxfilter.addFilterArguments(rmtag_parser)
-rmtag_parser.set_defaults(func=rmtag)
+rmtag_parser.set_defaults(func=rmtag, batchfunc=_rmtag)
 
 select_parser = subparsers.add_parser('select', 
                                       help="add images to the selection")
 photoidx.idxfilter.addFilterArguments(select_parser)
-select_parser.set_defaults(func=select)
+select_parser.set_defaults(func=select, batchfunc=_select)
 
 deselect_parser = subparsers.add_parser('deselect', 
                                         help="remove images from the selection")
 photoidx.idxfilter.addFilterArguments(deselect_parser)
-deselect_parser.set_defaults(func=deselect)
+deselect_parser.set_defaults(func=deselect, batchfunc=_deselect)
 
 stats_parser = subparsers.add_parser('stats', help="show statistics")
 photoidx.idxfilter.addFilterArguments(stats_parser)
-stats_parser.set_defaults(func=stats)
+stats_parser.set_defaults(func=stats, batchfunc=_stats)
+
+compact_parser = subparsers.add_parser('compact', 
+                                       help="fold the journal into the index")
+compact_parser.set_defaults(func=compact)
+
+verify_parser = subparsers.add_parser('verify', 
+                                      help=("verify the image files against "
+                                            "the checksums in the index"))
+verify_parser.add_argument('--jobs', type=int, default=4, metavar='N',
+                           help="number of images to read in parallel")
+verify_parser.add_argument('--progress', action='store_true', 
+                           help="report progress and throughput on stderr")
+verify_parser.add_argument('--verbose', action='store_true', 
+                           help="also list the images that are ok")
+photoidx.idxfilter.addFilterArguments(verify_parser)
+verify_parser.set_defaults(func=verify)
+
+batch_parser = subparsers.add_parser('batch', 
+                                     help="run subcommands read from a file")
+batch_parser.add_argument('file', nargs='?', default='-', 
+                          type=argparse.FileType('rt'), 
+                          help=("file having one subcommand with its "
+                                "arguments per line, default: stdin"))
+batch_parser.set_defaults(func=batch)
+
+serve_parser = subparsers.add_parser('serve', 
+                                     help=("keep the index in memory and "
+                                           "serve other invocations"),
+                                     description=(
+                                         "Keep the index in memory and "
+                                         "serve the subcommands ls, lstags, "
+                                         "stats, addtag, rmtag, select, and "
+                                         "deselect of other invocations.  "
+                                         "The index file is locked while "
+                                         "the server is running: compact "
+                                         "and create --update fail and "
+                                         "watch defers writing the index "
+                                         "until the server is stopped."))
+serve_parser.set_defaults(func=serve)
+
+watch_parser = subparsers.add_parser('watch', 
+                                     help=("watch the image directory and "
+                                           "keep the index up to date"))
+watch_parser.add_argument('--checksums', default="md5", 
+                          help=("comma separated list of "
+                                "hash algorithms to calculate checksums"))
+watch_parser.add_argument('--stat', action='store_true', default=True,
+                          help=("record the file status of the images "
+                                "(the default)"))
+watch_parser.add_argument('--no-stat', action='store_false', dest='stat',
+                          help=("do not record the file status of new "
+                                "images"))
+watch_parser.add_argument('--settle', type=float, default=2.0, 
+                          metavar='SECONDS', 
+                          help=("time without further changes before "
+                                "reading an image file"))
+watch_parser.add_argument('--interval', type=float, default=10.0, 
+                          metavar='SECONDS', 
+                          help="minimum time between writing the index")
+watch_parser.add_argument('--poll', action='store_true', 
+                          help="poll the directory rather than using inotify")
+watch_parser.set_defaults(func=watch)
 
 args = argparser.parse_args()
 if not hasattr(args, "func"):
     argparser.error("subcommand is required")
-args.func(args)
+try:
+    args.func(args)
+except photoidx.server.ServerError as e:
+    argparser.exit(1, "%s: error: server: %s\n" % (argparser.prog, e))
+except photoidx.index.AlreadyLockedError:
+    # Most likely, photo-idx.py serve holds a shared lock, so that the
+    # index file cannot be written.
+    argparser.exit(1, "%s: error: the index is locked by another process, "
+                   "such as photo-idx.py serve\n" % argparser.prog)
@@ -17,3 +17,14 @@ def test_exif_orientation(o):
     orientation = exifdata.orientation
     assert orientation == o
     assert str(orientation) == photoidx.exif.Orientation.OrientationLabels[o]
+
+@pytest.mark.parametrize("o", range(1, 9))
+def test_exif_orientation_fileobj(o):
+    """Read the EXIF tags from an open file object rather than a path.
+    """
+    testimg = "dsc_1190-o%d.jpg" % o
+    filename = Path(gettestdata(testimg))
+    with filename.open("rb") as f:
+        exifdata = photoidx.exif.Exif(f)
+    orientation = exifdata.orientation
+    assert orientation == o
@@ -1,9 +1,12 @@
 """Test class GeoPosition.
 """
 
+import pickle
+import random
 import re
 import pytest
-from photoidx.geo import GeoPosition
+import photoidx.geo
+from photoidx.geo import GeoPosition, GeoIndex
 
 
 geopos_str_pattern = (r"^\s*(?P<lat>\d+).*(?P<latref>N|S),\s*"
@@ -124,3 +127,90 @@ def test_geo_triangle_centroid(pos1, pos2, pos3):
     e3 = GeoPosition.centroid((p1, p2))
     c1 = GeoPosition.centroid((e1, e2, e3))
     assert (c1.lat, c1.lon) == pytest.approx((c0.lat, c0.lon))
+
+
+@pytest.mark.parametrize(("center", "radius"), [
+    ((51.0, 14.6), 3.0),
+    ((51.0, 14.6), 500.0),
+    ((-17.9, 179.99), 100.0),
+    ((89.9, 20.0), 50.0),
+    ((-89.95, -120.0), 20.0),
+    ((0.0, 0.0), 25000.0),
+])
+def test_geo_index(center, radius):
+    """Select positions within a radius using a GeoIndex.
+
+    The selection must contain all positions within the radius.
+    """
+    rnd = random.Random(1742)
+    positions = [ GeoPosition((rnd.uniform(-90.0, 90.0),
+                               rnd.uniform(-180.0, 180.0)))
+                  for i in range(2000) ]
+    # add some positions close to the center.
+    for i in range(200):
+        lat = min(max(center[0] + rnd.uniform(-2.0, 2.0), -90.0), 90.0)
+        lon = (center[1] + rnd.uniform(-2.0, 2.0) + 180.0) % 360.0 - 180.0
+        positions.append(GeoPosition((lat, lon)))
+    geoindex = GeoIndex(positions, lambda p: p)
+    center = GeoPosition(center)
+    selected = geoindex.select(center, radius)
+    expected = [ p for p in positions if center - p <= radius ]
+    assert { id(p) for p in expected } <= { id(p) for p in selected }
+    if radius < 1000.0:
+        assert len(selected) < len(positions) / 2
+    within = geoindex.within(center, radius)
+    assert { id(p) for p in within } == { id(p) for p in expected }
+
+@pytest.mark.parametrize("use_numpy", [
+    pytest.param(True, id="numpy"),
+    pytest.param(False, id="python"),
+])
+def test_geo_batch(monkeypatch, use_numpy):
+    """Distances and centroid of many positions at once.
+
+    The batch methods must yield the same results as the methods
+    operating on single positions, both with and without numpy.
+    """
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(photoidx.geo, "numpy", None)
+    rnd = random.Random(2581)
+    positions = [ GeoPosition((rnd.uniform(50.0, 52.0),
+                               rnd.uniform(13.0, 15.0)))
+                  for i in range(500) ]
+    center = GeoPosition((pos_berlin.lat, pos_berlin.lon))
+    dists = center.distances(positions)
+    assert dists == pytest.approx([ center - p for p in positions ])
+    centroid, radius = GeoPosition.centroid_radius(positions)
+    c = GeoPosition.centroid(positions)
+    assert (centroid.lat, centroid.lon) == pytest.approx((c.lat, c.lon))
+    assert radius == pytest.approx(max(c - p for p in positions))
+    with pytest.raises(ValueError):
+        GeoPosition.centroid_radius([])
+
+@pytest.mark.parametrize("protocol", range(pickle.HIGHEST_PROTOCOL + 1))
+def test_geo_pickle(protocol):
+    """Pickle and compare deg, lat, lon, and GeoPosition objects.
+
+    These classes use __slots__, this must not get in the way of
+    pickling them.
+    """
+    for cls in (photoidx.geo.deg, photoidx.geo.lat, photoidx.geo.lon):
+        v = cls(-17.92304)
+        v1 = pickle.loads(pickle.dumps(v, protocol))
+        assert type(v1) is cls
+        assert v1 == v
+        assert v1 < cls(25.84708)
+        assert v1.dms() == v.dms()
+    for pos in (pos_berlin, pos_philly, pos_vfalls, pos_sirius):
+        p = GeoPosition((pos.lat, pos.lon))
+        p1 = pickle.loads(pickle.dumps(p, protocol))
+        assert type(p1) is GeoPosition
+        assert not hasattr(p1, "__dict__")
+        assert type(p1.lat) is photoidx.geo.lat
+        assert type(p1.lon) is photoidx.geo.lon
+        assert (p1.lat, p1.lon) == (p.lat, p.lon)
+        assert p1.as_dict() == p.as_dict()
+        assert str(p1) == str(p)
+        assert p1 - p == 0.0
@@ -2,6 +2,8 @@
 """
 
 import filecmp
+import itertools
+from pathlib import Path
 import shutil
 import pytest
 import photoidx.index
@@ -47,3 +49,42 @@ def test_read(imgdir):
         idx.write()
     idxfile = str(imgdir / ".index.yaml")
     assert filecmp.cmp(refindex, idxfile), "index file differs from reference"
+
+def test_create_jobs(imgdir):
+    """Create a new index reading the images in parallel.
+
+    The result must be the same as in the sequential case.
+    """
+    with photoidx.index.Index(imgdir=imgdir, jobs=4) as idx:
+        idx.write()
+    idxfile = str(imgdir / ".index.yaml")
+    assert filecmp.cmp(refindex, idxfile), "index file differs from reference"
+
+def test_create_jobs_bounded(imgdir):
+    """Reading the images in parallel only submits a few files ahead.
+    """
+    taken = []
+    def files():
+        for i in range(100):
+            for f in testimgs:
+                taken.append(f)
+                yield (Path(f), None)
+    items = photoidx.index._readfiles(files(), imgdir, ['md5'], jobs=2)
+    assert str(next(items).filename) == testimgs[0]
+    assert len(taken) <= 6
+    fnames = [ str(i.filename) for i in itertools.islice(items, 4) ]
+    assert fnames == testimgs[1:]
+    items.close()
+    assert len(taken) <= 10
+
+@pytest.mark.parametrize("concurrency", [2, 16])
+def test_create_concurrency(imgdir, concurrency):
+    """Create a new index processing the images concurrently using asyncio.
+
+    The result must be the same as in the sequential case.
+    """
+    (imgdir / "subdir.jpg").mkdir(exist_ok=True)
+    with photoidx.index.Index(imgdir=imgdir, concurrency=concurrency) as idx:
+        idx.write()
+    idxfile = str(imgdir / ".index.yaml")
+    assert filecmp.cmp(refindex, idxfile), "index file differs from reference"
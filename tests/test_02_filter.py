@@ -41,6 +41,36 @@ def test_by_gpspos(imgdir):
         fnames = [ str(i.filename) for i in idxfilter.filter(idx) ]
         assert fnames == ["dsc_4623.jpg", "dsc_4664.jpg"]
 
+def test_by_gpspos_iter(imgdir, monkeypatch):
+    """Select by GPS position from a plain iterable of items.
+
+    The distances are calculated for chunks of items at once.  The
+    result must be the same as when checking each item on its own.
+    """
+    monkeypatch.setattr(photoidx.idxfilter.IdxFilter, "_chunksize", 2)
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        pos = GeoPosition("35.6883 N, 139.7544 E")
+        idxfilter = photoidx.idxfilter.IdxFilter(gpspos=pos, gpsradius=20.0)
+        fnames = [ str(i.filename) for i in idxfilter.filter(iter(idx)) ]
+        assert fnames == ["dsc_4623.jpg", "dsc_4664.jpg"]
+        assert fnames == [ str(i.filename) for i in idx if idxfilter(i) ]
+
+def test_geo_index(imgdir):
+    """The geo index is only built for repeated queries.
+
+    The first query checks the GPS position of each item.  The result
+    must be the same as for later queries using the geo index.
+    """
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        pos = GeoPosition("35.6883 N, 139.7544 E")
+        idxfilter = photoidx.idxfilter.IdxFilter(gpspos=pos, gpsradius=20.0)
+        fnames = [ str(i.filename) for i in idxfilter.filter(idx) ]
+        assert idx._geoindex is None
+        assert fnames == ["dsc_4623.jpg", "dsc_4664.jpg"]
+        fnames = [ str(i.filename) for i in idxfilter.filter(idx) ]
+        assert idx._geoindex is not None
+        assert fnames == ["dsc_4623.jpg", "dsc_4664.jpg"]
+
 def test_by_files(imgdir):
     """Select by file names.
     """
@@ -2,16 +2,22 @@
 """
 
 import datetime
+import shutil
 import pytest
 import photoidx.index
 import photoidx.idxfilter
-from conftest import gettestdata
+from conftest import tmpdir, gettestdata
 
 testimgs = [ "dsc_%04d.jpg" % i for i in range(1,13) ]
-indexfile = gettestdata("index-date.yaml")
+refindex = gettestdata("index-date.yaml")
 
+@pytest.fixture(scope="module")
+def indexfile(tmpdir):
+    shutil.copy(refindex, str(tmpdir / ".index.yaml"))
+    return tmpdir
 
-def test_single_date():
+
+def test_single_date(indexfile):
     """Select by single date.
     """
     with photoidx.index.Index(idxfile=indexfile) as idx:
@@ -21,7 +27,7 @@ def test_single_date():
         assert fnames == testimgs[1:4]
 
 
-def test_interval_date_date():
+def test_interval_date_date(indexfile):
     """Select by an interval between two dates.
     """
     with photoidx.index.Index(idxfile=indexfile) as idx:
@@ -31,7 +37,7 @@ def test_interval_date_date():
         assert fnames == testimgs[1:11]
 
 
-def test_interval_date_datetime():
+def test_interval_date_datetime(indexfile):
     """Select by an interval between start date and end date/time.
     """
     with photoidx.index.Index(idxfile=indexfile) as idx:
@@ -42,7 +48,7 @@ def test_interval_date_datetime():
         assert fnames == testimgs[1:9]
 
 
-def test_single_datetime():
+def test_single_datetime(indexfile):
     """Select by single date/time.
 
     Probably not very useful in the praxis, but valid.
@@ -55,7 +61,7 @@ def test_single_datetime():
         assert fnames == testimgs[6:7]
 
 
-def test_interval_datetime_date():
+def test_interval_datetime_date(indexfile):
     """Select by an interval between start date/time and end date.
     """
     with photoidx.index.Index(idxfile=indexfile) as idx:
@@ -66,7 +72,7 @@ def test_interval_datetime_date():
         assert fnames == testimgs[6:11]
 
 
-def test_interval_datetime_datetime():
+def test_interval_datetime_datetime(indexfile):
     """Select by an interval between two date/times.
     """
     with photoidx.index.Index(idxfile=indexfile) as idx:
@@ -75,3 +81,20 @@ def test_interval_datetime_datetime():
         idxfilter = photoidx.idxfilter.IdxFilter(date=date)
         fnames = [ str(i.filename) for i in idxfilter.filter(idx) ]
         assert fnames == testimgs[7:9]
+
+
+def test_date_index(indexfile):
+    """The date index is only built for repeated queries.
+
+    The first query checks the date on each item.  The result must
+    be the same as for later queries using the date index.
+    """
+    with photoidx.index.Index(idxfile=indexfile) as idx:
+        date = (datetime.datetime(2016, 2, 29), datetime.datetime(2016, 3, 6))
+        idxfilter = photoidx.idxfilter.IdxFilter(date=date)
+        fnames = [ str(i.filename) for i in idxfilter.filter(idx) ]
+        assert idx._dateindex is None
+        assert fnames == testimgs[1:11]
+        fnames = [ str(i.filename) for i in idxfilter.filter(idx) ]
+        assert idx._dateindex is not None
+        assert fnames == testimgs[1:11]
@@ -6,13 +6,19 @@ mostly test the date parser in idxfilter.
 """
 
 import argparse
+import shutil
 import pytest
 import photoidx.index
 import photoidx.idxfilter
-from conftest import gettestdata
+from conftest import tmpdir, gettestdata
 
 testimgs = [ "dsc_%04d.jpg" % i for i in range(1,13) ]
-indexfile = gettestdata("index-date.yaml")
+refindex = gettestdata("index-date.yaml")
+
+@pytest.fixture(scope="module")
+def indexfile(tmpdir):
+    shutil.copy(refindex, str(tmpdir / ".index.yaml"))
+    return tmpdir
 
 @pytest.fixture(scope="module")
 def argparser():
@@ -21,7 +27,7 @@ def argparser():
     return parser
 
 
-def test_single_date(argparser):
+def test_single_date(argparser, indexfile):
     """Select by single date.
     """
     with photoidx.index.Index(idxfile=indexfile) as idx:
@@ -31,7 +37,7 @@ def test_single_date(argparser):
         assert fnames == testimgs[1:4]
 
 
-def test_interval_date_date(argparser):
+def test_interval_date_date(argparser, indexfile):
     """Select by an interval between two dates.
     """
     with photoidx.index.Index(idxfile=indexfile) as idx:
@@ -41,7 +47,7 @@ def test_interval_date_date(argparser):
         assert fnames == testimgs[1:11]
 
 
-def test_interval_date_datetime(argparser):
+def test_interval_date_datetime(argparser, indexfile):
     """Select by an interval between start date and end date/time.
     """
     with photoidx.index.Index(idxfile=indexfile) as idx:
@@ -51,7 +57,7 @@ def test_interval_date_datetime(argparser):
         assert fnames == testimgs[1:9]
 
 
-def test_single_datetime(argparser):
+def test_single_datetime(argparser, indexfile):
     """Select by single date/time.
 
     Probably not very useful in the praxis, but valid.
@@ -63,7 +69,7 @@ def test_single_datetime(argparser):
         assert fnames == testimgs[6:7]
 
 
-def test_interval_datetime_date(argparser):
+def test_interval_datetime_date(argparser, indexfile):
     """Select by an interval between start date/time and end date.
     """
     with photoidx.index.Index(idxfile=indexfile) as idx:
@@ -73,7 +79,7 @@ def test_interval_datetime_date(argparser):
         assert fnames == testimgs[6:11]
 
 
-def test_interval_datetime_datetime(argparser):
+def test_interval_datetime_datetime(argparser, indexfile):
     """Select by an interval between two date/times.
     """
     with photoidx.index.Index(idxfile=indexfile) as idx:
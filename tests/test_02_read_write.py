@@ -4,6 +4,7 @@
 import filecmp
 import shutil
 import pytest
+import yaml
 import photoidx.index
 from conftest import tmpdir, gettestdata
 
@@ -46,3 +47,18 @@ def test_read_write_unicode(imgdir):
     with photoidx.index.Index(idxfile=imgdir) as idx:
         idx.write()
     assert filecmp.cmp(refindexu, idxfile), "index file differs from reference"
+
+@pytest.mark.parametrize("ref", [refindex, refindexu])
+def test_read_write_pure_python(imgdir, monkeypatch, ref):
+    """Same test as above, using the pure Python YAML implementation.
+
+    photoidx uses the libyaml based loader and dumper if available.
+    The fallback must yield the same result.
+    """
+    monkeypatch.setattr(photoidx.index, "SafeLoader", yaml.SafeLoader)
+    monkeypatch.setattr(photoidx.index, "SafeDumper", yaml.SafeDumper)
+    idxfile = str(imgdir / ".index.yaml")
+    shutil.copy(ref, idxfile)
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        idx.write()
+    assert filecmp.cmp(ref, idxfile), "index file differs from reference"
@@ -371,3 +371,57 @@ def test_stats_filtered(imgdir):
         "Shinto_shrine": 1,
         "Tokyo": 2,
     }
+
+@pytest.mark.dependency(depends=["test_create", "test_deselect_by_files"])
+def test_batch(imgdir, monkeypatch):
+    """Run several subcommands in batch mode.
+    """
+    monkeypatch.chdir(str(imgdir))
+    fname = imgdir / "batch"
+    with fname.open("wt") as f:
+        print("# tag and select some images", file=f, end="\n\n")
+        print("addtag batch --tags Tokyo", file=f)
+        print("rmtag batch dsc_4623.jpg", file=f)
+        print("select 'dsc_5167.jpg'", file=f)
+        print("ls --tags batch", file=f)
+    out = imgdir / "out"
+    with out.open("wt") as f:
+        callscript("photo-idx.py", ["batch", str(fname)], stdout=f)
+    with out.open("rt") as f:
+        assert f.read().split() == ["dsc_4664.jpg"]
+    with out.open("wt") as f:
+        with fname.open("rt") as stdin:
+            callscript("photo-idx.py", ["batch"], stdin=stdin, stdout=f)
+    with out.open("rt") as f:
+        assert f.read().split() == ["dsc_4664.jpg"]
+    with out.open("wt") as f:
+        callscript("photo-idx.py", ["ls", "--selected"], stdout=f)
+    with out.open("rt") as f:
+        out = f.read().split()
+    assert out == ["dsc_4664.jpg", "dsc_5126.jpg", "dsc_5167.jpg"]
+
+def test_batch_invalid(imgdir, monkeypatch):
+    """Invalid lines in a batch are reported and nothing is applied.
+    """
+    monkeypatch.chdir(str(imgdir))
+    fname = imgdir / "batch-invalid"
+    with fname.open("wt") as f:
+        print("addtag invalid --tags Tokyo", file=f)
+        print("-d /tmp ls", file=f)
+        print("ls --bogus", file=f)
+        print("compact", file=f)
+        print("select dsc_4623.jpg", file=f)
+    err = imgdir / "err"
+    with err.open("wt") as f:
+        with pytest.raises(subprocess.CalledProcessError):
+            callscript("photo-idx.py", ["batch", str(fname)], stderr=f)
+    with err.open("rt") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 3
+    for n, line in zip((2, 3, 4), lines):
+        assert ("%s:%d: " % (fname, n)) in line
+    out = imgdir / "out"
+    with out.open("wt") as f:
+        callscript("photo-idx.py", ["ls", "--tags", "invalid"], stdout=f)
+    with out.open("rt") as f:
+        assert f.read().split() == []
@@ -0,0 +1,126 @@
+"""The binary cache kept next to the index file.
+"""
+
+import filecmp
+import os
+import shutil
+import stat
+import pytest
+import photoidx.index
+from conftest import tmpdir, gettestdata
+
+testimgs = [ 
+    "dsc_4623.jpg", "dsc_4664.jpg", "dsc_4831.jpg", 
+    "dsc_5126.jpg", "dsc_5167.jpg" 
+]
+testimgfiles = [ gettestdata(i) for i in testimgs ]
+
+refindex = gettestdata("index-tagged.yaml")
+refindex2 = gettestdata("index-create.yaml")
+
+@pytest.fixture(scope="module")
+def imgdir(tmpdir):
+    for fname in testimgfiles:
+        shutil.copy(fname, str(tmpdir))
+    shutil.copy(refindex, str(tmpdir / ".index.yaml"))
+    return tmpdir
+
+def no_yaml_load(*args, **kwargs):
+    raise AssertionError("index file parsed")
+
+def get_items(idx):
+    return [ i.as_dict() for i in idx ]
+
+@pytest.mark.dependency()
+def test_cache_create(imgdir):
+    """Reading the index creates the cache.
+    """
+    cachefile = imgdir / ".index.yaml.cache"
+    assert not cachefile.exists()
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        pass
+    assert cachefile.is_file()
+
+@pytest.mark.dependency(depends=["test_cache_create"])
+def test_cache_read(imgdir, monkeypatch):
+    """Read the index from the cache.
+    """
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        items = get_items(idx)
+    monkeypatch.setattr(photoidx.index.yaml, "load", no_yaml_load)
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        assert get_items(idx) == items
+
+@pytest.mark.dependency(depends=["test_cache_create"])
+def test_cache_write(imgdir, monkeypatch):
+    """Writing the index updates the cache.
+    """
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        idx[0].tags.add("cached")
+        idx.write()
+        items = get_items(idx)
+    with monkeypatch.context() as m:
+        m.setattr(photoidx.index.yaml, "load", no_yaml_load)
+        with photoidx.index.Index(idxfile=imgdir) as idx:
+            assert get_items(idx) == items
+    shutil.copy(refindex, str(imgdir / ".index.yaml"))
+
+@pytest.mark.dependency(depends=["test_cache_create"])
+def test_cache_stale(imgdir):
+    """The cache must not be used if the index file has been modified.
+    """
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        pass
+    shutil.copy(refindex2, str(imgdir / ".index.yaml"))
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        idx.write(imgdir / "index-copy.yaml")
+    assert filecmp.cmp(refindex2, str(imgdir / "index-copy.yaml"))
+    shutil.copy(refindex, str(imgdir / ".index.yaml"))
+
+@pytest.mark.dependency(depends=["test_cache_create"])
+def test_cache_stale_mtime(imgdir):
+    """The cache must not be used if the content has changed.
+
+    This must hold even if the index file has the same size and
+    modification time, as may happen on file systems having a coarse
+    time granularity.
+    """
+    idxfile = imgdir / ".index.yaml"
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        pass
+    st = idxfile.stat()
+    with idxfile.open("rt") as f:
+        content = f.read()
+    assert "Tokyo" in content
+    with idxfile.open("wt") as f:
+        f.write(content.replace("Tokyo", "Kyoto"))
+    os.utime(str(idxfile), ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert idxfile.stat().st_size == st.st_size
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        tags = set().union(*(i.tags for i in idx))
+        assert "Kyoto" in tags
+        assert "Tokyo" not in tags
+    shutil.copy(refindex, str(idxfile))
+
+@pytest.mark.dependency(depends=["test_cache_create"])
+def test_cache_corrupt(imgdir):
+    """A corrupt cache file is ignored.
+    """
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        items = get_items(idx)
+    cachefile = imgdir / ".index.yaml.cache"
+    with cachefile.open("r+b") as f:
+        f.truncate(40)
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        assert get_items(idx) == items
+
+def test_cache_mode(imgdir):
+    """The cache file has the same permissions as the index file.
+    """
+    idxfile = imgdir / ".index.yaml"
+    cachefile = imgdir / ".index.yaml.cache"
+    idxfile.chmod(0o644)
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        idx.write()
+    assert stat.S_IMODE(cachefile.stat().st_mode) == 0o644
+    shutil.copy(refindex, str(idxfile))
@@ -6,7 +6,8 @@ import shutil
 import subprocess
 import pytest
 import photoidx.index
-from conftest import tmpdir, gettestdata
+import photoidx.verify
+from conftest import tmpdir, gettestdata, callscript
 
 testimgs = [ 
     "dsc_4623.jpg", "dsc_4664.jpg", "dsc_4831.jpg", 
@@ -46,6 +47,77 @@ def test_check_checksum(tmpdir, monkeypatch, alg):
         print(">", *cmd)
         subprocess.check_call(cmd, stdin=f)
 
+@pytest.mark.dependency(depends=["test_create_checksum"])
+def test_verify(tmpdir):
+    """Verify the image files using photoidx.verify.
+    """
+    with photoidx.index.Index(idxfile=tmpdir) as idx:
+        results = list(photoidx.verify.verify(idx, tmpdir, jobs=3,
+                                              blocksize=4096))
+    assert [ str(r.item.filename) for r in results ] == testimgs
+    assert [ r.status for r in results ] == ["OK"] * len(testimgs)
+    assert [ r.size for r in results ] == [ Path(f).stat().st_size
+                                           for f in testimgfiles ]
+
+@pytest.mark.dependency(depends=["test_create_checksum"])
+def test_verify_failed(tmpdir):
+    """Verify the image files with some of them modified or missing.
+    """
+    vdir = tmpdir / "verify"
+    vdir.mkdir()
+    shutil.copy(str(tmpdir / ".index.yaml"), str(vdir))
+    for fname in testimgfiles[1:]:
+        shutil.copy(fname, str(vdir))
+    with (vdir / testimgs[2]).open("r+b") as f:
+        f.seek(1000)
+        f.write(b"modified")
+    progress = []
+    with photoidx.index.Index(idxfile=vdir) as idx:
+        results = list(photoidx.verify.verify(idx, vdir,
+                                              progress=progress.append))
+    assert [ r.status for r in results ] == [
+        "MISSING", "OK", "FAILED", "OK", "OK"
+    ]
+    assert set(results[2].failed) == set(hashalg.keys())
+    assert progress[-1].count == len(testimgs)
+    # The script reports the failures and exits with an error.
+    fname = tmpdir / "out"
+    with fname.open("wt") as f:
+        with pytest.raises(subprocess.CalledProcessError):
+            callscript("photo-idx.py", ["-d", str(vdir), "verify"], stdout=f)
+    with fname.open("rt") as f:
+        assert f.read().splitlines() == [
+            "%s: MISSING" % testimgs[0],
+            "%s: FAILED" % testimgs[2],
+        ]
+    callscript("photo-idx.py", ["-d", str(vdir), "verify", "--progress",
+                                testimgs[1], testimgs[3]])
+
+@pytest.mark.dependency(depends=["test_create_checksum"])
+def test_verify_error(tmpdir):
+    """Verify the image files with one of them not being readable.
+    """
+    vdir = tmpdir / "verify-error"
+    vdir.mkdir()
+    shutil.copy(str(tmpdir / ".index.yaml"), str(vdir))
+    for fname in testimgfiles[1:]:
+        shutil.copy(fname, str(vdir))
+    # A directory in place of the image file yields an error other
+    # than FileNotFoundError.
+    (vdir / testimgs[0]).mkdir()
+    with photoidx.index.Index(idxfile=vdir) as idx:
+        results = list(photoidx.verify.verify(idx, vdir))
+    assert [ r.status for r in results ] == ["ERROR"] + ["OK"] * 4
+    assert results[0].error
+    fname = tmpdir / "out"
+    with fname.open("wt") as f:
+        with pytest.raises(subprocess.CalledProcessError):
+            callscript("photo-idx.py", ["-d", str(vdir), "verify"], stdout=f)
+    with fname.open("rt") as f:
+        assert f.read().splitlines() == [
+            "%s: ERROR: %s" % (testimgs[0], results[0].error),
+        ]
+
 def test_no_checksum(tmpdir):
     with photoidx.index.Index(imgdir=tmpdir, hashalg=[]) as idx:
         idx.write()
@@ -0,0 +1,113 @@
+"""Keep the items of an index in columns.
+
+With columnar=True, the Index keeps the items in an ItemColumns
+rather than as IdxItem objects.  It must yield the same results.
+"""
+
+import datetime
+import filecmp
+import shutil
+import pytest
+import photoidx.columns
+import photoidx.index
+import photoidx.idxfilter
+from photoidx.geo import GeoPosition
+from photoidx.stats import Stats
+from conftest import tmpdir, gettestdata
+
+testimgs = [
+    "dsc_4623.jpg", "dsc_4664.jpg", "dsc_4831.jpg",
+    "dsc_5126.jpg", "dsc_5167.jpg"
+]
+testimgfiles = [ gettestdata(i) for i in testimgs ]
+
+refindex = gettestdata("index-tagged.yaml")
+refindexu = gettestdata("index-unicode-tags.yaml")
+
+@pytest.fixture(scope="module")
+def imgdir(tmpdir):
+    for fname in testimgfiles:
+        shutil.copy(fname, str(tmpdir))
+    shutil.copy(refindex, str(tmpdir / ".index.yaml"))
+    return tmpdir
+
+@pytest.fixture(params=["numpy", "python"])
+def scan(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(photoidx.columns, "numpy", None)
+    elif photoidx.columns.numpy is None:
+        pytest.skip("numpy is not available")
+    return request.param
+
+filters = [
+    {},
+    {'tags': "Tokyo"},
+    {'tags': "Tokyo,Shinto_shrine"},
+    {'tags': "!Tokyo"},
+    {'tags': "Hakone,!Tokyo"},
+    {'tags': "Nikko"},
+    {'tags': ""},
+    {'select': True},
+    {'select': False},
+    {'date': (datetime.datetime(2016, 2, 29), datetime.datetime(2016, 3, 9))},
+    {'gpspos': GeoPosition("35.6809 N, 139.7670 E"), 'gpsradius': 20.0},
+    {'files': ["dsc_4831.jpg", "dsc_5167.jpg", "dsc_0000.jpg"]},
+    {'tags': "Tokyo", 'select': True, 'files': ["dsc_4664.jpg"]},
+]
+
+@pytest.mark.parametrize("kwargs", filters)
+def test_filter(imgdir, scan, kwargs):
+    """Filtering the columns yields the same items as filtering IdxItems.
+    """
+    idxfilter = photoidx.idxfilter.IdxFilter(**kwargs)
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        ref = [ i.as_dict() for i in filter(idxfilter, idx) ]
+    with photoidx.index.Index(idxfile=imgdir, columnar=True) as idx:
+        items = [ i.as_dict() for i in idxfilter.filter(idx) ]
+    assert items == ref
+
+@pytest.mark.parametrize("kwargs", filters)
+def test_stats(imgdir, scan, kwargs):
+    """Statistics taken from the columns are the same as from IdxItems.
+    """
+    idxfilter = photoidx.idxfilter.IdxFilter(**kwargs)
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        ref = Stats(filter(idxfilter, idx))
+    with photoidx.index.Index(idxfile=imgdir, columnar=True) as idx:
+        stats = Stats(idxfilter.filter(idx))
+    assert str(stats) == str(ref)
+    assert stats.by_tag == ref.by_tag
+    assert stats.by_date == ref.by_date
+
+@pytest.mark.parametrize("ref", [refindex, refindexu])
+def test_read_write(imgdir, ref):
+    """Read the index into columns and write it out again.
+    """
+    idxfile = str(imgdir / ".index.yaml")
+    shutil.copy(ref, idxfile)
+    try:
+        with photoidx.index.Index(idxfile=imgdir, columnar=True) as idx:
+            idx.write()
+        assert filecmp.cmp(ref, idxfile), "index file differs from reference"
+    finally:
+        shutil.copy(refindex, idxfile)
+
+def test_modify(imgdir):
+    """The tags and the selection state of the items may be modified.
+    """
+    with photoidx.index.Index(idxfile=imgdir, columnar=True) as idx:
+        item = idx[4]
+        assert item.tags == set() and not item.selected
+        item.tags = {"Tokyo"}
+        item.selected = True
+        idxfilter = photoidx.idxfilter.IdxFilter(tags="Tokyo", select=True)
+        fnames = [ str(i.filename) for i in idxfilter.filter(idx) ]
+        assert fnames == ["dsc_4664.jpg", "dsc_5167.jpg"]
+        assert idxfilter.filter(idx).tagcounts() == {
+            "Tokyo": 2, "Shinto_shrine": 1,
+        }
+        idx.write_journal([item])
+    with photoidx.index.Index(idxfile=imgdir, columnar=True) as idx:
+        assert idx[4].tags == {"Tokyo"}
+        assert idx[4].selected
+    shutil.copy(refindex, str(imgdir / ".index.yaml"))
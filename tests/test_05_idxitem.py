@@ -0,0 +1,102 @@
+"""Decode the attributes of IdxItem from the index data.
+
+IdxItem decodes some attributes only on first access.  Writing the
+item back must yield the same result, regardless of which attributes
+have been accessed.
+"""
+
+import copy
+import pytest
+import yaml
+from photoidx.geo import GeoPosition
+from photoidx.idxitem import IdxItem
+from conftest import gettestdata
+
+indexfiles = [
+    "index-create.yaml", "index-tagged.yaml", "index-name.yaml",
+    "index-reserved-tags.yaml", "index-subdirs.yaml",
+    "index-unicode-tags.yaml",
+]
+
+def readdata(fname):
+    with open(gettestdata(fname), "rt", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+def touch(item):
+    """Access all lazily decoded attributes of item.
+    """
+    return (item.filename, item.orientation, item.gpsPosition,
+            item.tags, item.selected)
+
+@pytest.mark.parametrize("fname", indexfiles)
+def test_as_dict_untouched(fname):
+    """Untouched items are written back as read.
+
+    Only reserved tags other than pidx:selected are dropped.
+    """
+    for data in readdata(fname):
+        expected = copy.deepcopy(data)
+        expected['tags'] = sorted(t for t in expected['tags']
+                                  if t == 'pidx:selected'
+                                  or not t.startswith('pidx:'))
+        assert IdxItem(data=data).as_dict() == expected
+        # Decoding all attributes does not change the result.
+        item = IdxItem(data=copy.deepcopy(data))
+        touch(item)
+        assert item.as_dict() == expected
+
+@pytest.mark.parametrize("fname", indexfiles)
+def test_as_dict_partial(fname):
+    """Accessing only some attributes does not change the result.
+    """
+    attrs = ["filename", "orientation", "gpsPosition", "tags", "selected"]
+    for data in readdata(fname):
+        expected = IdxItem(data=data).as_dict()
+        for a in attrs:
+            item = IdxItem(data=data)
+            getattr(item, a)
+            assert item.as_dict() == expected
+
+def test_as_dict_modified():
+    """Modified tags, selection, and GPS position are written back.
+    """
+    data = readdata("index-tagged.yaml")
+    items = [ IdxItem(data=d) for d in data ]
+
+    # Modify the tags and the selection without having accessed them
+    # before.
+    item = items[0]
+    assert 'pidx:selected' not in data[0]['tags']
+    item.tags.add("Shibuya")
+    item.selected = True
+    d = item.as_dict()
+    assert d['tags'] == sorted(set(data[0]['tags']) |
+                               {"Shibuya", "pidx:selected"})
+
+    # Set the tags as a whole and deselect.
+    item = items[1]
+    assert 'pidx:selected' in data[1]['tags']
+    item.tags = {"Meiji_shrine"}
+    item.selected = False
+    assert item.as_dict()['tags'] == ["Meiji_shrine"]
+
+    # Only deselect, the tags are kept.
+    item = IdxItem(data=data[1])
+    item.selected = False
+    assert item.as_dict()['tags'] == sorted(t for t in data[1]['tags']
+                                            if t != 'pidx:selected')
+
+    # Change and remove the GPS position.
+    item = items[2]
+    pos = GeoPosition((35.2, 139.0))
+    item.gpsPosition = pos
+    assert item.as_dict()['gpsPosition'] == pos.as_dict()
+    item = items[4]
+    assert data[4]['gpsPosition']
+    item.gpsPosition = None
+    assert item.as_dict()['gpsPosition'] is None
+
+    # Modified items still round trip once written.
+    for item in items:
+        d = item.as_dict()
+        assert IdxItem(data=d).as_dict() == d
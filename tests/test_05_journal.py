@@ -0,0 +1,112 @@
+"""Record modifications of tags and selection in a journal.
+"""
+
+import filecmp
+import shutil
+import pytest
+import photoidx.index
+import photoidx.idxfilter
+from conftest import tmpdir, gettestdata, callscript
+
+testimgs = [ 
+    "dsc_4623.jpg", "dsc_4664.jpg", "dsc_4831.jpg", 
+    "dsc_5126.jpg", "dsc_5167.jpg" 
+]
+testimgfiles = [ gettestdata(i) for i in testimgs ]
+
+refindex = gettestdata("index-tagged.yaml")
+
+@pytest.fixture(scope="function")
+def imgdir(tmpdir):
+    for fname in testimgfiles:
+        shutil.copy(fname, str(tmpdir))
+    shutil.copy(refindex, str(tmpdir / ".index.yaml"))
+    journal = tmpdir / ".index.yaml.journal"
+    if journal.exists():
+        journal.unlink()
+    return tmpdir
+
+def get_tagged(idx, tag):
+    idxfilter = photoidx.idxfilter.IdxFilter(tags=tag)
+    return [ str(i.filename) for i in idxfilter.filter(idx) ]
+
+def test_journal(imgdir):
+    """Record modifications in the journal and read them back.
+    """
+    idxfile = str(imgdir / ".index.yaml")
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        items = [ idx[1], idx[3] ]
+        for i in items:
+            i.tags.add("journal")
+            i.selected = not i.selected
+        idx.write_journal(items)
+    assert filecmp.cmp(refindex, idxfile), "index file has been modified"
+    assert (imgdir / ".index.yaml.journal").is_file()
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        assert get_tagged(idx, "journal") == ["dsc_4664.jpg", "dsc_5126.jpg"]
+        assert idx[1].selected is False
+        assert idx[3].selected is False
+        idx.write()
+    assert not (imgdir / ".index.yaml.journal").exists()
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        assert get_tagged(idx, "journal") == ["dsc_4664.jpg", "dsc_5126.jpg"]
+
+def test_journal_last_wins(imgdir):
+    """Later entries for the same item override earlier ones.
+    A truncated entry at the end of the journal is ignored.
+    """
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        idx[0].tags.add("first")
+        idx.write_journal([idx[0]])
+        idx[0].tags.discard("first")
+        idx[0].tags.add("second")
+        idx.write_journal([idx[0]])
+    with (imgdir / ".index.yaml.journal").open("at") as f:
+        f.write('{"filename": "dsc_4623.jpg", "tags": ["th')
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        assert idx[0].tags == {"Tokyo", "second"}
+
+def test_journal_append_truncated(imgdir):
+    """Entries appended after a truncated entry are not lost.
+    """
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        idx[0].tags.add("first")
+        idx.write_journal([idx[0]])
+    with (imgdir / ".index.yaml.journal").open("at") as f:
+        f.write('{"filename": "dsc_4623.jpg", "tags": ["th')
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        idx[1].tags.add("later")
+        idx.write_journal([idx[1]])
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        assert idx[0].tags == {"Tokyo", "first"}
+        assert get_tagged(idx, "later") == ["dsc_4664.jpg"]
+
+def test_journal_compact(imgdir, monkeypatch):
+    """The journal is folded into the index file if it grows too large.
+    """
+    monkeypatch.setattr(photoidx.index.Index, "journalMaxSize", 200)
+    journal = imgdir / ".index.yaml.journal"
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        idx[0].tags.add("a")
+        idx.write_journal([idx[0]])
+        assert journal.is_file()
+        for i in idx:
+            i.tags.add("b")
+        idx.write_journal(idx)
+        assert not journal.exists()
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        assert len(get_tagged(idx, "b")) == 5
+
+def test_journal_cli(imgdir):
+    """Tag images using the command line script and compact the journal.
+    """
+    idxfile = str(imgdir / ".index.yaml")
+    journal = imgdir / ".index.yaml.journal"
+    args = ["-d", str(imgdir), "addtag", "--tags", "Tokyo", "Japan"]
+    callscript("photo-idx.py", args)
+    assert filecmp.cmp(refindex, idxfile), "index file has been modified"
+    assert journal.is_file()
+    callscript("photo-idx.py", ["-d", str(imgdir), "compact"])
+    assert not journal.exists()
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        assert get_tagged(idx, "Japan") == ["dsc_4623.jpg", "dsc_4664.jpg"]
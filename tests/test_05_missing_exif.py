@@ -6,9 +6,11 @@ the information to the index.  But it should not raise an error if
 some exif tags are missing.
 """
 
+import datetime
 import shutil
 import pytest
 import photoidx.index
+import photoidx.idxfilter
 from conftest import tmpdir, gettestdata
 
 testimgs = [ 
@@ -26,3 +28,22 @@ def imgdir(tmpdir):
 def test_create(imgdir):
     with photoidx.index.Index(imgdir=imgdir) as idx:
         idx.write()
+
+def test_filter_date(imgdir):
+    """Filter by date.
+
+    Images not having a date never match a date criterion.  The
+    selected images are in the order of the index, even if that is
+    not sorted by date.
+    """
+    with photoidx.index.Index(imgdir=imgdir) as idx:
+        assert idx[0].createDate is None
+        idx.insert(1, idx.pop(4))
+        date = (datetime.datetime(2016, 1, 1), datetime.datetime(2017, 1, 1))
+        idxfilter = photoidx.idxfilter.IdxFilter(date=date)
+        fnames = [ str(i.filename) for i in idxfilter.filter(idx) ]
+        assert fnames == [ testimgs[i] for i in (4, 1, 2, 3, 5) ]
+        date = (datetime.datetime(2016, 3, 5), datetime.datetime(2016, 3, 9))
+        idxfilter = photoidx.idxfilter.IdxFilter(date=date)
+        fnames = [ str(i.filename) for i in idxfilter.filter(idx) ]
+        assert fnames == [ testimgs[i] for i in (4, 3) ]
@@ -0,0 +1,121 @@
+"""Serve an index over a Unix domain socket.
+"""
+
+import argparse
+import datetime
+import shutil
+import subprocess
+import threading
+import pytest
+import photoidx.index
+import photoidx.idxfilter
+import photoidx.server
+from photoidx.geo import GeoPosition
+from conftest import tmpdir, gettestdata, callscript
+
+testimgs = [
+    "dsc_4623.jpg", "dsc_4664.jpg", "dsc_4831.jpg",
+    "dsc_5126.jpg", "dsc_5167.jpg"
+]
+testimgfiles = [ gettestdata(i) for i in testimgs ]
+
+@pytest.fixture(scope="module")
+def imgdir(tmpdir):
+    for fname in testimgfiles:
+        shutil.copy(fname, str(tmpdir))
+    shutil.copy(gettestdata("index-tagged.yaml"), str(tmpdir / ".index.yaml"))
+    return tmpdir
+
+@pytest.fixture(scope="module")
+def server(imgdir):
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        address = photoidx.server.socket_path(imgdir)
+        server = photoidx.server.IndexServer(idx, address)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        yield address
+        server.shutdown()
+        thread.join()
+        server.server_close()
+    assert not address.exists()
+
+def get_args(**kwargs):
+    args = dict(tags=None, select=None, date=None,
+                gpspos=None, gpsradius=3.0, files=[])
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+def get_files(address, **kwargs):
+    response = photoidx.server.request(address, "ls", get_args(**kwargs))
+    return [ i['filename'] for i in response['items'] ]
+
+def test_ls(server):
+    assert get_files(server) == testimgs
+    assert get_files(server, tags="Tokyo") == testimgs[0:2]
+    date = (datetime.datetime(2016, 3, 1), datetime.datetime(2016, 3, 9))
+    assert get_files(server, date=date) == testimgs[2:4]
+    gpspos = GeoPosition("35.6809 N, 139.7670 E")
+    assert get_files(server, gpspos=gpspos, gpsradius=20.0) == testimgs[0:2]
+    assert get_files(server, files=["dsc_5167.jpg"]) == ["dsc_5167.jpg"]
+
+def test_lstags_stats(server):
+    response = photoidx.server.request(server, "lstags", get_args())
+    assert response['tags'] == ["Hakone", "Shinto_shrine", "Tokyo"]
+    response = photoidx.server.request(server, "stats", get_args(select=True))
+    assert response['stats'].startswith("Count: 2\nSelected: 2\n")
+
+def test_modify(imgdir, server):
+    args = get_args(files=["dsc_5126.jpg", "dsc_5167.jpg"])
+    response = photoidx.server.request(server, "addtag", args, tag="Nikko")
+    assert response['count'] == 2
+    response = photoidx.server.request(server, "select", args)
+    assert response['count'] == 1
+    assert get_files(server, tags="Nikko", select=True) == testimgs[3:5]
+    # The modifications are visible to direct readers of the index.
+    idxfilter = photoidx.idxfilter.IdxFilter(tags="Nikko", select=True)
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        fnames = [ str(i.filename) for i in idxfilter.filter(idx) ]
+    assert fnames == testimgs[3:5]
+
+def test_invalid_command(server):
+    with pytest.raises(photoidx.server.ServerError):
+        photoidx.server.request(server, "create", get_args())
+
+def test_client(imgdir, server):
+    """photo-idx.py forwards subcommands to the server.
+    """
+    callscript("photo-idx.py", ["-d", str(imgdir), "rmtag", "Nikko"])
+    assert get_files(server, tags="Nikko") == []
+    fname = imgdir / "out"
+    with fname.open("wt") as f:
+        args = ["-d", str(imgdir), "ls", "--tags", "Tokyo"]
+        callscript("photo-idx.py", args, stdout=f)
+    with fname.open("rt") as f:
+        assert f.read().split() == testimgs[0:2]
+
+def test_client_error(imgdir, server, monkeypatch):
+    """photo-idx.py reports errors from the server.
+    """
+    def fail(self, idxfilter, req):
+        raise RuntimeError("spam")
+    monkeypatch.setattr(photoidx.server.IndexServer, "do_lstags", fail)
+    fname = imgdir / "err"
+    with fname.open("wt") as f:
+        with pytest.raises(subprocess.CalledProcessError):
+            callscript("photo-idx.py", ["-d", str(imgdir), "lstags"],
+                       stderr=f)
+    with fname.open("rt") as f:
+        err = f.read()
+    assert "RuntimeError: spam" in err
+    assert "Traceback" not in err
+
+def test_filter_date():
+    """The date in the filter is passed on unchanged.
+    """
+    for date in [ (datetime.datetime(2016, 3, 1),
+                   datetime.datetime(2016, 3, 9, 12, 30, 5)),
+                  (datetime.datetime(2016, 3, 1, 0, 0, 0, 250000),
+                   datetime.datetime(2016, 3, 1, 0, 0, 1)) ]:
+        f = photoidx.server.encode_filter(get_args(date=date))
+        idxfilter = photoidx.server.decode_filter(f)
+        assert idxfilter.date == date
@@ -0,0 +1,127 @@
+"""Store the index in an SQLite database.
+"""
+
+import datetime
+import filecmp
+import shutil
+import pytest
+import photoidx.idxfilter
+from photoidx.sqliteindex import SQLiteIndex
+from conftest import tmpdir, gettestdata
+
+refindex = gettestdata("index-tagged.yaml")
+refindexn = gettestdata("index-name.yaml")
+
+@pytest.fixture(scope="module")
+def dbdir(tmpdir):
+    shutil.copy(refindex, str(tmpdir / ".index.yaml"))
+    with SQLiteIndex(tmpdir) as idx:
+        idx.import_yaml(tmpdir)
+        idx.write()
+    return tmpdir
+
+@pytest.mark.parametrize("ref", [refindex, refindexn])
+def test_import_export(tmpdir, ref):
+    """Import a YAML index file and export it again.
+    """
+    dbfile = tmpdir / "import.sqlite"
+    importfile = tmpdir / "import.yaml"
+    shutil.copy(ref, str(importfile))
+    with SQLiteIndex(dbfile) as idx:
+        idx.import_yaml(importfile)
+        idx.write()
+    idxfile = tmpdir / "export.yaml"
+    with SQLiteIndex(dbfile) as idx:
+        idx.export_yaml(idxfile)
+    assert filecmp.cmp(ref, str(idxfile)), "index file differs from reference"
+    dbfile.unlink()
+
+def test_reimport(tmpdir):
+    """Import a YAML index file into a database that is not empty.
+
+    Items already in the database are replaced, new ones appended.
+    """
+    dbfile = tmpdir / "reimport.sqlite"
+    importfile = tmpdir / "reimport.yaml"
+    shutil.copy(refindex, str(importfile))
+    with SQLiteIndex(dbfile) as idx:
+        idx.import_yaml(importfile)
+        del idx[3:]
+        idx[0].tags.add("Edo")
+        idx.write()
+    with SQLiteIndex(dbfile) as idx:
+        idx.import_yaml(importfile)
+        idx.write()
+    idxfile = tmpdir / "reexport.yaml"
+    with SQLiteIndex(dbfile) as idx:
+        assert len(idx) == 5
+        idx.export_yaml(idxfile)
+    assert filecmp.cmp(refindex, str(idxfile)), \
+        "index file differs from reference"
+    dbfile.unlink()
+
+@pytest.mark.parametrize(("kwargs", "files"), [
+    (dict(tags="Shinto_shrine"), ["dsc_4664.jpg", "dsc_4831.jpg"]),
+    (dict(tags="Tokyo,Shinto_shrine"), ["dsc_4664.jpg"]),
+    (dict(tags="Tokyo,!Shinto_shrine"), ["dsc_4623.jpg"]),
+    (dict(tags=""), ["dsc_5126.jpg", "dsc_5167.jpg"]),
+    (dict(select=True), ["dsc_4664.jpg", "dsc_5126.jpg"]),
+    (dict(select=False), ["dsc_4623.jpg", "dsc_4831.jpg", "dsc_5167.jpg"]),
+    (dict(date=(datetime.datetime(2016, 3, 5),
+                datetime.datetime(2016, 3, 6))), ["dsc_4831.jpg"]),
+    (dict(tags="Tokyo", date=(datetime.datetime(2016, 2, 28),
+                              datetime.datetime(2016, 2, 29))),
+     ["dsc_4623.jpg"]),
+    (dict(select=True, files=["dsc_5126.jpg", "dsc_4831.jpg"]),
+     ["dsc_5126.jpg"]),
+])
+def test_filter(dbdir, kwargs, files):
+    """Filter the items using the database.
+    """
+    with SQLiteIndex(dbdir) as idx:
+        idxfilter = photoidx.idxfilter.IdxFilter(**kwargs)
+        fnames = [ str(i.filename) for i in idxfilter.filter(idx) ]
+        assert fnames == files
+
+def test_modify(dbdir):
+    """Modify tags and the order of items.
+    """
+    with SQLiteIndex(dbdir) as idx:
+        idxfilter = photoidx.idxfilter.IdxFilter(tags="Tokyo")
+        for i in idxfilter.filter(idx):
+            i.tags.add("Japan")
+        idx[2].tags.discard("Hakone")
+        item = idx.pop(4)
+        idx.insert(0, item)
+        idx.write()
+    with SQLiteIndex(dbdir) as idx:
+        fnames = [ str(i.filename) for i in idx ]
+        assert fnames == ["dsc_5167.jpg", "dsc_4623.jpg", "dsc_4664.jpg",
+                          "dsc_4831.jpg", "dsc_5126.jpg"]
+        idxfilter = photoidx.idxfilter.IdxFilter(tags="Japan")
+        fnames = [ str(i.filename) for i in idxfilter.filter(idx) ]
+        assert fnames == ["dsc_4623.jpg", "dsc_4664.jpg"]
+        assert idx[3].tags == {"Shinto_shrine"}
+
+def test_modify_unsaved(dbdir):
+    """Queries see modifications not yet written.
+    Modifications that are not written are discarded.
+    """
+    with SQLiteIndex(dbdir) as idx:
+        idx[0].tags.add("unsaved")
+        idxfilter = photoidx.idxfilter.IdxFilter(tags="unsaved")
+        items = list(idxfilter.filter(idx))
+        assert items == [idx[0]]
+    with SQLiteIndex(dbdir) as idx:
+        idxfilter = photoidx.idxfilter.IdxFilter(tags="unsaved")
+        assert list(idxfilter.filter(idx)) == []
+
+def test_tag_rows(dbdir):
+    """Adding a tag to one item only inserts one row.
+    """
+    with SQLiteIndex(dbdir) as idx:
+        changes = idx.db.total_changes
+        list(idx)
+        idx[1].tags.add("single")
+        idx.write()
+        assert idx.db.total_changes - changes == 1
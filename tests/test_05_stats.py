@@ -88,3 +88,14 @@ def test_stats_filtered(imgdir):
         "Tokyo": 2,
     }
 
+
+@pytest.mark.parametrize("tags", [None, "Tokyo", "!Tokyo", ""])
+def test_stats_tagindex(imgdir, tags):
+    """Counting the tags using the tag index yields the same result.
+    """
+    idxfilter = photoidx.idxfilter.IdxFilter(tags=tags)
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        ref = Stats(idxfilter.filter(idx))
+        stats = Stats(idxfilter.filter(idx), idx=idx)
+    assert str(stats) == str(ref)
+    assert stats.by_tag == ref.by_tag
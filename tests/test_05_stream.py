@@ -0,0 +1,82 @@
+"""Read the items from the index file one by one.
+
+Index.stream() yields the items while parsing the index file.  It
+must yield the same items as reading the whole index.
+"""
+
+import shutil
+import pytest
+import yaml
+import photoidx.index
+import photoidx.idxfilter
+from conftest import tmpdir, gettestdata
+
+testimgs = [
+    "dsc_4623.jpg", "dsc_4664.jpg", "dsc_4831.jpg",
+    "dsc_5126.jpg", "dsc_5167.jpg"
+]
+testimgfiles = [ gettestdata(i) for i in testimgs ]
+
+refindexes = [
+    gettestdata("index-tagged.yaml"),
+    gettestdata("index-unicode-tags.yaml"),
+    gettestdata("index-legacy.yaml"),
+]
+
+@pytest.fixture(scope="module")
+def imgdir(tmpdir):
+    for fname in testimgfiles:
+        shutil.copy(fname, str(tmpdir))
+    return tmpdir
+
+@pytest.fixture(params=["libyaml", "python"])
+def loader(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(photoidx.index, "SafeLoader", yaml.SafeLoader)
+    elif not yaml.__with_libyaml__:
+        pytest.skip("libyaml is not available")
+    return request.param
+
+@pytest.mark.parametrize("ref", refindexes)
+def test_stream(imgdir, loader, ref):
+    """Streaming yields the same items as reading the index.
+    """
+    shutil.copy(ref, str(imgdir / ".index.yaml"))
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        items = [ i.as_dict() for i in idx ]
+    with photoidx.index.Index() as idx:
+        assert [ i.as_dict() for i in idx.stream(imgdir) ] == items
+
+def test_stream_partial(imgdir, loader):
+    """The first items are available before the index file is parsed.
+    """
+    shutil.copy(refindexes[0], str(imgdir / ".index.yaml"))
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        items = idx.items
+    with photoidx.index.Index() as idx:
+        idx.items = items * 2000
+        idx.write(imgdir)
+    size = (imgdir / ".index.yaml").stat().st_size
+    with photoidx.index.Index() as idx:
+        items = idx.stream(imgdir)
+        assert str(next(items).filename) == testimgs[0]
+        assert idx.idxfile.tell() < size / 10
+
+def test_stream_empty(imgdir, loader):
+    with photoidx.index.Index() as idx:
+        idx.write(imgdir)
+    with photoidx.index.Index() as idx:
+        assert list(idx.stream(imgdir)) == []
+
+def test_stream_filter_journal(imgdir, loader):
+    """Filter the streamed items, taking the journal into account.
+    """
+    shutil.copy(refindexes[0], str(imgdir / ".index.yaml"))
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        idx[4].tags.add("Tokyo")
+        idx.write_journal([idx[4]])
+    idxfilter = photoidx.idxfilter.IdxFilter(tags="Tokyo")
+    with photoidx.index.Index() as idx:
+        items = idxfilter.filter(idx.stream(imgdir))
+        fnames = [ str(i.filename) for i in items ]
+    assert fnames == ["dsc_4623.jpg", "dsc_4664.jpg", "dsc_5167.jpg"]
@@ -86,3 +86,40 @@ def test_tag(imgdir, monkeypatch):
             idxfilter = photoidx.idxfilter.IdxFilter(tags=k)
             fnames = [ i.filename for i in idxfilter.filter(idx) ]
             assert fnames == [ Path(k, f) for f in testimgs[k] ]
+
+def test_create_recursive(imgdir):
+    """Create the index scanning the subdirectories recursively.
+    """
+    with photoidx.index.Index(imgdir=imgdir, recursive=True) as idx:
+        idx.write()
+    idxfile = str(imgdir / ".index.yaml")
+    assert filecmp.cmp(refindex, idxfile), "index file differs from reference"
+
+def test_create_patterns(imgdir):
+    """Select the images by glob patterns and by file name suffixes.
+    """
+    other = imgdir / "Other"
+    other.mkdir()
+    shutil.copy(gettestdata("dsc_4623.jpg"), str(other / "IMG_0001.JPG"))
+    shutil.copy(gettestdata("dsc_4664.jpg"), str(other / "img_0002.jpeg"))
+    (other / "notes.txt").touch()
+    japan = [ Path("Japan", f) for f in testimgs["Japan"] ]
+    quebec = [ Path("Quebec", f) for f in testimgs["Quebec"] ]
+    others = [ Path("Other", "IMG_0001.JPG"), Path("Other", "img_0002.jpeg") ]
+    with photoidx.index.Index(imgdir=imgdir, recursive=True) as idx:
+        assert [ i.filename for i in idx ] == japan + others + quebec
+    with photoidx.index.Index(imgdir=imgdir, recursive=True,
+                              exclude=["Quebec"]) as idx:
+        assert [ i.filename for i in idx ] == japan + others
+    with photoidx.index.Index(imgdir=imgdir, recursive=True,
+                              include=["*.jpg"], exclude=["dsc_46*"]) as idx:
+        assert [ i.filename for i in idx ] == japan[2:] + quebec
+    with photoidx.index.Index(imgdir=imgdir, recursive=True,
+                              include=["Other/*"], filestat=True) as idx:
+        assert [ i.filename for i in idx ] == others
+        idx.write()
+    # Updating the index with other patterns leaves the items not
+    # selected by them alone.
+    with photoidx.index.Index(idxfile=imgdir, imgdir=imgdir, recursive=True,
+                              exclude=["Other"], filestat=True) as idx:
+        assert [ i.filename for i in idx ] == others + japan + quebec
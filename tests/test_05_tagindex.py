@@ -0,0 +1,108 @@
+"""The tag index maintained by the Index.
+
+Filtering by tags uses an inverted index mapping tags to items.  This
+index must be kept up to date with any modifications of the tags.
+"""
+
+import shutil
+import pytest
+import photoidx.index
+import photoidx.idxfilter
+from conftest import tmpdir, gettestdata
+
+testimgs = [ 
+    "dsc_4623.jpg", "dsc_4664.jpg", "dsc_4831.jpg", 
+    "dsc_5126.jpg", "dsc_5167.jpg" 
+]
+testimgfiles = [ gettestdata(i) for i in testimgs ]
+
+@pytest.fixture(scope="module")
+def imgdir(tmpdir):
+    for fname in testimgfiles:
+        shutil.copy(fname, str(tmpdir))
+    shutil.copy(gettestdata("index-tagged.yaml"), str(tmpdir / ".index.yaml"))
+    return tmpdir
+
+class CountingFilter(photoidx.idxfilter.IdxFilter):
+    """An IdxFilter that counts the items it is called for.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.count = 0
+    def __call__(self, item):
+        self.count += 1
+        return super().__call__(item)
+
+def get_files(idx, tags):
+    idxfilter = photoidx.idxfilter.IdxFilter(tags=tags)
+    return [ str(i.filename) for i in idxfilter.filter(idx) ]
+
+def test_candidates(imgdir):
+    """Only items having the tags are considered.
+    """
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        idxfilter = CountingFilter(tags="Tokyo,Shinto_shrine")
+        fnames = [ str(i.filename) for i in idxfilter.filter(idx) ]
+        assert fnames == ["dsc_4664.jpg"]
+        assert idxfilter.count == 1
+        idxfilter = CountingFilter(tags="")
+        fnames = [ str(i.filename) for i in idxfilter.filter(idx) ]
+        assert fnames == ["dsc_5126.jpg", "dsc_5167.jpg"]
+        assert idxfilter.count == 2
+
+def test_modify_tags(imgdir):
+    """Modify the tags of items after the tag index has been built.
+    """
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        assert get_files(idx, "Tokyo") == ["dsc_4623.jpg", "dsc_4664.jpg"]
+        idx[4].tags.add("Tokyo")
+        idx[0].tags.discard("Tokyo")
+        assert get_files(idx, "Tokyo") == ["dsc_4664.jpg", "dsc_5167.jpg"]
+        assert get_files(idx, "") == ["dsc_4623.jpg", "dsc_5126.jpg"]
+        idx[3].tags |= {"Tokyo", "Japan"}
+        idx[1].tags = {"Japan"}
+        assert get_files(idx, "Tokyo") == ["dsc_5126.jpg", "dsc_5167.jpg"]
+        assert get_files(idx, "Japan") == ["dsc_4664.jpg", "dsc_5126.jpg"]
+        idx[3].tags.clear()
+        assert get_files(idx, "Japan") == ["dsc_4664.jpg"]
+        assert get_files(idx, "") == ["dsc_4623.jpg", "dsc_5126.jpg"]
+        assert set(idx.tagmap().keys()) == {
+            "Hakone", "Japan", "Shinto_shrine", "Tokyo"
+        }
+
+def test_modify_index(imgdir):
+    """Remove, insert and move items after the tag index has been built.
+    """
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        assert get_files(idx, "Shinto_shrine") == [
+            "dsc_4664.jpg", "dsc_4831.jpg"
+        ]
+        item = idx.pop(2)
+        assert get_files(idx, "Shinto_shrine") == ["dsc_4664.jpg"]
+        idx.insert(0, item)
+        assert get_files(idx, "Shinto_shrine") == [
+            "dsc_4831.jpg", "dsc_4664.jpg"
+        ]
+        del idx[1:3]
+        assert get_files(idx, "Shinto_shrine") == ["dsc_4831.jpg"]
+        assert get_files(idx, "Tokyo") == []
+        item.tags.add("Tokyo")
+        assert get_files(idx, "Tokyo") == ["dsc_4831.jpg"]
+
+def count_tags(items):
+    counts = {}
+    for i in items:
+        for t in i.tags:
+            counts[t] = counts.get(t, 0) + 1
+    return counts
+
+def test_tagcounts(imgdir):
+    """Count the items having each tag.
+    """
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        assert idx.tagcounts() == count_tags(idx)
+        assert idx.tagcounts(idx[1:3]) == count_tags(idx[1:3])
+        idx[4].tags.add("Tokyo")
+        idx[1].tags.clear()
+        assert idx.tagcounts() == count_tags(idx)
+        assert idx.tagcounts(idx[1:]) == count_tags(idx[1:])
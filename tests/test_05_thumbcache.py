@@ -0,0 +1,93 @@
+"""The persistent cache of thumbnails.
+"""
+
+import os
+import shutil
+import stat
+import pytest
+import photoidx.index
+from photoidx.thumbcache import ThumbnailCache
+from conftest import tmpdir, gettestdata
+
+testimgs = [
+    "dsc_4623.jpg", "dsc_4664.jpg", "dsc_4831.jpg",
+    "dsc_5126.jpg", "dsc_5167.jpg"
+]
+testimgfiles = [ gettestdata(i) for i in testimgs ]
+
+refindex = gettestdata("index-tagged.yaml")
+
+@pytest.fixture(scope="module")
+def imgdir(tmpdir):
+    for fname in testimgfiles:
+        shutil.copy(fname, str(tmpdir))
+    shutil.copy(refindex, str(tmpdir / ".index.yaml"))
+    return tmpdir
+
+def test_key(imgdir):
+    """The key is derived from the checksum, or from the file otherwise.
+    """
+    cache = ThumbnailCache(imgdir / "cache")
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        item = idx[0]
+        path = imgdir / item.filename
+        assert cache.key(item, path) == "md5-%s" % item.checksum['md5']
+        item.checksum = {}
+        key = cache.key(item, path)
+        assert key.startswith("path-")
+        assert cache.key(item, path) == key
+        os.utime(str(path), ns=(0, 0))
+        assert cache.key(item, path) != key
+
+def test_put_get(imgdir):
+    """Store thumbnails in the cache and get them back.
+    """
+    cachedir = imgdir / "cache"
+    cache = ThumbnailCache(cachedir)
+    assert cache.get("a") is None
+    cache.put("a", b"spam")
+    cache.put("b", b"eggs")
+    assert cache.get("a") == b"spam"
+    assert cache.get("b") == b"eggs"
+    assert sorted(p.name for p in cachedir.iterdir()) == ["a.jpg", "b.jpg"]
+    # Another instance sees the same thumbnails.
+    assert ThumbnailCache(cachedir).get("a") == b"spam"
+
+def test_evict(imgdir):
+    """The least recently used thumbnails are removed beyond maxsize.
+    """
+    cachedir = imgdir / "evict"
+    cache = ThumbnailCache(cachedir, maxsize=3500)
+    for i, k in enumerate("abc"):
+        cache.put(k, bytes(1000))
+        os.utime(str(cachedir / (k + ".jpg")), ns=(i * 10**9, i * 10**9))
+    # Using "a" makes "b" the least recently used one.
+    assert cache.get("a")
+    cache.put("d", bytes(1000))
+    assert cache.get("b") is None
+    for k in "acd":
+        assert cache.get(k) == bytes(1000)
+
+def test_replace(imgdir):
+    """Storing a thumbnail again replaces the old one.
+
+    The size of the replaced thumbnail is not counted any more.
+    """
+    cachedir = imgdir / "replace"
+    cache = ThumbnailCache(cachedir, maxsize=3500)
+    cache.put("a", bytes(1000))
+    for i in range(5):
+        cache.put("b", bytes(1000))
+    assert cache._size == 2000
+    assert cache.get("a") == bytes(1000)
+    cache.put("b", bytes(500))
+    assert cache._size == 1500
+    assert cache.get("b") == bytes(500)
+
+def test_mode(imgdir):
+    """The thumbnails are only readable by the user.
+    """
+    cachedir = imgdir / "mode"
+    cache = ThumbnailCache(cachedir)
+    cache.put("a", b"spam")
+    assert stat.S_IMODE((cachedir / "a.jpg").stat().st_mode) == 0o600
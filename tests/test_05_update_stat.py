@@ -0,0 +1,78 @@
+"""Update an index based on the recorded file status of the images.
+"""
+
+import os
+from pathlib import Path
+import shutil
+import pytest
+import photoidx.idxitem
+import photoidx.index
+from conftest import tmpdir, gettestdata
+
+testimgs = [ 
+    "dsc_4623.jpg", "dsc_4664.jpg", "dsc_4831.jpg", 
+    "dsc_5126.jpg", "dsc_5167.jpg" 
+]
+testimgfiles = [ gettestdata(i) for i in testimgs ]
+
+def get_checksums(idx):
+    return { str(i.filename): i.checksum['md5'] for i in idx }
+
+@pytest.mark.dependency()
+def test_create_stat(tmpdir):
+    """Create the index recording the file status.
+    """
+    for fname in testimgfiles[:4]:
+        shutil.copy(fname, str(tmpdir))
+    with photoidx.index.Index(imgdir=tmpdir, filestat=True) as idx:
+        idx.write()
+    with photoidx.index.Index(idxfile=tmpdir) as idx:
+        for i in idx:
+            st = (tmpdir / i.filename).stat()
+            assert i.fileStat == {
+                'size': st.st_size,
+                'mtime_ns': st.st_mtime_ns,
+                'inode': st.st_ino,
+            }
+
+@pytest.mark.dependency(depends=["test_create_stat"])
+def test_update_unchanged(tmpdir, monkeypatch):
+    """Update the index without any changes in the directory.
+
+    None of the images should be read.
+    """
+    def fail(*args, **kwargs):
+        raise AssertionError("image file read")
+    with photoidx.index.Index(idxfile=tmpdir) as idx:
+        orig = get_checksums(idx)
+    monkeypatch.setattr(photoidx.idxitem, "_readfile", fail)
+    with photoidx.index.Index(idxfile=tmpdir, imgdir=tmpdir,
+                              filestat=True) as idx:
+        assert get_checksums(idx) == orig
+        idx.write()
+
+@pytest.mark.dependency(depends=["test_update_unchanged"])
+def test_update_modified(tmpdir):
+    """Modify, remove and add images and update the index.
+    """
+    with photoidx.index.Index(idxfile=tmpdir) as idx:
+        orig = get_checksums(idx)
+        idx[1].tags.add("modified")
+        idx.write()
+    # Replace the content of dsc_4664.jpg by another image,
+    # remove dsc_4831.jpg, and add dsc_5167.jpg.
+    shutil.copy(testimgfiles[4], str(tmpdir / testimgs[1]))
+    os.unlink(str(tmpdir / testimgs[2]))
+    shutil.copy(testimgfiles[4], str(tmpdir))
+    with photoidx.index.Index(idxfile=tmpdir, imgdir=tmpdir,
+                              filestat=True) as idx:
+        idx.write()
+    with photoidx.index.Index(idxfile=tmpdir) as idx:
+        filenames = [ i.filename for i in idx ]
+        assert filenames == [ Path(testimgs[i]) for i in (0, 1, 3, 4) ]
+        checksums = get_checksums(idx)
+        assert checksums[testimgs[0]] == orig[testimgs[0]]
+        assert checksums[testimgs[1]] == checksums[testimgs[4]]
+        assert checksums[testimgs[1]] != orig[testimgs[1]]
+        assert checksums[testimgs[3]] == orig[testimgs[3]]
+        assert idx[1].tags == {"modified"}
@@ -0,0 +1,92 @@
+"""Watch the image directory and keep the index up to date.
+"""
+
+import shutil
+import time
+import pytest
+import photoidx.index
+import photoidx.watch
+from conftest import tmpdir, gettestdata
+
+testimgs = [
+    "dsc_4623.jpg", "dsc_4664.jpg", "dsc_4831.jpg",
+    "dsc_5126.jpg", "dsc_5167.jpg"
+]
+testimgfiles = [ gettestdata(i) for i in testimgs ]
+
+def get_filenames(imgdir):
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        return [ str(i.filename) for i in idx ]
+
+def wait(watcher, cond, timeout=10.0):
+    """Let watcher process events until cond() is true.
+    """
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        watcher.step(timeout=0.1)
+        if not watcher.pending and not watcher.ready and cond():
+            return
+    raise AssertionError("timeout waiting for the watcher")
+
+@pytest.mark.parametrize("polling", [False, True])
+def test_watch(tmpdir, polling):
+    imgdir = tmpdir / ("poll" if polling else "inotify")
+    imgdir.mkdir()
+    with photoidx.watch.Watcher(imgdir, settle=0.2, interval=0.0,
+                                polling=polling) as watcher:
+        if not polling and isinstance(watcher.source,
+                                      photoidx.watch._Poller):
+            pytest.skip("inotify is not available")
+        watcher.source.interval = 0.1
+        # New images are added to the index, other files are ignored.
+        for fname in testimgfiles[:3]:
+            shutil.copy(fname, str(imgdir))
+        (imgdir / "notes.txt").touch()
+        def cond():
+            return ((imgdir / ".index.yaml").exists() and
+                    get_filenames(imgdir) == testimgs[:3])
+        wait(watcher, cond)
+        with photoidx.index.Index(idxfile=imgdir) as idx:
+            idx[1].tags.add("Tokyo")
+            idx.write()
+        # Replace an image and remove another one.
+        shutil.copy(testimgfiles[4], str(imgdir / testimgs[1]))
+        (imgdir / testimgs[0]).unlink()
+        def cond():
+            with photoidx.index.Index(idxfile=imgdir) as idx:
+                return (len(idx) == 2 and
+                        idx[0].createDate.day == 9 and
+                        idx[0].tags == {"Tokyo"})
+        wait(watcher, cond)
+
+def test_watch_filestat(tmpdir):
+    """The file status recorded in the index is kept up to date.
+
+    By default, the file status of new images is recorded.  Even
+    without that, re-read images keep their file status, such that
+    Index.update_dir() does not need to read them again.
+    """
+    imgdir = tmpdir / "filestat"
+    imgdir.mkdir()
+    for fname in testimgfiles[:2]:
+        shutil.copy(fname, str(imgdir))
+    with photoidx.index.Index(imgdir=imgdir, filestat=True) as idx:
+        idx.write()
+    with photoidx.watch.Watcher(imgdir, filestat=False, settle=0.2,
+                                interval=0.0, polling=True) as watcher:
+        watcher.source.interval = 0.1
+        shutil.copy(testimgfiles[4], str(imgdir / testimgs[1]))
+        def cond():
+            with photoidx.index.Index(idxfile=imgdir) as idx:
+                return idx[1].createDate.day == 9
+        wait(watcher, cond)
+    with photoidx.watch.Watcher(imgdir, settle=0.2, interval=0.0,
+                                polling=True) as watcher:
+        watcher.source.interval = 0.1
+        shutil.copy(testimgfiles[2], str(imgdir))
+        def cond():
+            return len(get_filenames(imgdir)) == 3
+        wait(watcher, cond)
+    with photoidx.index.Index(idxfile=imgdir) as idx:
+        for item in idx:
+            assert item.filestat_matches((imgdir / item.filename).stat())